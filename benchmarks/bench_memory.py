@@ -0,0 +1,171 @@
+"""
+    Measures the per instance memory of the controllers and the gui data models, comparing the
+    slotted classes with dict-backed equivalents of their previous layout: controllers with an
+    instance dict and a numpy Generator object per store row, and models with an instance dict
+    allocating their own default QPointF, chart lists and QColors.
+    Every variant is created in a fresh process, the Python heap is measured with tracemalloc and
+    the resident set size from /proc/self/statm. Controllers are created in a store reserved up front,
+    so the numbers exclude the store columns and the history, which are printed separately. The stores
+    keep the downsampling pyramid and the rolling statistics of the layer controller defaults, the history
+    row is the HistoryBuffer.nbytes of one component split into raw samples, pyramid and statistics.
+
+    Usage: python benchmarks/bench_memory.py --count 10000
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from components.battery_controller import BatteryController # noqa
+from components.component_store import ComponentStore # noqa
+from components.history_buffer import DEFAULT_HISTORY_CAPACITY, DEFAULT_PYRAMID_LEVELS # noqa
+from components.rolling_stats import DEFAULT_STATS_WINDOW # noqa
+from components.solar_controller import SolarController # noqa
+from models.channel_model import ChannelModel # noqa
+from models.component_model import ComponentModel # noqa
+from PyQt5.QtCore import QPointF # noqa
+from PyQt5.QtGui import QColor # noqa
+
+CONTROLLERS = {"SolarController": SolarController, "BatteryController": BatteryController}
+MODELS = {"ComponentModel": ComponentModel, "ChannelModel": ChannelModel}
+
+
+def dict_backed(cls: type) -> type:
+    """Returns a copy of \\a cls without slots, the instances keep their attributes in a dict."""
+    namespace = dict()
+    for klass in reversed(cls.__mro__[:-1]):
+        namespace.update(vars(klass))
+    for name in ("__slots__", "__dict__", "__weakref__", *getattr(cls, "__slots__", ()), "component_id", "store", "row"):
+        namespace.pop(name, None)
+    return type(cls.__name__, (), namespace)
+
+
+class GeneratorStore(ComponentStore):
+    """Store keeping a numpy Generator object per row next to the stream state, as the rows used to."""
+    def __init__(self, *args, **kwargs):
+        self.generators = list()
+        super().__init__(*args, **kwargs)
+
+    def seed_row(self, row: int, key: int = None):
+        super().seed_row(row, key)
+        self.generators.append(np.random.default_rng(np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=(key,))))
+
+
+class LegacyComponentModel(dict_backed(ComponentModel)):
+    """ComponentModel allocating its own location and charts."""
+    def __init__(self):
+        super().__init__()
+        self.component_location = QPointF()
+        self.thumbnail_chart_data1 = list()
+        self.thumbnail_chart_timestamp = list()
+
+
+class LegacyChannelModel(dict_backed(ChannelModel)):
+    """ChannelModel allocating its own colors."""
+    def __init__(self):
+        super().__init__()
+        self.channel_color = QColor(0, 255, 0, 200)
+        self.arrow_color = QColor(0, 0, 255, 200)
+
+
+def rss() -> int:
+    """Resident set size of the process in bytes."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def create(name: str, legacy: bool, count: int) -> tuple:
+    """Returns the store of the class \\a name, if any, and a function creating \\a count instances of it."""
+    if name in CONTROLLERS:
+        cls = CONTROLLERS[name]
+        # The store is reserved before measuring, only the controllers and their streams are counted.
+        store = (GeneratorStore if legacy else ComponentStore)(
+            cls, DEFAULT_HISTORY_CAPACITY, seed=1, pyramid_levels=DEFAULT_PYRAMID_LEVELS, stats_window=DEFAULT_STATS_WINDOW)
+        store.reserve(count)
+        # Writes the zero filled arrays, whose pages are only mapped on the first write.
+        history = store.history
+        arrays = [
+            *vars(store).values(), *vars(history).values(), *vars(history.pyramid).values(),
+            *history.pyramid.levels, *vars(history.stats).values()]
+        for array in arrays:
+            if isinstance(array, np.ndarray) and not array.any():
+                array.fill(0)
+        if legacy:
+            cls = dict_backed(cls)
+            store.component_type = cls
+        return store, lambda: [construct(cls, store, id) for id in range(count)]
+    cls = (LegacyChannelModel if name == "ChannelModel" else LegacyComponentModel) if legacy else MODELS[name]
+    return None, lambda: [cls() for _ in range(count)]
+
+
+def construct(cls: type, store: ComponentStore, component_id: int):
+    """Creates a controller like Component.__init__ does, which also works for the dict-backed copies."""
+    component = cls.__new__(cls)
+    component.component_id = component_id
+    component.store = store
+    component.row = store.allocate(component, component_id)
+    return component
+
+
+def measure(name: str, legacy: bool, count: int) -> dict:
+    """Measures the memory of \\a count instances of the class \\a name in this process."""
+    store, factory = create(name, legacy, count)
+    gc.collect()
+    tracemalloc.start()
+    before_rss = rss()
+    before_heap = tracemalloc.get_traced_memory()[0]
+    instances = factory()
+    gc.collect()
+    result = {
+        "heap": (tracemalloc.get_traced_memory()[0] - before_heap) / count,
+        "rss": (rss() - before_rss) / count,
+    }
+    tracemalloc.stop()
+    if store is not None:
+        columns = sum(column.nbytes for column in store.columns.values())
+        state = store.dirty.nbytes + store.noise.nbytes + store.noise_cursor.nbytes + store.rng_state.nbytes
+        result["store_row"] = (columns + state) / store.capacity
+        history = store.history
+        result["history_row"] = history.nbytes / store.capacity
+        result["pyramid_row"] = history.pyramid.nbytes / store.capacity
+        result["stats_row"] = history.stats.nbytes / store.capacity
+    del instances
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="number of instances of every class")
+    parser.add_argument("--measure", nargs=2, metavar=("CLASS", "VARIANT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        name, variant = args.measure
+        print(json.dumps(measure(name, variant == "old", args.count)))
+        return
+
+    print(f"bytes per instance at {args.count} instances, old (dict-backed) -> new (slotted)")
+    for name in (*CONTROLLERS, *MODELS):
+        results = dict()
+        for variant in ("old", "new"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--count", str(args.count), "--measure", name, variant],
+                check=True, capture_output=True, text=True).stdout
+            results[variant] = json.loads(output)
+        old, new = results["old"], results["new"]
+        print(f"{name:18} heap {old['heap']:7.0f} -> {new['heap']:5.0f}   rss {old['rss']:7.0f} -> {new['rss']:5.0f}")
+        if "store_row" in new:
+            raw = new["history_row"] - new["pyramid_row"] - new["stats_row"]
+            print(f"{'':18} store row {new['store_row']:.0f}, history row {new['history_row']:.0f}: "
+                  f"raw {raw:.0f} ({DEFAULT_HISTORY_CAPACITY} samples), pyramid {new['pyramid_row']:.0f} "
+                  f"({DEFAULT_PYRAMID_LEVELS} levels), stats {new['stats_row']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
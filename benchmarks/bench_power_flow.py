@@ -0,0 +1,71 @@
+"""
+    Measures the power flow solve time of a synthetic electrical layer.
+    Every battery is the hub of a group of solar panels and the hubs are chained
+    and cross linked, which gives a connected graph with cycles.
+
+    Usage: python benchmarks/bench_power_flow.py --nodes 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from layer_controller import LayerController # noqa
+from components.component_types import TYPE_SOLAR_PANEL, TYPE_BATTERY # noqa
+
+FRAME_BUDGET_MS = 16.0
+
+
+def build_layer(nodes: int, panels_per_battery: int, cross_links: int, seed: int = 0) -> LayerController:
+    """Creates a layer with the requested number of components and connections."""
+    rng = np.random.default_rng(seed)
+    layer = LayerController()
+    hubs = list()
+    while len(layer.components) < nodes:
+        hub = layer.add_component(TYPE_BATTERY, history_capacity=8)
+        if hubs:
+            layer.add_component_pair(hubs[-1], hub)
+        hubs.append(hub)
+        for _ in range(min(panels_per_battery, nodes - len(layer.components))):
+            layer.add_component_pair(layer.add_component(TYPE_SOLAR_PANEL, history_capacity=8), hub)
+    for start, end in rng.integers(0, len(hubs), (cross_links, 2)):
+        if start != end:
+            layer.add_component_pair(hubs[start], hubs[end])
+    return layer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--panels-per-battery", type=int, default=8)
+    parser.add_argument("--cross-links", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=50)
+    args = parser.parse_args()
+
+    layer = build_layer(args.nodes, args.panels_per_battery, args.cross_links)
+    start = time.perf_counter()
+    result = layer.solve_power_flow()
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    samples = list()
+    for _ in range(args.ticks):
+        for store in layer.stores.values():
+            store.component_type.generate_demo_batch(store)
+        start = time.perf_counter()
+        result = layer.solve_power_flow()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples = np.array(samples)
+    print(f"nodes: {len(layer.components)} edges: {len(layer.graph.edges)}")
+    print(f"cold solve (topology build): {cold_ms:.2f} ms")
+    print(f"warm solve: mean {samples.mean():.2f} ms, p95 {np.percentile(samples, 95):.2f} ms, "
+          f"max {samples.max():.2f} ms, last iterations {result.iterations}, residual {result.residual:.2e}")
+    print(f"frame budget {FRAME_BUDGET_MS:.0f} ms: {'ok' if np.percentile(samples, 95) < FRAME_BUDGET_MS else 'EXCEEDED'}")
+
+
+if __name__ == "__main__":
+    main()
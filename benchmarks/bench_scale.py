@@ -0,0 +1,230 @@
+"""
+    Scale benchmark of the whole application under the offscreen Qt platform. For every size NxM a synthetic
+    house of N components and M channels is loaded into a MainWindow with MainWindow.load_layout (the bulk
+    equivalent of create_component/create_connection) in a process of its own, the backend worker thread is
+    stopped so every stage runs in the main thread, and the following is measured over --repeat runs:
+
+      backend_tick_ms     BackendCore.tick(): demo data, power flow, totals, alarms and the snapshot
+      model_update_ms     ModelUpdater.update_component_models() with the snapshot of a full tick
+      animate_arrows_ms   Channel.animate_arrows() of every channel
+      set_pixmap_ms       AnimatedIcon._set_pixmap() of every icon, through AnimatedIcon.update()
+      scene_paint_ms      rendering the whole scene into a 1920x1080 image
+      rss_mb              resident set size of the process after the runs
+
+    The times are the medians of the runs. They are compared with the stored baseline of the same size, a
+    time more than --time-threshold times its baseline plus --time-slack ms, or a resident set size more than
+    --rss-threshold times its baseline is a regression and makes the script exit with status 1.
+    Baselines depend on the machine, record them with --save-baseline on the machine the suite runs on.
+
+    Usage: python benchmarks/bench_scale.py
+           python benchmarks/bench_scale.py --sizes 200x250 2000x2500 --repeat 20
+           python benchmarks/bench_scale.py --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from component_layout import ComponentLayout # noqa
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "bench_scale.json")
+DEFAULT_SIZES = ("200x250", "1000x1250")
+TIME_METRICS = ("backend_tick_ms", "model_update_ms", "animate_arrows_ms", "set_pixmap_ms", "scene_paint_ms")
+PAINT_SIZE = (1920, 1080)
+
+
+def synthetic_house(components: int, channels: int, seed: int = 0) -> ComponentLayout:
+    """
+        Returns the demo grid house of \\a components components with \\a channels connections: the connections of
+        the demo layout (each battery the hub of its panels, the hubs chained), cut or completed with random
+        connections between distinct components.
+    """
+    demo = ComponentLayout.demo(components)
+    starts, ends = demo.starts.tolist()[:channels], demo.ends.tolist()[:channels]
+    rng = np.random.default_rng(seed)
+    while len(starts) < channels:
+        start, end = rng.choice(demo.ids, 2, replace=False).tolist()
+        starts.append(start)
+        ends.append(end)
+    return ComponentLayout(demo.ids, demo.types, demo.x, demo.y, starts, ends)
+
+
+def rss_mb() -> float:
+    """Resident set size of the process in MB."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def timed(function, repeat: int) -> float:
+    """Median duration of \\a repeat calls of \\a function in ms."""
+    durations = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def measure(components: int, channels: int, repeat: int, charts: bool) -> dict:
+    """Builds a house of the given size in a new MainWindow and measures every stage."""
+    from PyQt5.QtCore import QMetaObject, Qt, QRectF
+    from PyQt5.QtGui import QImage, QPainter
+    from PyQt5.QtWidgets import QApplication
+    from gui_main import MainWindow
+
+    app = QApplication(sys.argv[:1])
+
+    window = MainWindow(layout=ComponentLayout([], [], [], []))
+    start = time.perf_counter()
+    window.load_layout(synthetic_house(components, channels))
+    build_ms = (time.perf_counter() - start) * 1000
+    if charts:
+        while window.canvas.pending_charts:
+            window.canvas._create_pending_charts()
+    app.processEvents()
+    # Stops the worker thread like the window does on exit, from here on the stages run in this thread only.
+    QMetaObject.invokeMethod(window.worker, "stop", Qt.BlockingQueuedConnection)
+    window.workerThread.quit()
+    window.workerThread.wait()
+    core = window.worker.core
+    core.publish_snapshots = True
+    # Warms up the stores, the power flow topology and the caches of the icons.
+    core.tick()
+    window.model_updater.update_component_models(core.take_snapshot())
+
+    snapshots = list()
+
+    def tick():
+        core.tick()
+        snapshots.append(core.take_snapshot())
+
+    results = {"build_ms": build_ms, "backend_tick_ms": timed(tick, repeat)}
+    results["model_update_ms"] = timed(lambda: window.model_updater.update_component_models(snapshots.pop()), repeat)
+    channel_guis = list(window.canvas.channels.values())
+    results["animate_arrows_ms"] = timed(lambda: [channel.animate_arrows() for channel in channel_guis], repeat)
+    icons = [component.icon for component in window.canvas.component_list.values()]
+    results["set_pixmap_ms"] = timed(lambda: [icon.update() for icon in icons], repeat)
+    image = QImage(*PAINT_SIZE, QImage.Format_ARGB32_Premultiplied)
+    scene = window.canvas.scene
+    source = scene.itemsBoundingRect()
+
+    def paint():
+        painter = QPainter(image)
+        scene.render(painter, QRectF(image.rect()), source)
+        painter.end()
+
+    results["scene_paint_ms"] = timed(paint, repeat)
+    results["scene_items"] = scene.item_count
+    results["rss_mb"] = rss_mb()
+    window.close()
+    app.processEvents()
+    return results
+
+
+def measure_in_process(components: int, channels: int, repeat: int, charts: bool) -> dict:
+    """
+        Runs measure() in a new process, so the resident set size and the caches of Qt do not depend on the
+        sizes measured before.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--measure", f"{components}x{channels}", "--repeat", str(repeat)]
+    if charts:
+        command.append("--charts")
+    # Only stdout is captured, the warnings and tracebacks of the child show up on stderr.
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    # The application prints to stdout as well, the results are the last line.
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, args) -> list:
+    """Returns the regressions of \\a results against \\a baseline as (metric, current, baseline, limit) tuples."""
+    regressions = list()
+    for metric in TIME_METRICS + ("rss_mb",):
+        if metric not in baseline:
+            continue
+        if metric == "rss_mb":
+            limit = baseline[metric] * args.rss_threshold
+        else:
+            limit = baseline[metric] * args.time_threshold + args.time_slack
+        if results[metric] > limit:
+            regressions.append((metric, results[metric], baseline[metric], limit))
+    return regressions
+
+
+def machine() -> dict:
+    """Description of the machine and the libraries the results were measured with."""
+    from PyQt5.QtCore import QT_VERSION_STR
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "qt": QT_VERSION_STR,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, metavar="NxM", help="components x channels")
+    parser.add_argument("--repeat", type=int, default=10, help="runs of every stage")
+    parser.add_argument("--charts", action="store_true", help="create every deferred chart before measuring")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with or to save")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--time-threshold", type=float, default=1.5, help="allowed ratio of a time to its baseline")
+    parser.add_argument("--time-slack", type=float, default=0.5, help="allowed absolute increase of a time in ms")
+    parser.add_argument("--rss-threshold", type=float, default=1.2, help="allowed ratio of the rss to its baseline")
+    parser.add_argument("--measure", metavar="NxM", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # Child process of measure_in_process().
+        components, channels = (int(value) for value in args.measure.lower().split("x"))
+        print(json.dumps(measure(components, channels, args.repeat, args.charts)))
+        return
+
+    baselines = dict()
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baselines = json.load(file)
+    stored = baselines.get("results", dict())
+    if stored and baselines.get("machine") != machine():
+        print("note: the baseline was measured on another machine or with other library versions")
+
+    results = dict()
+    regressions = list()
+    for size in args.sizes:
+        components, channels = (int(value) for value in size.lower().split("x"))
+        key = f"{components}x{channels}" + ("+charts" if args.charts else "")
+        results[key] = measure_in_process(components, channels, args.repeat, args.charts)
+        current = results[key]
+        baseline = stored.get(key, dict())
+        print(f"{key}: built in {current['build_ms']:.0f} ms, {current['scene_items']} scene items")
+        for metric in TIME_METRICS + ("rss_mb",):
+            reference = f"  (baseline {baseline[metric]:.2f})" if metric in baseline else ""
+            print(f"  {metric:18} {current[metric]:10.2f}{reference}")
+        for metric, value, reference, limit in compare(current, baseline, args):
+            regressions.append(key)
+            print(f"  REGRESSION {metric}: {value:.2f} > {limit:.2f} (baseline {reference:.2f})")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        stored.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump({"machine": machine(), "results": stored}, file, indent=1, sort_keys=True)
+            file.write("\n")
+        print(f"baseline saved to {args.baseline}")
+    elif regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
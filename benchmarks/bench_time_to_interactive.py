@@ -0,0 +1,83 @@
+"""
+    Measures the time to interactive of the gui when loading a large house layout:
+    reading the layout file, creating the backend components and the gui items in bulk,
+    applying the first snapshot and painting the first frame. The deferred charts are
+    created afterwards from the event loop while the backend keeps ticking, the time until all of
+    them exist (or how many exist when the wait times out) and the longest event loop stall in
+    between are reported too.
+
+    Usage: python benchmarks/bench_time_to_interactive.py --components 2000 --offscreen
+           python benchmarks/bench_time_to_interactive.py --components 2000 --one-by-one
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from component_layout import ComponentLayout # noqa
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", type=int, default=2000)
+    parser.add_argument("--format", choices=("json", "npz"), default="npz", help="layout file format to load")
+    parser.add_argument(
+        "--one-by-one", action="store_true",
+        help="create the components with create_component/create_connection instead of the bulk calls")
+    parser.add_argument("--offscreen", action="store_true", help="render with the offscreen Qt platform")
+    parser.add_argument(
+        "--chart-timeout", type=float, default=60.0, help="seconds to wait for the deferred charts after the first frame")
+    args = parser.parse_args()
+    if args.offscreen:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+
+    from PyQt5.QtWidgets import QApplication
+    from gui_main import MainWindow
+
+    layout = ComponentLayout.demo(args.components)
+    directory = tempfile.mkdtemp()
+    for extension in (ComponentLayout.JSON_EXTENSION, ComponentLayout.BINARY_EXTENSION):
+        path = os.path.join(directory, "house" + extension)
+        layout.save(path)
+        start = time.perf_counter()
+        ComponentLayout.load(path)
+        print(f"read {extension}: {(time.perf_counter() - start) * 1000:.1f} ms, {os.path.getsize(path) / 1024:.0f} KiB")
+    empty_path = os.path.join(directory, "empty.json")
+    ComponentLayout([], [], [], []).save(empty_path)
+
+    app = QApplication(sys.argv)
+    start = time.perf_counter()
+    if args.one_by_one:
+        window = MainWindow(layout_path=empty_path)
+        ids = [window.create_component(type, x, y) for type, x, y in zip(
+            layout.types.tolist(), layout.x.tolist(), layout.y.tolist())]
+        for start_index, end_index in zip(*(indices.tolist() for indices in layout.connection_indices())):
+            window.create_connection(ids[start_index], ids[end_index])
+        window.worker.update_data()
+    else:
+        window = MainWindow(layout_path=os.path.join(directory, "house." + args.format))
+    created = time.perf_counter()
+    app.processEvents()
+    interactive = time.perf_counter()
+
+    # The backend keeps ticking meanwhile, so this also measures the gui under its steady update load.
+    longest_stall = 0.0
+    while window.canvas.pending_charts and time.perf_counter() - interactive < args.chart_timeout:
+        iteration = time.perf_counter()
+        app.processEvents()
+        longest_stall = max(longest_stall, time.perf_counter() - iteration)
+    charts = time.perf_counter()
+
+    print(f"components: {len(window.canvas.component_list)} channels: {len(window.canvas.channels)}")
+    print(f"created: {(created - start) * 1000:.0f} ms")
+    print(f"time to interactive (first frame): {(interactive - start) * 1000:.0f} ms")
+    print(f"charts: {len(window.canvas.component_list) - len(window.canvas.pending_charts)} created after "
+          f"{(charts - start) * 1000:.0f} ms, longest event loop stall {longest_stall * 1000:.0f} ms")
+    window.sigint_handler()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import numpy as np
+
+from components.component_store import ComponentStore
+from power_flow import PowerFlowResult
+
+# Kinds of alarm rules: a state field above or below a limit, a state field changing faster than a limit
+# per second, and a component without a new sample for more than a number of its update periods.
+ALARM_HIGH = "high"
+ALARM_LOW = "low"
+ALARM_RATE = "rate"
+ALARM_STALE = "stale"
+
+
+class AlarmRule():
+    """
+        Alarm condition checked on every component of one type, or on the flow of every connection.
+        The alarm is raised when the checked value crosses the limit and cleared only once it is back
+        by the hysteresis, so a value hovering around the limit does not toggle the alarm every tick.
+    """
+    __slots__ = ("name", "kind", "limit", "hysteresis", "component_type", "field")
+
+    def __init__(
+            self,
+            name: str,
+            kind: str,
+            limit: float,
+            hysteresis: float = 0.0,
+            component_type: type = None,
+            field: str = None):
+        """
+            Parameters:
+                - name (str): name of the alarm, unique among the rules of a component type.
+                - kind (str): ALARM_HIGH, ALARM_LOW, ALARM_RATE or ALARM_STALE.
+                - limit (float): value, rate per second or number of update periods raising the alarm.
+                - hysteresis (float): distance the value has to get back from the limit to clear the alarm.
+                - component_type (type): controller class of the checked components. When not given the rule
+                  checks the absolute flow of every connection, which supports ALARM_HIGH only.
+                - field (str): checked state field, not used by ALARM_STALE.
+        """
+        if kind not in (ALARM_HIGH, ALARM_LOW, ALARM_RATE, ALARM_STALE):
+            raise Exception(f"Unknown alarm kind: {kind}")
+        if hysteresis < 0:
+            raise Exception("Alarm hysteresis must not be negative")
+        if component_type is None:
+            if kind != ALARM_HIGH:
+                raise Exception("Connection alarms support the high limit only")
+        elif kind != ALARM_STALE and field not in component_type.STATE_FIELDS:
+            raise Exception(f"Unknown state field: {field}")
+        self.name = name
+        self.kind = kind
+        self.limit = limit
+        self.hysteresis = hysteresis
+        self.component_type = component_type
+        self.field = field
+
+    def levels(self) -> tuple:
+        """
+            Returns the (raise, clear) levels of the rule. Low limits are checked on the negated value,
+            so every rule raises its alarm when the checked value goes above the raise level.
+        """
+        if self.kind == ALARM_LOW:
+            return -self.limit, -(self.limit + self.hysteresis)
+        return self.limit, self.limit - self.hysteresis
+
+
+class _RuleTable():
+    """
+        Raise and clear levels of the rules checked on one set of items, one row per rule.
+        The active rules of an item are kept as a bitmask, bit i for rule i.
+    """
+    # Rules fitting into the bitmask, which is kept exactly in a float64 column of the component stores.
+    MAX_RULES = 52
+
+    def __init__(self, rules: list):
+        if len(rules) > self.MAX_RULES:
+            raise Exception(f"At most {self.MAX_RULES} alarm rules per component type are supported")
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise Exception("Alarm rule names must be unique per component type")
+        self.rules = rules
+        self.names = tuple(names)
+        levels = np.array([rule.levels() for rule in rules], dtype=np.float64).reshape(-1, 2)
+        self.raise_level = levels[:, :1]
+        self.clear_level = levels[:, 1:]
+        self.bits = (np.int64(1) << np.arange(len(rules), dtype=np.int64))[:, None]
+
+    def transition(self, measures: np.ndarray, state: np.ndarray) -> np.ndarray:
+        """
+            Returns the new bitmasks of the items from the previous \a state bitmasks and the (rules, items)
+            \a measures. An active rule stays active until its measure drops to the clear level, an inactive one
+            is raised above the raise level, and NaN measures (no new data) keep the rule as it is.
+        """
+        active = (state & self.bits) != 0
+        exceeded = measures > np.where(active, self.clear_level, self.raise_level)
+        active = np.where(np.isnan(measures), active, exceeded)
+        return (active * self.bits).sum(axis=0)
+
+    def active_names(self, mask: int) -> tuple:
+        """Names of the rules set in \a mask."""
+        return tuple(name for bit, name in enumerate(self.names) if mask >> bit & 1)
+
+
+class _StoreRules(_RuleTable):
+    """
+        Rules of the components of one store. The bitmask and the previous sample of every row are kept
+        in extra columns of the store (ComponentStore.add_column), so they move with the rows when components
+        are removed and stay out of the state fields and the snapshots.
+    """
+    STATE_COLUMN = "alarm_state"
+    # Timestamp and rate checked fields of the latest sample seen, and the engine time it was seen at.
+    TIMESTAMP_COLUMN = "alarm_timestamp"
+    SEEN_COLUMN = "alarm_seen"
+    PREVIOUS_PREFIX = "alarm_previous_"
+
+    def __init__(self, store: ComponentStore, rules: list):
+        super().__init__(rules)
+        self.value_rules = [index for index, rule in enumerate(rules) if rule.kind in (ALARM_HIGH, ALARM_LOW)]
+        self.value_fields = [rules[index].field for index in self.value_rules]
+        self.value_signs = np.array([-1.0 if rules[index].kind == ALARM_LOW else 1.0 for index in self.value_rules])[:, None]
+        self.rate_rules = [index for index, rule in enumerate(rules) if rule.kind == ALARM_RATE]
+        self.rate_fields = [rules[index].field for index in self.rate_rules]
+        self.stale_rules = [index for index, rule in enumerate(rules) if rule.kind == ALARM_STALE]
+        store.add_column(self.STATE_COLUMN, 0.0)
+        store.add_column(self.TIMESTAMP_COLUMN, np.nan)
+        store.add_column(self.SEEN_COLUMN, np.nan)
+        for field in set(self.rate_fields):
+            store.add_column(self.PREVIOUS_PREFIX + field, np.nan)
+
+    def evaluate(self, store: ComponentStore, now: float) -> tuple:
+        """
+            Checks every rule on every row of \a store at once.
+
+            Returns:
+                Tuple of (rows, masks), the rows whose active rules changed and their new bitmasks.
+        """
+        size = store.size
+        columns = store.columns
+        extra = store.extra_columns
+        timestamps = columns["timestamp"][:size]
+        previous_timestamps = extra[self.TIMESTAMP_COLUMN][:size]
+        # Compares unequal to the NaN of rows never seen before.
+        updated = timestamps != previous_timestamps
+        seen = extra[self.SEEN_COLUMN][:size]
+        seen[updated] = now
+
+        measures = np.empty((len(self.rules), size))
+        if self.value_rules:
+            measures[self.value_rules] = self.value_signs * np.stack([columns[name][:size] for name in self.value_fields])
+        if self.rate_rules:
+            current = np.stack([columns[name][:size] for name in self.rate_fields])
+            previous = np.stack([extra[self.PREVIOUS_PREFIX + name][:size] for name in self.rate_fields])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rates = np.abs(current - previous) / (timestamps - previous_timestamps)
+            # Rows without a new sample have no new rate.
+            measures[self.rate_rules] = np.where(updated, rates, np.nan)
+            for name in set(self.rate_fields):
+                extra[self.PREVIOUS_PREFIX + name][:size][updated] = columns[name][:size][updated]
+        if self.stale_rules:
+            measures[self.stale_rules] = (now - seen) / columns["update_period"][:size]
+        previous_timestamps[updated] = timestamps[updated]
+
+        state = extra[self.STATE_COLUMN][:size]
+        old = state.astype(np.int64)
+        new = self.transition(measures, old)
+        rows = np.flatnonzero(new != old)
+        masks = new[rows]
+        state[rows] = masks
+        return rows, masks
+
+
+class AlarmEngine():
+    """
+        Evaluates alarm rules on all components and connections of a layer with a few NumPy operations
+        per store: the checked values of every rule and row form one (rules, rows) matrix compared against
+        the raise or clear level of each rule at once, so thousands of components cost one vectorized pass.
+        The active rules of every item are kept as a bitmask and only the items whose active rules changed
+        are reported, the gui redraws nothing while an alarm persists.
+        Stale data is measured in engine time, the \a now given to evaluate(), since the timestamp of a
+        component last changed, so it works whether the timestamps come from devices or from the demo data.
+    """
+    def __init__(self, rules: list = ()):
+        """
+            Parameters:
+                - rules (list): AlarmRule-s of the components and connections.
+        """
+        self.rules = list(rules)
+        # Rule tables keyed by store, created when a store is first evaluated. None for stores without rules.
+        self._store_rules = dict()
+        connection_rules = [rule for rule in self.rules if rule.component_type is None]
+        self._connection_rules = _RuleTable(connection_rules) if connection_rules else None
+        # Connection ids and bitmasks of the previous connection evaluation, in the edge order of the power flow.
+        self._edge_ids = None
+        self._edge_state = None
+
+    def _rules_of(self, store: ComponentStore) -> _StoreRules:
+        """Returns the rule table of \a store, None when no rule checks its component type."""
+        if store not in self._store_rules:
+            rules = [rule for rule in self.rules if rule.component_type is store.component_type]
+            self._store_rules[store] = _StoreRules(store, rules) if rules else None
+        return self._store_rules[store]
+
+    def evaluate(self, stores, power_flow: PowerFlowResult, now: float) -> tuple:
+        """
+            Checks every rule and returns the alarm transitions since the previous call.
+
+            Parameters:
+                - stores (iterable): ComponentStore-s of the layer.
+                - power_flow (PowerFlowResult): latest power flow of the layer, None when not solved yet.
+                - now (float): current time in the clock of the update periods.
+
+            Returns:
+                Tuple of (components, channels), the names of the active alarms keyed by the id of every
+                component and connection whose active alarms changed, an empty tuple when they cleared.
+        """
+        components = dict()
+        for store in stores:
+            table = self._rules_of(store)
+            if table is None or store.size == 0:
+                continue
+            rows, masks = table.evaluate(store, now)
+            owners = store.owners
+            for row, mask in zip(rows.tolist(), masks.tolist()):
+                components[owners[row].component_id] = table.active_names(mask)
+
+        channels = dict()
+        table = self._connection_rules
+        if table is not None and power_flow is not None:
+            if self._edge_ids is not power_flow.edge_ids:
+                # The topology changed, the connections keep their state by id.
+                previous = dict(zip(self._edge_ids.tolist(), self._edge_state.tolist())) if self._edge_ids is not None else {}
+                self._edge_ids = power_flow.edge_ids
+                self._edge_state = np.array([previous.get(id, 0) for id in self._edge_ids.tolist()], dtype=np.int64)
+            new = table.transition(np.abs(power_flow.edge_flow)[None, :], self._edge_state)
+            changed = np.flatnonzero(new != self._edge_state)
+            self._edge_state[changed] = new[changed]
+            for id, mask in zip(self._edge_ids[changed].tolist(), new[changed].tolist()):
+                channels[id] = table.active_names(mask)
+        return components, channels
+
+    def active_alarms(self, stores) -> dict:
+        """Returns the names of the active alarms keyed by component id, for the components with any."""
+        active = dict()
+        for store in stores:
+            table = self._store_rules.get(store)
+            if table is None:
+                continue
+            state = store.column(_StoreRules.STATE_COLUMN).astype(np.int64)
+            for row in np.flatnonzero(state).tolist():
+                active[store.owners[row].component_id] = table.active_names(int(state[row]))
+        return active
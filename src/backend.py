@@ -1,57 +1,204 @@
-from PyQt5.QtCore import QObject, QThread, QTimer, QCoreApplication
+from PyQt5.QtCore import QObject, QTimer, QMetaObject
 from PyQt5 import QtCore
 
+import math
+import threading
 import traceback
 import sys
 
-from layer_controller import LayerController
+from backend_core import BackendCore
+from instrumentation import Instrumentation
 
 
 # Signals used by the backend.
 class BackendSignals(QtCore.QObject):
     finished = QtCore.pyqtSignal()
     error = QtCore.pyqtSignal(tuple)
+    # Emitted from the ingestion thread with a batch of device samples.
+    samples_ready = QtCore.pyqtSignal(list)
+    # Emitted once per completed tick with the LayerSnapshot of the changed items.
+    tick_completed = QtCore.pyqtSignal(object)
 
 
 class Backend(QObject):
-    """! Backend logic to handle the business logic.
     """
+        Backend logic to handle the business logic.
+        The backend has no loop of its own, it lives in a worker thread and is driven
+        by that thread's event loop. It only wakes up when one of its timers fires or
+        when a queued call (e.g. a stop request or a batch of device samples) arrives.
+        The update timer is a single shot armed for the next deadline of the component scheduler.
+        Every completed tick is pushed to the gui with one tick_completed signal.
+        The business logic itself lives in the Qt free BackendCore. The gui adds, removes and queries
+        components through the methods of the backend, which serialize access to the core with the
+        worker thread: a tick never runs while the gui changes the stores, the graph or the scheduler.
+    """
+    # Period of the batches of device samples handed over by the ingestion pipeline.
+    UPDATE_PERIOD_MS = 1000
 
-    def __init__(self):
+    def __init__(
+            self,
+            archive_dir: str = None,
+            simulate_devices: bool = False,
+            simulation_speed: float = None,
+            instrumentation: Instrumentation = None):
+        """
+            Parameters:
+                - archive_dir (str): directory of the persistent history archives, histories
+                  are kept in memory only when not given.
+                - simulate_devices (bool): when true every component is fed by a simulated device
+                  through the ingestion pipeline instead of the demo data generators.
+                - simulation_speed (float): when given the demo data follows a simulation clock running
+                  this many times faster than the wall clock.
+                - instrumentation (Instrumentation): timers of the backend stages, disabled ones when not given.
+        """
         super(Backend, self).__init__()
         self.signals = BackendSignals()
-        self.electrical_layer_controller = LayerController()
+        # Held by the worker thread while it runs the core and by the gui thread while it changes or reads it.
+        self.lock = threading.RLock()
+        # The pipeline thread only emits the batches, they are applied in the backend thread.
+        self.core = BackendCore(
+            archive_dir, simulate_devices, self.UPDATE_PERIOD_MS / 1000, self.signals.samples_ready.emit,
+            simulation_speed=simulation_speed, instrumentation=instrumentation)
+        self.signals.samples_ready.connect(self.ingest_samples, QtCore.Qt.QueuedConnection)
 
-        # Thread break guard condition, when true the thread finishes.
-        self.stop = False
+        # Created with the backend as parent, so the timer moves to the worker thread together with it.
+        # Precise, so the wakeups stay within the jitter budgets of the fast components.
         self.update_timer = QTimer(self)
-        self.update_timer.timeout.connect(self.update_data)
-        self.update_timer.start(1000)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.update_timer.timeout.connect(self._run_scheduled)
+        # Set by run() in the worker thread, until then run() arms the timer itself.
+        self._running = False
+
+    @property
+    def electrical_layer_controller(self):
+        """Layer controller of the electrical layer."""
+        return self.core.electrical_layer_controller
+
+    def add_component(self, type: int) -> int:
+        """Creates a new backend component, attaches a simulated device to it if enabled, returns its id."""
+        with self.lock:
+            id = self.core.add_component(type)
+        if self._running:
+            # The new component is due now, the timer may be armed for a later deadline.
+            QMetaObject.invokeMethod(self, "_schedule_next", QtCore.Qt.QueuedConnection)
+        return id
+
+    def add_components(self, types) -> list:
+        """Creates a backend component for every entry of \a types in one call, returns their ids."""
+        with self.lock:
+            ids = self.core.add_components(types)
+        if self._running:
+            QMetaObject.invokeMethod(self, "_schedule_next", QtCore.Qt.QueuedConnection)
+        return ids
+
+    def remove_component(self, id: int) -> list:
+        """Removes a backend component and its device, returns the ids of the removed connections."""
+        with self.lock:
+            return self.core.remove_component(id)
+
+    def add_connection(self, id_start: int, id_end: int) -> int:
+        """Connects the components \a id_start and \a id_end, returns the id of the connection."""
+        with self.lock:
+            return self.electrical_layer_controller.add_component_pair(id_start, id_end)
+
+    def add_connections(self, ids_start, ids_end) -> list:
+        """Connects \a ids_start[i] to \a ids_end[i] for every index in one call, returns the ids of the connections."""
+        with self.lock:
+            return self.electrical_layer_controller.add_component_pairs(ids_start, ids_end)
+
+    def connection_ids(self, id: int) -> list:
+        """Returns the ids of the connections of the component \a id."""
+        with self.lock:
+            return self.electrical_layer_controller.component_pair_ids(id)
+
+    def connections(self) -> list:
+        """Returns the (start id, end id) pair of every connection."""
+        with self.lock:
+            return list(self.electrical_layer_controller.graph.edges.values())
+
+    def component_types(self, ids) -> list:
+        """Returns the type of each component of \a ids."""
+        with self.lock:
+            return [self.electrical_layer_controller.component_type(id) for id in ids]
+
+    @QtCore.pyqtSlot(str, bool)
+    def set_layer_active(self, name: str, active: bool):
+        """Activates or tears down the layer \a name. Has to be invoked in the worker thread."""
+        try:
+            with self.lock:
+                self.core.set_layer_active(name, active)
+                self._schedule_next()
+        except Exception:
+            self._report_error()
 
     def update_data(self):
-        """
-            Periodically called method to update layer controller and all
-            underlying component controllers.
-        """
-        self.electrical_layer_controller.update_demo()
+        """Updates the components due on the scheduler and applies the queued device samples."""
+        try:
+            with self.lock, self.core.instrumentation.timer("update_data"):
+                self.core.run_due()
+                self._emit_snapshot()
+        except Exception:
+            self._report_error()
+
+    @QtCore.pyqtSlot()
+    def _run_scheduled(self):
+        """Update timer handler, runs the due updates and arms the timer for the next deadline."""
+        self.update_data()
+        self._schedule_next()
+
+    @QtCore.pyqtSlot()
+    def _schedule_next(self):
+        """Arms the update timer for the next scheduled update. Has to be called in the worker thread."""
+        with self.lock:
+            delay = self.core.seconds_until_next_run()
+        if delay is None:
+            self.update_timer.stop()
+            return
+        self.update_timer.start(math.ceil(delay * 1000))
+
+    def _emit_snapshot(self):
+        """Pushes the snapshot of the completed tick to the gui, nothing is sent when nothing changed."""
+        snapshot = self.core.take_snapshot()
+        if snapshot is not None:
+            self.signals.tick_completed.emit(snapshot)
+
+    @QtCore.pyqtSlot(list)
+    def ingest_samples(self, samples: list):
+        """Applies a batch of device samples received from the ingestion pipeline."""
+        try:
+            with self.lock:
+                self.core.ingest_samples(samples)
+                self._emit_snapshot()
+        except Exception:
+            self._report_error()
 
     @QtCore.pyqtSlot()
     def run(self):
         """
-            Main loop of the backend.
+            Starts the backend. Called once the worker thread has started,
+            from then on the thread's event loop drives the backend.
         """
         try:
             print("Backend")
-            while (True):
-                QThread.msleep(10)
-                # Backend stopped. Exit.
-                if self.stop:
-                    break
-                QCoreApplication.processEvents()
-
+            with self.lock:
+                self.core.start()
+            self._running = True
+            self._schedule_next()
         except Exception:
-            traceback.print_exc()
-            exctype, value = sys.exc_info()[:2]
-            self.signals.error.emit((exctype, value, traceback.format_exc()))
-        finally:
-            self.signals.finished.emit()  # Done
+            self._report_error()
+
+    @QtCore.pyqtSlot()
+    def stop(self):
+        """Stops the backend timers. Has to be invoked in the worker thread."""
+        self._running = False
+        self.update_timer.stop()
+        with self.lock:
+            self.core.stop()
+        self.signals.finished.emit()  # Done
+
+    def _report_error(self):
+        """Prints and forwards the exception currently being handled."""
+        traceback.print_exc()
+        exctype, value = sys.exc_info()[:2]
+        self.signals.error.emit((exctype, value, traceback.format_exc()))
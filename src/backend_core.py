@@ -0,0 +1,304 @@
+import queue
+
+import numpy as np
+
+from layers.layer_registry import LayerRegistry, LAYER_ELECTRICAL
+from simulation_clock import SimulationClock
+from snapshot import LayerSnapshot, SnapshotExchange
+from update_scheduler import UpdateScheduler
+from instrumentation import Instrumentation
+from metrics_server import MetricFamily
+from ingestion.ingestion_pipeline import IngestionPipeline
+from ingestion.device_simulator import create_simulated_device
+
+
+class BackendCore():
+    """
+        Qt free part of the backend: layer controllers, device ingestion and persistence.
+        It is driven from outside, by the Qt Backend timers in the application or by the
+        headless runner on servers and in benchmarks. Every component is updated with its own
+        period by an UpdateScheduler, run_due() updates the components due and tells when to call it again.
+        The layers are plugins of a LayerRegistry, only the electrical layer is active from the start.
+        In simulation mode the components follow a SimulationClock instead, every run_due() generates
+        all updates elapsed on it in vectorized chunks.
+        The alarms are checked after every update and on a scheduler entry of their own, so the "no data"
+        rules fire when the devices stop sending and nothing else runs.
+    """
+    # Wall clock seconds between two runs in simulation mode.
+    SIMULATION_FRAME = 0.1
+    # Scheduler key, period and jitter of the alarm checks independent of the updates.
+    ALARM_KEY = ("alarms", None)
+    ALARM_PERIOD = 1.0
+    ALARM_JITTER = 0.1
+
+    def __init__(
+            self,
+            archive_dir: str = None,
+            simulate_devices: bool = False,
+            tick_period: float = 1.0,
+            on_batch=None,
+            publish_snapshots: bool = True,
+            simulation_speed: float = None,
+            instrumentation: Instrumentation = None):
+        """
+            Parameters:
+                - archive_dir (str): directory of the persistent history archives, histories
+                  are kept in memory only when not given.
+                - simulate_devices (bool): when true every component is fed by a simulated device
+                  through the ingestion pipeline instead of the demo data generators.
+                - tick_period (float): period of the ticks and of the ingestion batches in seconds.
+                - on_batch (callable): called from the ingestion thread with each batch of samples.
+                  When not given the batches are queued and applied by the next tick().
+                - publish_snapshots (bool): when true a LayerSnapshot of the changed items is published
+                  after every update for the gui, disabled when nothing reads them.
+                - simulation_speed (float): when given the demo data follows a simulation clock running
+                  this many times faster than the wall clock, otherwise it is generated in real time.
+                - instrumentation (Instrumentation): timers of the tick stages, disabled ones when not given.
+                  The runs of tick(), run_due() and ingest_samples() longer than \a tick_period count as overruns.
+        """
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        for stage in ("tick", "run_due", "ingest"):
+            self.instrumentation.set_budget(stage, tick_period)
+        self.scheduler = UpdateScheduler()
+        self.layers = LayerRegistry(self.scheduler, {
+            LAYER_ELECTRICAL: {"archive_dir": archive_dir, "instrumentation": self.instrumentation}})
+        self.electrical_layer_controller = self.layers.activate(LAYER_ELECTRICAL)
+        self.simulate_devices = simulate_devices
+        self.simulation_clock = SimulationClock(simulation_speed) if simulation_speed is not None else None
+        # Time of the device samples, starting at 0 like the demo timestamps and running with the wall clock.
+        # It is advanced to the latest archived sample of the components added, see _continue_device_clock().
+        self.device_clock = SimulationClock(1.0) if simulate_devices else None
+        self.tick_period = tick_period
+        self._batches = queue.SimpleQueue()
+        self.ingestion = IngestionPipeline(on_batch or self._batches.put, tick_period)
+        # Snapshots of the changed state handed over to the gui.
+        self.snapshots = SnapshotExchange()
+        self.publish_snapshots = publish_snapshots
+        self.tick_count = 0
+        # Sizes of the layer read by metrics(), copied after every update by the thread running the updates.
+        self._sizes = None
+        self._capture_sizes()
+        self.scheduler.add(self.ALARM_KEY, self.ALARM_PERIOD, self.ALARM_JITTER)
+
+    def add_component(self, type: int, update_period: float = None, update_jitter: float = None) -> int:
+        """
+            Creates a new backend component, attaches a simulated device to it if enabled, returns its id.
+            The component is first updated by the next run_due(), then every update period.
+
+            Parameters:
+                - type (int): component type to create.
+                - update_period (float): seconds between two updates, the type default when not given.
+                - update_jitter (float): tolerated update lateness in seconds, the type default when not given.
+        """
+        layer = self.electrical_layer_controller
+        id = layer.add_component(type, update_period=update_period, update_jitter=update_jitter)
+        component = layer.components[id]
+        if self.simulate_devices:
+            self._continue_device_clock([component])
+            self.ingestion.add_device(create_simulated_device(id, type, component.update_period, self.clock))
+        elif self.simulation_clock is not None:
+            # Starts at the simulated present instead of generating the time before it was added.
+            if component.history.count == 0:
+                component.timestamp = self.simulation_clock.now()
+        else:
+            self.scheduler.add(id, component.update_period, component.update_jitter, self.scheduler.clock())
+        return id
+
+    def add_components(self, types, update_period: float = None, update_jitter: float = None) -> list:
+        """
+            Creates a backend component for every entry of \a types in one call, see add_component().
+            The components are scheduled with one heap rebuild.
+
+            Returns:
+                Stable ids of the new components, in the order of \a types.
+        """
+        layer = self.electrical_layer_controller
+        ids = layer.add_components(types, update_period=update_period, update_jitter=update_jitter)
+        components = [layer.components[id] for id in ids]
+        if self.simulate_devices:
+            self._continue_device_clock(components)
+            for id, type, component in zip(ids, np.asarray(types).tolist(), components):
+                self.ingestion.add_device(create_simulated_device(id, type, component.update_period, self.clock))
+        elif self.simulation_clock is not None:
+            now = self.simulation_clock.now()
+            for component in components:
+                if component.history.count == 0:
+                    component.timestamp = now
+        else:
+            self.scheduler.add_many(
+                ids,
+                [component.update_period for component in components],
+                [component.update_jitter for component in components],
+                self.scheduler.clock())
+        return ids
+
+    def _continue_device_clock(self, components: list):
+        """
+            Advances the device clock to the latest timestamp restored from the archives of \a components,
+            so their histories continue after a restart like the demo data does instead of running backwards.
+        """
+        latest = max((component.timestamp for component in components if component.history.count), default=None)
+        if latest is not None and latest > self.device_clock.now():
+            self.device_clock.advance(latest - self.device_clock.now())
+
+    def remove_component(self, id: int) -> list:
+        """Removes a backend component and its device, returns the ids of the removed connections."""
+        self.ingestion.remove_device(id)
+        self.scheduler.remove(id)
+        return self.electrical_layer_controller.remove_component(id)
+
+    def ingest_samples(self, samples: list):
+        """Applies a batch of device samples and updates the power flow."""
+        with self.instrumentation.timer("ingest", len(samples)):
+            self.electrical_layer_controller.ingest(samples)
+            self.electrical_layer_controller.solve_power_flow()
+            self._publish_snapshot()
+
+    def run_due(self, now: float = None) -> float:
+        """
+            Updates the components due at \a now, applies the queued device batches.
+            In simulation mode every component is brought up to the simulation clock.
+
+            Returns:
+                Wall clock seconds until the next run is needed, or None when nothing is scheduled.
+        """
+        with self.instrumentation.timer("run_due"):
+            self._run_due(now)
+        return self.seconds_until_next_run()
+
+    def _run_due(self, now: float):
+        """Runs the due updates, see run_due()."""
+        if self.simulate_devices:
+            while not self._batches.empty():
+                self.ingest_samples(self._batches.get_nowait())
+        if now is None:
+            now = self.scheduler.clock()
+        due = self.scheduler.pop_due(now)
+        # Component ids are ints, layer ticks are keyed by ("layer", name) tuples.
+        components = [key for key in due if not isinstance(key, tuple)]
+        alarms_due = False
+        for key in due:
+            if key == self.ALARM_KEY:
+                alarms_due = True
+            elif isinstance(key, tuple):
+                self.layers.tick(key[1], now)
+        published = False
+        if components:
+            self.electrical_layer_controller.update_demo(components)
+            self._publish_snapshot()
+            published = True
+        if self.simulation_clock is not None and not self.simulate_devices:
+            if self.electrical_layer_controller.simulate_until(self.simulation_clock.now()):
+                self._publish_snapshot()
+                published = True
+        if alarms_due and not published:
+            self._publish_changes()
+
+    def seconds_until_next_run(self) -> float:
+        """Wall clock seconds until run_due() has work to do, or None when nothing is scheduled."""
+        deadline = self.scheduler.next_deadline()
+        delay = None if deadline is None else max(0.0, deadline - self.scheduler.clock())
+        if self.simulation_clock is not None and not self.simulate_devices:
+            delay = self.SIMULATION_FRAME if delay is None else min(delay, self.SIMULATION_FRAME)
+        return delay
+
+    def set_layer_active(self, name: str, active: bool):
+        """Activates or tears down the layer \a name, the electrical layer is always active."""
+        if active:
+            self.layers.activate(name)
+        elif name == LAYER_ELECTRICAL:
+            raise Exception("The electrical layer can not be deactivated")
+        else:
+            self.layers.deactivate(name)
+
+    def tick(self):
+        """
+            Updates every component and active layer at once, applies the queued device batches
+            or generates demo data.
+        """
+        with self.instrumentation.timer("tick", len(self.electrical_layer_controller.components)):
+            now = self.scheduler.clock()
+            for name in list(self.layers.layers):
+                self.layers.tick(name, now)
+            if self.simulate_devices:
+                if self._batches.empty():
+                    # No device sent anything, the alarms are checked all the same.
+                    self._publish_changes()
+                while not self._batches.empty():
+                    self.ingest_samples(self._batches.get_nowait())
+            else:
+                self.electrical_layer_controller.update_demo()
+                self._publish_snapshot()
+
+    def clock(self) -> float:
+        """
+            Current time of the component updates: the device clock stamping the samples of the simulated
+            devices, the simulation clock in simulation mode, the scheduler clock otherwise.
+        """
+        if self.simulate_devices:
+            return self.device_clock.now()
+        if self.simulation_clock is not None:
+            return self.simulation_clock.now()
+        return self.scheduler.clock()
+
+    def _publish_snapshot(self):
+        """Checks the alarms and publishes a snapshot of the components and connections changed by the latest update."""
+        self.tick_count += 1
+        self._publish_changes()
+
+    def _publish_changes(self):
+        """Checks the alarms and publishes a snapshot of the changes since the previous one, if there are any."""
+        layer = self.electrical_layer_controller
+        layer.evaluate_alarms(self.clock())
+        self._capture_sizes()
+        changes = layer.collect_changes()
+        if changes and self.publish_snapshots:
+            with self.instrumentation.timer("snapshot", len(changes.components)):
+                snapshot = LayerSnapshot.capture(self.tick_count, layer.components, changes, layer.total_stats())
+            self.snapshots.publish(snapshot)
+
+    def _capture_sizes(self):
+        """Copies the sizes of the layer reported by metrics(), called by the thread updating the layer."""
+        layer = self.electrical_layer_controller
+        self._sizes = (
+            len(layer.components), len(layer.graph.edges), len(layer.active_alarms()), sorted(layer.history_nbytes().items()))
+
+    def metrics(self) -> list:
+        """
+            Returns the size of the backend as MetricFamily-s: components, connections, active alarms,
+            history memory per component type and queue depths. The layer sizes are the copy taken after
+            the latest update and the queues are only asked for their lengths, nothing iterates the stores,
+            so it can be called from any thread, e.g. by a MetricsServer scrape.
+        """
+        component_count, connection_count, alarm_count, history_nbytes = self._sizes
+        components = MetricFamily("smart_home_components", "gauge", "Components of the electrical layer.")
+        components.add(component_count)
+        connections = MetricFamily("smart_home_connections", "gauge", "Connections of the electrical layer.")
+        connections.add(connection_count)
+        alarms = MetricFamily("smart_home_active_alarms", "gauge", "Components with an active alarm.")
+        alarms.add(alarm_count)
+        history = MetricFamily("smart_home_history_bytes", "gauge", "Memory held by the component histories.")
+        for type, nbytes in history_nbytes:
+            history.add(nbytes, {"type": type})
+        queues = MetricFamily("smart_home_queue_depth", "gauge", "Entries waiting in the backend queues.")
+        queues.add(self._batches.qsize(), {"queue": "device_batches"})
+        queues.add(self.ingestion.pending_count, {"queue": "device_samples"})
+        queues.add(int(self.snapshots.pending), {"queue": "snapshots"})
+        queues.add(len(self.scheduler), {"queue": "scheduler"})
+        ticks = MetricFamily("smart_home_ticks_total", "counter", "Completed backend updates.")
+        ticks.add(self.tick_count)
+        return [components, connections, alarms, history, queues, ticks]
+
+    def take_snapshot(self) -> LayerSnapshot:
+        """Returns the snapshot of the changes since the previous call or None, can be called from any thread."""
+        return self.snapshots.take()
+
+    def start(self):
+        """Starts reading the devices."""
+        if self.simulate_devices:
+            self.ingestion.start()
+
+    def stop(self):
+        """Stops reading the devices and tears down the layers, closing the history archives."""
+        self.ingestion.stop()
+        self.layers.teardown()
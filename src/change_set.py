@@ -0,0 +1,21 @@
+class ChangeSet():
+    """
+        Compact description of what changed in a layer since the previous change set:
+        the dirty field bits of each changed component, the new flow of each changed connection
+        and the alarm transitions of both. Consumers only touch the items listed here, idle components cost nothing.
+    """
+    def __init__(self, components: dict = None, channels: dict = None, alarms: dict = None, channel_alarms: dict = None):
+        """
+            Parameters:
+                - components (dict): dirty field bits (see Component.FIELD_BITS) keyed by component id.
+                - channels (dict): power flowing from the start to the end component keyed by connection id.
+                - alarms (dict): names of the active alarms keyed by the id of the components whose alarms changed.
+                - channel_alarms (dict): names of the active alarms keyed by the id of the connections whose alarms changed.
+        """
+        self.components = components if components is not None else dict()
+        self.channels = channels if channels is not None else dict()
+        self.alarms = alarms if alarms is not None else dict()
+        self.channel_alarms = channel_alarms if channel_alarms is not None else dict()
+
+    def __bool__(self) -> bool:
+        return bool(self.components) or bool(self.channels) or bool(self.alarms) or bool(self.channel_alarms)
@@ -0,0 +1,163 @@
+from collections import deque
+
+import numpy as np
+
+
+class ComponentGraph():
+    """
+        Adjacency index of the connections (edges) between components (nodes).
+        Every node keeps a dict of its incident edge ids mapped to the node on the other end,
+        so neighbor and incident edge queries cost O(degree) and edges are added or removed in O(1).
+        Edges are directed from start to end and identified by stable ids that are never reused.
+    """
+    def __init__(self):
+        # Edge endpoints keyed by edge id.
+        self.edges = dict()
+        # Incident edges of each node: node id -> {edge id: neighbor node id}.
+        self._adjacency = dict()
+        self._next_edge_id = 0
+        # Incremented on every structural change, lets users cache derived data.
+        self.version = 0
+
+    def __contains__(self, node: int) -> bool:
+        return node in self._adjacency
+
+    def add_node(self, node: int):
+        """Adds a node without edges."""
+        if node in self._adjacency:
+            raise Exception("Node already exists")
+        self._adjacency[node] = dict()
+        self.version += 1
+
+    def remove_node(self, node: int) -> list:
+        """
+            Removes a node and all of its edges.
+
+            Returns:
+                List of the removed edge ids.
+        """
+        removed_edges = list(self._adjacency[node])
+        for edge_id in removed_edges:
+            self.remove_edge(edge_id)
+        del self._adjacency[node]
+        self.version += 1
+        return removed_edges
+
+    def add_edge(self, start: int, end: int) -> int:
+        """
+            Adds a directed edge between two existing nodes.
+
+            Returns:
+                Stable id of the new edge.
+        """
+        if start not in self._adjacency or end not in self._adjacency:
+            raise Exception("Invalid node id")
+        edge_id = self._next_edge_id
+        self._next_edge_id += 1
+        self.edges[edge_id] = (start, end)
+        self._adjacency[start][edge_id] = end
+        self._adjacency[end][edge_id] = start
+        self.version += 1
+        return edge_id
+
+    def add_edges(self, starts, ends) -> list:
+        """
+            Adds the directed edges from \a starts[i] to \a ends[i] between existing nodes at once,
+            the version is incremented once for the whole batch.
+
+            Returns:
+                Stable ids of the new edges, in the order of the endpoints.
+        """
+        starts = [int(start) for start in starts]
+        ends = [int(end) for end in ends]
+        if len(starts) != len(ends):
+            raise Exception("Edge endpoint count mismatch")
+        adjacency = self._adjacency
+        if any(node not in adjacency for node in starts) or any(node not in adjacency for node in ends):
+            raise Exception("Invalid node id")
+        edge_ids = list(range(self._next_edge_id, self._next_edge_id + len(starts)))
+        self._next_edge_id += len(starts)
+        for edge_id, start, end in zip(edge_ids, starts, ends):
+            self.edges[edge_id] = (start, end)
+            adjacency[start][edge_id] = end
+            adjacency[end][edge_id] = start
+        self.version += 1
+        return edge_ids
+
+    def remove_edge(self, edge_id: int):
+        """Removes the edge \a edge_id."""
+        endpoints = self.edges.pop(edge_id, None)
+        if endpoints is None:
+            raise Exception("Invalid edge id")
+        start, end = endpoints
+        del self._adjacency[start][edge_id]
+        self._adjacency[end].pop(edge_id, None)
+        self.version += 1
+
+    def edge(self, edge_id: int) -> tuple:
+        """Returns the (start, end) node ids of \a edge_id."""
+        return self.edges[edge_id]
+
+    def degree(self, node: int) -> int:
+        """Number of edges incident to \a node."""
+        return len(self._adjacency[node])
+
+    def neighbors(self, node: int) -> list:
+        """Returns the ids of the nodes connected to \a node, once per connecting edge."""
+        return list(self._adjacency[node].values())
+
+    def incident_edges(self, node: int) -> list:
+        """Returns the ids of the edges starting or ending at \a node."""
+        return list(self._adjacency[node])
+
+    def find_path(self, start: int, end: int) -> list:
+        """
+            Breadth first search for the shortest path between two nodes.
+            Each visited node costs O(degree).
+
+            Returns:
+                List of edge ids leading from \a start to \a end, or None when they are not connected.
+        """
+        if start not in self._adjacency or end not in self._adjacency:
+            raise Exception("Invalid node id")
+        previous_edge = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == end:
+                path = list()
+                while previous_edge[node] is not None:
+                    edge_id = previous_edge[node]
+                    path.append(edge_id)
+                    edge_start, edge_end = self.edges[edge_id]
+                    node = edge_start if edge_end == node else edge_end
+                path.reverse()
+                return path
+            for edge_id, neighbor in self._adjacency[node].items():
+                if neighbor not in previous_edge:
+                    previous_edge[neighbor] = edge_id
+                    queue.append(neighbor)
+        return None
+
+    def to_csr(self) -> tuple:
+        """
+            Exports the undirected adjacency in compressed sparse row form for vectorized algorithms.
+
+            Returns:
+                Tuple of (node_ids, offsets, neighbors, edge_ids). The neighbors and incident edges of
+                node_ids[i] are neighbors[offsets[i]:offsets[i + 1]] and edge_ids[offsets[i]:offsets[i + 1]],
+                neighbors are given as indices into node_ids.
+        """
+        node_ids = np.fromiter(self._adjacency, dtype=np.int64, count=len(self._adjacency))
+        index = {node: i for i, node in enumerate(node_ids.tolist())}
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum([len(incident) for incident in self._adjacency.values()], out=offsets[1:])
+        neighbors = np.empty(offsets[-1], dtype=np.int64)
+        edge_ids = np.empty(offsets[-1], dtype=np.int64)
+        position = 0
+        for incident in self._adjacency.values():
+            for edge_id, neighbor in incident.items():
+                neighbors[position] = index[neighbor]
+                edge_ids[position] = edge_id
+                position += 1
+        return node_ids, offsets, neighbors, edge_ids
@@ -0,0 +1,136 @@
+import json
+import os
+
+import numpy as np
+
+from components.component_types import TYPE_NAMES, TYPE_SOLAR_PANEL, TYPE_BATTERY
+
+
+class ComponentLayout():
+    """
+        Components of a smart home with their canvas positions and the connections between them.
+        The layout is kept as parallel arrays, so thousands of components are created with one
+        bulk call. It is stored either as JSON, to be read and edited by humans, or as an
+        uncompressed numpy archive (.npz), which loads without parsing.
+        The ids in a layout are only meaningful within it, the components get new ids when created.
+    """
+    FORMAT = "smart-home-layout"
+    VERSION = 1
+    JSON_EXTENSION = ".json"
+    BINARY_EXTENSION = ".npz"
+
+    def __init__(self, ids, types, x, y, starts=(), ends=()):
+        """
+            Parameters:
+                - ids: id of every component.
+                - types: component type of every component.
+                - x, y: canvas coordinates of every component.
+                - starts, ends: component ids of the start and end of every connection.
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.types = np.asarray(types, dtype=np.int64)
+        self.x = np.asarray(x, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self._validate()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _validate(self):
+        """Checks the array lengths, the component types and that every connection joins two listed components."""
+        if not len(self.ids) == len(self.types) == len(self.x) == len(self.y) or len(self.starts) != len(self.ends):
+            raise Exception("Layout array length mismatch")
+        if len(np.unique(self.ids)) != len(self.ids):
+            raise Exception("Duplicate component id in layout")
+        if not np.isin(self.types, list(TYPE_NAMES)).all():
+            raise Exception("Unknown component type in layout")
+        if not (np.isin(self.starts, self.ids).all() and np.isin(self.ends, self.ids).all()):
+            raise Exception("Layout connection refers to an unknown component")
+
+    def connection_indices(self) -> tuple:
+        """Returns the positions of the start and end components of every connection in the component arrays."""
+        order = np.argsort(self.ids)
+        sorted_ids = self.ids[order]
+        return order[np.searchsorted(sorted_ids, self.starts)], order[np.searchsorted(sorted_ids, self.ends)]
+
+    @classmethod
+    def demo(cls, components: int, columns: int = 50, spacing: int = 300) -> "ComponentLayout":
+        """
+            Creates a synthetic house of \\a components devices on a grid of \\a columns, for benchmarks.
+            Every battery is the hub of the solar panels on its left in the same row,
+            and the hubs are chained along the rows.
+
+            Parameters:
+                - components (int): number of components.
+                - columns (int): number of components per grid row.
+                - spacing (int): distance of the grid cells on the canvas.
+        """
+        index = np.arange(components)
+        types = np.where(index % 4 == 3, TYPE_BATTERY, TYPE_SOLAR_PANEL)
+        hubs = np.flatnonzero(types == TYPE_BATTERY)
+        panels = np.flatnonzero(types == TYPE_SOLAR_PANEL)
+        # Panels after the last hub are connected to it as well.
+        panel_hubs = hubs[np.minimum(np.searchsorted(hubs, panels), len(hubs) - 1)] if len(hubs) else panels[:0]
+        starts = np.concatenate((panels[:len(panel_hubs)], hubs[:-1]))
+        ends = np.concatenate((panel_hubs, hubs[1:]))
+        return cls(index, types, (index % columns) * spacing, (index // columns) * spacing, starts, ends)
+
+    @classmethod
+    def load(cls, path: str) -> "ComponentLayout":
+        """Reads a layout file, the format is chosen by the extension of \\a path."""
+        if path.endswith(cls.BINARY_EXTENSION):
+            with np.load(path, allow_pickle=False) as archive:
+                if str(archive["format"]) != cls.FORMAT or int(archive["version"]) != cls.VERSION:
+                    raise Exception(f"Incompatible layout file: {path}")
+                return cls(*(archive[name] for name in ("ids", "types", "x", "y", "starts", "ends")))
+        with open(path, "r", encoding="utf-8") as layout_file:
+            return cls.from_json(json.load(layout_file))
+
+    def save(self, path: str):
+        """Writes the layout to \\a path, as a numpy archive when it ends with .npz and as JSON otherwise."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith(self.BINARY_EXTENSION):
+            np.savez(
+                path, format=np.array(self.FORMAT), version=np.array(self.VERSION), ids=self.ids, types=self.types,
+                x=self.x, y=self.y, starts=self.starts, ends=self.ends)
+            return
+        with open(path, "w", encoding="utf-8") as layout_file:
+            json.dump(self.to_json(), layout_file, indent=1)
+
+    @classmethod
+    def from_json(cls, document: dict) -> "ComponentLayout":
+        """Creates a layout from the parsed JSON \\a document."""
+        if document.get("format") != cls.FORMAT or document.get("version") != cls.VERSION:
+            raise Exception("Incompatible layout document")
+        type_ids = {name: type for type, name in TYPE_NAMES.items()}
+        components = document.get("components", [])
+        connections = document.get("connections", [])
+        try:
+            types = [type_ids[component["type"]] for component in components]
+        except KeyError:
+            raise Exception("Unknown component type in layout")
+        return cls(
+            [component["id"] for component in components],
+            types,
+            [component["x"] for component in components],
+            [component["y"] for component in components],
+            [connection["start"] for connection in connections],
+            [connection["end"] for connection in connections])
+
+    def to_json(self) -> dict:
+        """Returns the JSON document of the layout."""
+        return {
+            "format": self.FORMAT,
+            "version": self.VERSION,
+            "components": [
+                {"id": id, "type": TYPE_NAMES[type], "x": x, "y": y}
+                for id, type, x, y in zip(self.ids.tolist(), self.types.tolist(), self.x.tolist(), self.y.tolist())
+            ],
+            "connections": [
+                {"start": start, "end": end} for start, end in zip(self.starts.tolist(), self.ends.tolist())
+            ],
+        }
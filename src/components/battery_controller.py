@@ -1,26 +1,72 @@
-import random
+import numpy as np
 
-from components.component import Component
+from components import synthetic_profiles
+from components.component import Component, FLOW_STORAGE
+from components.component_store import ComponentStore, StoreField
+from components.history_buffer import DEFAULT_HISTORY_CAPACITY
 
 
 class BatteryController(Component):
     """This controller handles all chemical battery related data and management control."""
-    def __init__(self):
-        super(BatteryController, self).__init__()
-        self.battery_charge_kWh = 0
-        self.battery_capacity_kWh = 36
-        self.charge_percent = 0
-        self.charge_history = list()
-        self.charge_history_timestamps = list()
-        self.timestamp = 0
+    __slots__ = ()
+
+    HISTORY_FIELDS = ("battery_charge_kWh",)
+    FLOW_ROLE = FLOW_STORAGE
+    INGEST_FIELDS = ("battery_charge_kWh",)
+
+    battery_charge_kWh = StoreField(0)
+    battery_capacity_kWh = StoreField(36)
+    charge_percent = StoreField(0)
+
+    # Demo daily cycle of the state of charge: charged by the panels during the day, peaking in the
+    # afternoon and drained overnight, plus a correlated random deviation.
+    CHARGE_MEAN = 0.55
+    CHARGE_SWING = 0.3
+    CHARGE_PEAK_HOUR = 16.0
+    CHARGE_VARIABILITY = 0.05
+    CHARGE_CORRELATION_S = 3600.0
+    MINIMUM_CHARGE = 0.05
+
+    # Deviation of the demo state of charge from its daily cycle, the state of its random process.
+    charge_state = StoreField(0, tracked=False)
+
+    def __init__(
+            self, store: ComponentStore = None, history_capacity: int = DEFAULT_HISTORY_CAPACITY, component_id: int = None):
+        super(BatteryController, self).__init__(store, history_capacity, component_id)
 
     def generate_demo_data(self):
         """Generates a demo/functional test data."""
-        self.battery_charge_kWh += random.randint(10, 40) / 1000
-        self.charge_percent = self.battery_charge_kWh * 100.0 / self.battery_capacity_kWh
-        self.charge_history.append(self.battery_charge_kWh)
-        self.timestamp += 1
-        self.charge_history_timestamps.append(self.timestamp)
-        if len(self.charge_history) > 50:
-            self.charge_history.pop(0)
-            self.charge_history_timestamps.pop(0)
+        self.generate_demo_batch(self.store, np.array([self.row]))
+
+    @classmethod
+    def generate_demo_batch(cls, store: ComponentStore, rows=None):
+        """Generates demo data for \a rows of \a store at once, for every battery when not given."""
+        if rows is None:
+            rows = np.arange(store.size)
+        timestamps, (charge,) = cls.generate_demo_steps(store, rows, 1)
+        store.history.append_rows(rows, timestamps[0], charge[0])
+
+    @classmethod
+    def generate_demo_steps(cls, store: ComponentStore, rows: np.ndarray, steps: int) -> tuple:
+        """Generates \a steps demo updates for \a rows of \a store at once, see Component.generate_demo_steps."""
+        columns = store.columns
+        periods = columns["update_period"][rows]
+        timestamps = columns["timestamp"][rows] + np.outer(np.arange(1, steps + 1), periods)
+        correlation = synthetic_profiles.persistence(periods, cls.CHARGE_CORRELATION_S)
+        innovations = store.normal(rows, steps) * (cls.CHARGE_VARIABILITY * np.sqrt(1 - correlation ** 2))
+        deviation = synthetic_profiles.ar1(columns["charge_state"][rows], innovations, correlation)
+        hours = synthetic_profiles.hour_of_day(timestamps)
+        cycle = cls.CHARGE_MEAN + cls.CHARGE_SWING * np.cos(2 * np.pi * (hours - cls.CHARGE_PEAK_HOUR) / 24)
+        charge = np.clip(cycle + deviation, cls.MINIMUM_CHARGE, 1.0) * columns["battery_capacity_kWh"][rows]
+
+        columns["charge_state"][rows] = deviation[-1]
+        store.write("battery_charge_kWh", rows, charge[-1])
+        cls.update_derived(store, rows)
+        store.write("timestamp", rows, timestamps[-1])
+        return timestamps, (charge,)
+
+    @classmethod
+    def update_derived(cls, store: ComponentStore, rows):
+        """Recomputes the charge percentage of \a rows from their stored charge."""
+        columns = store.columns
+        store.write("charge_percent", rows, columns["battery_charge_kWh"][rows] * 100.0 / columns["battery_capacity_kWh"][rows])
@@ -1,7 +1,131 @@
+from components.component_store import ComponentStore, StoreField
+from components.history_buffer import DEFAULT_HISTORY_CAPACITY, HistoryRow
+
+# Roles of the components in the power flow of a layer.
+FLOW_SOURCE = 1
+FLOW_LOAD = 2
+FLOW_STORAGE = 3
+
+
 class Component():
-    """Base class for all component controllers."""
-    def __init__(self):
-        self.connected_ids = list()
+    """
+        Base class for all component controllers.
+        The state of a component is kept in a row of a ComponentStore shared by all
+        components of the same type. State fields are declared as StoreField class attributes.
+        Instances are slotted and hold only their id, store and row, so a controller costs about
+        150 bytes next to its store row; subclasses declare `__slots__ = ()` to keep it that way.
+    """
+    __slots__ = ("component_id", "store", "row")
+
+    # Names of the value columns the component records into its history.
+    HISTORY_FIELDS = ()
+    # Default value of each state field, collected from the StoreField attributes.
+    STATE_FIELDS = {}
+    # Dirty bit of each tracked state field and the union of them.
+    FIELD_BITS = {}
+    ALL_FIELD_BITS = 0
+    # Role in the power flow and the state field holding the produced or consumed power.
+    # Storage components absorb the balance of their island and need no field.
+    FLOW_ROLE = None
+    FLOW_FIELD = None
+    # State fields reported by the device of the component, in the order of the sample values.
+    INGEST_FIELDS = ()
+
+    # Advances with every sample, its dirty bit tells that the history grew and the chart has to scroll.
+    timestamp = StoreField(0)
+    # Seconds between two updates of the component and the lateness tolerated by its device.
+    update_period = StoreField(1.0, tracked=False)
+    update_jitter = StoreField(0.05, tracked=False)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = dict()
+        tracked = list()
+        for klass in reversed(cls.__mro__):
+            for name, attribute in vars(klass).items():
+                if isinstance(attribute, StoreField):
+                    fields[name] = attribute.default
+                    if attribute.tracked and name not in tracked:
+                        tracked.append(name)
+        if len(tracked) > 32:
+            raise Exception("At most 32 tracked state fields are supported")
+        cls.STATE_FIELDS = fields
+        cls.FIELD_BITS = {name: 1 << index for index, name in enumerate(tracked)}
+        cls.ALL_FIELD_BITS = (1 << len(tracked)) - 1
+
+    @classmethod
+    def field_mask(cls, *names: str) -> int:
+        """Returns the union of the dirty bits of the state fields \a names."""
+        mask = 0
+        for name in names:
+            mask |= cls.FIELD_BITS[name]
+        return mask
+
+    def __init__(
+            self, store: ComponentStore = None, history_capacity: int = DEFAULT_HISTORY_CAPACITY, component_id: int = None):
+        """
+            Parameters:
+                - store (ComponentStore): store the component state is kept in,
+                  a private store is created when not given.
+                - history_capacity (int): history length of the private store.
+                - component_id (int): stable id assigned by the owning layer controller, also the key
+                  of the random stream of the component.
+        """
+        self.component_id = component_id
+        if store is None:
+            store = ComponentStore(type(self), history_capacity, capacity=1)
+        self.store = store
+        self.row = store.allocate(self, component_id)
+
+    @property
+    def history(self) -> HistoryRow:
+        """History of the component."""
+        return self.store.history_row(self.row)
 
     def generate_demo_data(self):
         pass
+
+    @classmethod
+    def generate_demo_batch(cls, store: ComponentStore, rows=None):
+        """Generates demo data for \a rows of \a store at once, for every row when not given."""
+        owners = store.owners if rows is None else [store.owners[row] for row in rows]
+        for component in owners:
+            component.generate_demo_data()
+
+    @classmethod
+    def generate_demo_steps(cls, store: ComponentStore, rows, steps: int) -> tuple:
+        """
+            Generates \a steps consecutive demo updates for \a rows of \a store at once and leaves
+            the state of the rows at the last step. Vectorized implementations do not touch the history
+            and return the generated samples, this default runs generate_demo_batch() step by step,
+            which records the history itself.
+
+            Returns:
+                Tuple of (timestamps, columns), the timestamps and one array per HISTORY_FIELDS entry,
+                each of shape (steps, len(rows)), or None when the history was already recorded.
+        """
+        for _ in range(steps):
+            cls.generate_demo_batch(store, rows)
+        return None
+
+    @classmethod
+    def update_derived(cls, store: ComponentStore, rows):
+        """Recomputes the state fields derived from the measured ones for \a rows of \a store."""
+        pass
+
+    @classmethod
+    def apply_samples(cls, store: ComponentStore, rows, timestamps, values):
+        """
+            Writes one device sample into each of the given rows and appends them to the history.
+
+            Parameters:
+                - store (ComponentStore): store of the components.
+                - rows (np.ndarray): store rows of the sampled components, each row at most once.
+                - timestamps (np.ndarray): timestamp of each sample.
+                - values (np.ndarray): sample values with one row per INGEST_FIELDS entry and one column per row.
+        """
+        for name, column in zip(cls.INGEST_FIELDS, values):
+            store.write(name, rows, column)
+        store.write("timestamp", rows, timestamps)
+        cls.update_derived(store, rows)
+        store.history.append_rows(rows, timestamps, *(store.columns[name][rows] for name in cls.HISTORY_FIELDS))
@@ -0,0 +1,294 @@
+import numpy as np
+
+from components.history_buffer import HistoryBuffer, HistoryRow, DEFAULT_HISTORY_CAPACITY
+
+
+class StoreField():
+    """
+        Descriptor exposing one column of the component's store as a plain attribute,
+        so single component code can keep reading and writing e.g. `self.power_kWh`.
+        Writing a tracked field with a new value marks it dirty in the store.
+    """
+    def __init__(self, default: float = 0.0, tracked: bool = True):
+        self.default = default
+        self.tracked = tracked
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, component, owner=None):
+        if component is None:
+            return self
+        return component.store.columns[self.name][component.row].item()
+
+    def __set__(self, component, value: float):
+        column = component.store.columns[self.name]
+        if self.tracked and column[component.row] != value:
+            component.store.dirty[component.row] |= component.FIELD_BITS[self.name]
+        column[component.row] = value
+
+
+class ComponentStore():
+    """
+        Struct of arrays holding the live state of every component of one type.
+        Each state field is a numpy column and each component owns one row, so a tick
+        can update all components of the type with a handful of vectorized operations.
+        The history of every row lives in one shared HistoryBuffer.
+        Changes of the tracked fields are recorded in a per-row bitmask (one bit per field,
+        see Component.FIELD_BITS), so consumers can pick up only the rows that changed.
+        Every row has its own random stream for the demo generators, a PCG64 stream spawned
+        from the store seed, whose normal samples are drawn ahead in small blocks so a tick
+        reads the next sample of every row with one fancy index. Only the 128 bit state and
+        increment of each stream are kept, in the rng_state column, and loaded into one shared
+        generator to draw a block: a numpy Generator object per row costs more than 1 KB.
+    """
+    INITIAL_CAPACITY = 4
+    # Number of normal samples drawn ahead per row.
+    NOISE_BLOCK = 32
+    # Mask of the low 64 bits of the 128 bit PCG64 state and increment.
+    _UINT64_MASK = (1 << 64) - 1
+
+    def __init__(
+            self,
+            component_type: type,
+            history_capacity: int = DEFAULT_HISTORY_CAPACITY,
+            seed: int = None,
+            capacity: int = INITIAL_CAPACITY,
+            pyramid_levels: int = 0,
+            stats_window: float = None):
+        """
+            Parameters:
+                - component_type (type): controller class whose instances are stored.
+                - history_capacity (int): number of history samples kept per component.
+                - seed (int): root seed of the random streams of the rows, see seed_row().
+                - capacity (int): number of rows allocated up front, the store grows on demand.
+                - pyramid_levels (int): number of downsampling levels kept next to the histories.
+                - stats_window (float): window of the rolling statistics of the histories in seconds,
+                  none are kept when not given.
+        """
+        self.component_type = component_type
+        self.fields = dict(component_type.STATE_FIELDS)
+        self.size = 0
+        self.owners = list()
+        self.seed_sequence = np.random.SeedSequence(seed)
+        # Random stream state of each row and its normal samples drawn ahead, consumed from the cursor on.
+        # Columns of rng_state: high and low 64 bits of the PCG64 state, then of its increment.
+        self.rng_state = np.zeros((capacity, 4), dtype=np.uint64)
+        self._bit_generator = np.random.PCG64()
+        self._generator = np.random.Generator(self._bit_generator)
+        self.noise = np.zeros((capacity, self.NOISE_BLOCK))
+        self.noise_cursor = np.zeros(capacity, dtype=np.int64)
+        self.columns = {
+            name: np.full(capacity, default, dtype=np.float64)
+            for name, default in self.fields.items()
+        }
+        # Columns added with add_column() and their defaults, kept apart from the state fields.
+        self.extra_fields = dict()
+        self.extra_columns = dict()
+        # Dirty field bits of each row, set on writes that change a tracked field.
+        self.dirty = np.zeros(capacity, dtype=np.uint32)
+        self.history = HistoryBuffer(
+            component_type.HISTORY_FIELDS, history_capacity, capacity, pyramid_levels, stats_window)
+
+    @property
+    def capacity(self) -> int:
+        """Number of rows allocated in the columns."""
+        return self.history.rows
+
+    def reserve(self, count: int):
+        """Grows the store at once so \a count more rows fit, instead of doubling repeatedly while allocating."""
+        if self.size + count > self.capacity:
+            self._grow(self.size + count)
+
+    def allocate(self, owner, key: int = None) -> int:
+        """Reserves a row with default values for \a owner and returns its index, see seed_row() for \a key."""
+        if self.size == self.capacity:
+            self._grow(2 * self.capacity)
+        row = self.size
+        for name, default in self.fields.items():
+            self.columns[name][row] = default
+        for name, default in self.extra_fields.items():
+            self.extra_columns[name][row] = default
+        # A new row is reported as changed in all fields, so it gets drawn once.
+        self.dirty[row] = self.component_type.ALL_FIELD_BITS
+        self.history.clear(row)
+        self.owners.append(owner)
+        self.size += 1
+        self.seed_row(row, key)
+        return row
+
+    def seed_row(self, row: int, key: int = None):
+        """
+            Gives \a row a new random stream. Streams keyed by e.g. the component id depend only on the
+            store seed and the key, so a component gets the same data whatever else is in the layout.
+            Without a key the next child of the store seed sequence is spawned.
+        """
+        if key is None:
+            seed_sequence = self.seed_sequence.spawn(1)[0]
+        else:
+            seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=(key,))
+        self._save_stream(row, np.random.PCG64(seed_sequence).state["state"])
+        self._refill(row)
+
+    def _load_stream(self, row: int) -> np.random.Generator:
+        """Loads the stream state of \a row into the shared generator and returns it."""
+        state_high, state_low, increment_high, increment_low = self.rng_state[row].tolist()
+        self._bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": state_high << 64 | state_low, "inc": increment_high << 64 | increment_low},
+            "has_uint32": 0,
+            "uinteger": 0,
+        }
+        return self._generator
+
+    def _save_stream(self, row: int, state: dict = None):
+        """Stores \a state, by default the one of the shared generator, as the stream state of \a row."""
+        if state is None:
+            state = self._bit_generator.state["state"]
+        mask = self._UINT64_MASK
+        self.rng_state[row] = (state["state"] >> 64, state["state"] & mask, state["inc"] >> 64, state["inc"] & mask)
+
+    def normal(self, rows: np.ndarray, steps: int = 1) -> np.ndarray:
+        """
+            Draws the next \a steps standard normal samples of each of \a rows from their own streams.
+
+            Returns:
+                (steps, len(rows)) array of samples.
+        """
+        block = self.NOISE_BLOCK
+        cursor = self.noise_cursor[rows]
+        if steps <= block and (cursor + steps <= block).all():
+            samples = self.noise[rows[None, :], cursor[None, :] + np.arange(steps)[:, None]]
+            cursor += steps
+            self.noise_cursor[rows] = cursor
+            for row in rows[cursor == block].tolist():
+                self._refill(row)
+            return samples
+        # Long runs are drawn straight into the contiguous row of each stream.
+        samples = np.empty((len(rows), steps))
+        for index, row in enumerate(rows.tolist()):
+            start = int(cursor[index])
+            buffered = min(block - start, steps)
+            samples[index, :buffered] = self.noise[row, start:start + buffered]
+            if buffered < steps:
+                self._load_stream(row).standard_normal(out=samples[index, buffered:])
+                self._save_stream(row)
+                self._refill(row)
+            elif start + buffered == block:
+                self._refill(row)
+            else:
+                self.noise_cursor[row] = start + buffered
+        return samples.T
+
+    def _refill(self, row: int):
+        """Draws the next block of normal samples of \a row."""
+        self._load_stream(row).standard_normal(out=self.noise[row])
+        self._save_stream(row)
+        self.noise_cursor[row] = 0
+
+    def release(self, row: int):
+        """
+            Frees \a row in O(1) by moving the last row into its place.
+            The owner of the moved row gets its row index updated.
+        """
+        last = self.size - 1
+        if row != last:
+            for column in self.columns.values():
+                column[row] = column[last]
+            for column in self.extra_columns.values():
+                column[row] = column[last]
+            self.dirty[row] = self.dirty[last]
+            self.rng_state[row] = self.rng_state[last]
+            self.noise[row] = self.noise[last]
+            self.noise_cursor[row] = self.noise_cursor[last]
+            self.history.move_row(last, row)
+            self.owners[row] = self.owners[last]
+            self.owners[row].row = row
+        else:
+            self.history.clear(last)
+        self.dirty[last] = 0
+        self.owners.pop()
+        self.size -= 1
+
+    def _grow(self, capacity: int):
+        """Reallocates the columns and the history to \a capacity rows."""
+        for fields, columns in ((self.fields, self.columns), (self.extra_fields, self.extra_columns)):
+            for name, column in columns.items():
+                grown = np.full(capacity, fields[name], dtype=np.float64)
+                grown[:self.size] = column[:self.size]
+                columns[name] = grown
+        dirty = np.zeros(capacity, dtype=np.uint32)
+        dirty[:self.size] = self.dirty[:self.size]
+        self.dirty = dirty
+        rng_state = np.zeros((capacity, 4), dtype=np.uint64)
+        rng_state[:self.size] = self.rng_state[:self.size]
+        self.rng_state = rng_state
+        noise = np.zeros((capacity, self.NOISE_BLOCK))
+        noise[:self.size] = self.noise[:self.size]
+        self.noise = noise
+        noise_cursor = np.zeros(capacity, dtype=np.int64)
+        noise_cursor[:self.size] = self.noise_cursor[:self.size]
+        self.noise_cursor = noise_cursor
+        self.history.resize(capacity)
+
+    def add_column(self, name: str, default: float = 0.0):
+        """
+            Adds a column that is not a state field of the component type, e.g. bookkeeping of the alarm engine.
+            It is kept in extra_columns, allocated, grown and moved with the rows like the state fields,
+            but it never marks a row dirty and is not part of the fields and columns read by the snapshots.
+            Adding an existing column does nothing.
+        """
+        if name in self.fields:
+            raise Exception(f"{name} is a state field of {self.component_type.__name__}")
+        if name in self.extra_columns:
+            return
+        self.extra_fields[name] = default
+        self.extra_columns[name] = np.full(self.capacity, default, dtype=np.float64)
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns a view of the used part of the \a name column, a state field or an added column."""
+        column = self.columns.get(name)
+        if column is None:
+            column = self.extra_columns[name]
+        return column[:self.size]
+
+    def write(self, name: str, rows, values):
+        """
+            Writes \a values into \a rows of the \a name column and marks the rows whose value changed.
+
+            Parameters:
+                - name (str): state field to write.
+                - rows (slice or np.ndarray): rows to write, each row at most once.
+                - values (float or np.ndarray): new values, one per row.
+        """
+        column = self.columns[name]
+        bit = self.component_type.FIELD_BITS.get(name)
+        if bit is not None:
+            self.dirty[rows] |= np.where(column[rows] != values, np.uint32(bit), np.uint32(0))
+        column[rows] = values
+
+    def take_changes(self) -> tuple:
+        """
+            Returns the rows changed since the previous call and clears their dirty bits.
+
+            Returns:
+                Tuple of (rows, masks), the indices of the changed rows and their dirty field bits.
+        """
+        rows = np.flatnonzero(self.dirty[:self.size])
+        masks = self.dirty[rows]
+        self.dirty[rows] = 0
+        return rows, masks
+
+    def history_row(self, row: int) -> HistoryRow:
+        """Returns a handle to the history of \a row."""
+        return HistoryRow(self.history, row)
+
+    def append_history(self, rows: np.ndarray = None):
+        """Appends the current state of \a rows, every row when not given, to the history in one vectorized write."""
+        if rows is None:
+            rows = np.arange(self.size)
+        self.history.append_rows(
+            rows,
+            self.columns["timestamp"][rows],
+            *(self.columns[name][rows] for name in self.history.fields))
@@ -0,0 +1,10 @@
+# Component type ids shared by the backend and the gui. Kept free of Qt imports,
+# so the backend can run headless.
+TYPE_SOLAR_PANEL = 0
+TYPE_BATTERY = 1
+
+# Names of the component types in the layout files.
+TYPE_NAMES = {
+    TYPE_SOLAR_PANEL: "solar_panel",
+    TYPE_BATTERY: "battery",
+}
@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+
+
+class HistoryArchive():
+    """
+        Append-only, memory-mapped file of fixed-width history records (timestamp + field values).
+        The file starts with a small header holding the field names and the record count,
+        followed by the records in timestamp order. The file is grown in chunks and accessed
+        through numpy memory maps, so old data costs page cache instead of heap and range
+        reads are a binary search on the timestamp column.
+    """
+    MAGIC = b"SHHIST01"
+    HEADER_DTYPE = np.dtype([("magic", "S8"), ("count", "<u8"), ("fields", "S240")])
+    GROWTH_RECORDS = 4096
+
+    def __init__(self, path: str, fields: tuple):
+        """
+            Opens the archive at \a path, creates it when it does not exist.
+
+            Parameters:
+                - path (str): archive file path.
+                - fields (tuple): names of the value fields stored after the timestamp.
+        """
+        self.path = path
+        self.fields = tuple(fields)
+        self.record_dtype = np.dtype([("timestamp", "<f8")] + [(name, "<f8") for name in self.fields])
+        encoded_fields = ",".join(self.fields).encode("ascii")
+        if not os.path.exists(path) or os.path.getsize(path) < self.HEADER_DTYPE.itemsize:
+            with open(path, "wb") as archive_file:
+                header = np.zeros((), dtype=self.HEADER_DTYPE)
+                header["magic"] = self.MAGIC
+                header["fields"] = encoded_fields
+                archive_file.write(header.tobytes())
+                archive_file.truncate(self.HEADER_DTYPE.itemsize + self.GROWTH_RECORDS * self.record_dtype.itemsize)
+        self._map()
+        if self._header["magic"] != self.MAGIC or self._header["fields"] != encoded_fields:
+            raise Exception(f"Incompatible history archive: {path}")
+
+    def _map(self):
+        """Maps the header and the record area of the file."""
+        size = os.path.getsize(self.path)
+        self._header = np.memmap(self.path, dtype=self.HEADER_DTYPE, mode="r+", shape=())
+        self._records = np.memmap(
+            self.path,
+            dtype=self.record_dtype,
+            mode="r+",
+            offset=self.HEADER_DTYPE.itemsize,
+            shape=((size - self.HEADER_DTYPE.itemsize) // self.record_dtype.itemsize,))
+
+    def _reserve(self, count: int):
+        """Grows the file so at least \a count records fit."""
+        if count <= len(self._records):
+            return
+        capacity = max(count, 2 * len(self._records), self.GROWTH_RECORDS)
+        self.flush()
+        del self._records
+        del self._header
+        with open(self.path, "r+b") as archive_file:
+            archive_file.truncate(self.HEADER_DTYPE.itemsize + capacity * self.record_dtype.itemsize)
+        self._map()
+
+    def __len__(self) -> int:
+        return int(self._header["count"])
+
+    def append(self, timestamp: float, *values: float):
+        """Appends one record, values are given in the order of the archive fields."""
+        count = len(self)
+        self._reserve(count + 1)
+        self._records[count] = (timestamp,) + values
+        self._header["count"] = count + 1
+
+    def extend(self, timestamps: np.ndarray, *columns: np.ndarray):
+        """Appends a block of records given as one array per column."""
+        count = len(self)
+        added = len(timestamps)
+        self._reserve(count + added)
+        block = self._records[count:count + added]
+        block["timestamp"] = timestamps
+        for name, column in zip(self.fields, columns):
+            block[name] = column
+        self._header["count"] = count + added
+
+    def records(self) -> np.ndarray:
+        """Returns a read-only view of all stored records."""
+        view = self._records[:len(self)].view(np.ndarray)
+        view.flags.writeable = False
+        return view
+
+    def latest(self, count: int) -> np.ndarray:
+        """Returns a view of the latest \a count records."""
+        return self.records()[-count:] if count > 0 else self.records()[:0]
+
+    def read_range(self, start: float, end: float) -> np.ndarray:
+        """Returns a view of the records with start <= timestamp < end."""
+        records = self.records()
+        timestamps = records["timestamp"]
+        return records[np.searchsorted(timestamps, start, "left"):np.searchsorted(timestamps, end, "left")]
+
+    def flush(self):
+        """Writes the dirty pages of the archive to disk."""
+        self._records.flush()
+        self._header.flush()
+
+    def close(self):
+        """Flushes and unmaps the archive."""
+        self.flush()
+        del self._records
+        del self._header
+
+    def delete(self):
+        """Unmaps the archive and deletes its file."""
+        del self._records
+        del self._header
+        os.remove(self.path)
@@ -0,0 +1,482 @@
+import numpy as np
+
+from components.rolling_stats import RollingStats
+
+DEFAULT_HISTORY_CAPACITY = 3600
+# Downsampling levels kept next to the raw samples by the layer controllers.
+DEFAULT_PYRAMID_LEVELS = 1
+
+
+class HistoryBuffer():
+    """
+        Fixed capacity ring buffers of timestamped samples stored in preallocated numpy columns.
+        The buffer holds one ring per row, so all components of a store can share a single block
+        and be appended in one vectorized write. Every sample is written twice (at index i and
+        i + capacity), so the latest samples of a row always form a contiguous slice and windows
+        are returned as views without copying.
+        Optionally a HistoryPyramid is maintained next to the raw samples for downsampled reads,
+        and RollingStats over a time window that can be longer than the buffer.
+    """
+    def __init__(
+            self,
+            fields: tuple,
+            capacity: int = DEFAULT_HISTORY_CAPACITY,
+            rows: int = 1,
+            pyramid_levels: int = 0,
+            stats_window: float = None):
+        """
+            Parameters:
+                - fields (tuple): names of the value columns stored next to the timestamps.
+                - capacity (int): maximum number of samples kept per row before the oldest is overwritten.
+                - rows (int): number of preallocated rows.
+                - pyramid_levels (int): number of min/max downsampling levels, no pyramid is kept when 0.
+                - stats_window (float): window of the rolling statistics in seconds, none are kept when not given.
+        """
+        if capacity < 1:
+            raise Exception("History capacity must be positive")
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._rows = {name: index + 1 for index, name in enumerate(self.fields)}
+        self._data = np.zeros((len(self.fields) + 1, rows, 2 * capacity), dtype=np.float64)
+        self._heads = np.zeros(rows, dtype=np.int64)
+        self._counts = np.zeros(rows, dtype=np.int64)
+        self.pyramid = None
+        if pyramid_levels > 0:
+            # Each level spans as long as the raw samples, level k reaches FACTOR ** k times further back.
+            bucket_capacity = -(-capacity // HistoryPyramid.FACTOR)
+            self.pyramid = HistoryPyramid(self.fields, rows, pyramid_levels, bucket_capacity)
+        self.stats = RollingStats(self.fields, rows, stats_window) if stats_window else None
+
+    @property
+    def rows(self) -> int:
+        """Number of allocated rows."""
+        return self._data.shape[1]
+
+    def resize(self, rows: int):
+        """Reallocates the buffer to hold \a rows rows, existing rows are kept."""
+        kept = min(rows, self.rows)
+        data = np.zeros((self._data.shape[0], rows, 2 * self.capacity), dtype=np.float64)
+        data[:, :kept] = self._data[:, :kept]
+        heads = np.zeros(rows, dtype=np.int64)
+        heads[:kept] = self._heads[:kept]
+        counts = np.zeros(rows, dtype=np.int64)
+        counts[:kept] = self._counts[:kept]
+        self._data, self._heads, self._counts = data, heads, counts
+        if self.pyramid is not None:
+            self.pyramid.resize(rows)
+        if self.stats is not None:
+            self.stats.resize(rows)
+
+    def append(self, timestamp: float, *values: float, row: int = 0):
+        """Appends one sample to \a row, values are given in the order of the buffer fields."""
+        head = int(self._heads[row])
+        mirror = head + self.capacity
+        data = self._data
+        data[0, row, head] = data[0, row, mirror] = timestamp
+        for index, value in enumerate(values, 1):
+            data[index, row, head] = data[index, row, mirror] = value
+        self._heads[row] = head + 1 if head + 1 < self.capacity else 0
+        if self._counts[row] < self.capacity:
+            self._counts[row] += 1
+        if self.pyramid is not None or self.stats is not None:
+            timestamps = np.array([timestamp])
+            values = np.array(values, dtype=np.float64).reshape(-1, 1)
+            if self.pyramid is not None:
+                self.pyramid.extend_row(row, timestamps, values)
+            if self.stats is not None:
+                self.stats.extend_row(row, timestamps, values)
+
+    def append_rows(self, rows, timestamps: np.ndarray, *columns: np.ndarray):
+        """
+            Appends one sample to each of the given rows in a single vectorized write.
+
+            Parameters:
+                - rows (int or np.ndarray): number of rows to append to starting from row 0,
+                  or the indices of the rows.
+                - timestamps (np.ndarray): timestamp of the sample of each row.
+                - columns (np.ndarray): one array per buffer field with the value of each row.
+        """
+        if isinstance(rows, (int, np.integer)):
+            rows = np.arange(rows)
+        heads = self._heads[rows]
+        mirrors = heads + self.capacity
+        for index, column in enumerate((timestamps,) + columns):
+            self._data[index, rows, heads] = column
+            self._data[index, rows, mirrors] = column
+        heads += 1
+        heads[heads == self.capacity] = 0
+        self._heads[rows] = heads
+        self._counts[rows] = np.minimum(self._counts[rows] + 1, self.capacity)
+        if self.pyramid is not None or self.stats is not None:
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+            values = np.array(columns, dtype=np.float64).reshape(len(self.fields), len(rows))
+            if self.pyramid is not None:
+                self.pyramid.append_rows(rows, timestamps, values)
+            if self.stats is not None:
+                self.stats.append_rows(rows, timestamps, values)
+
+    def extend(self, timestamps: np.ndarray, *columns: np.ndarray, row: int = 0):
+        """
+            Appends a block of samples to \a row, only the last capacity samples are kept.
+
+            Parameters:
+                - timestamps (np.ndarray): timestamps of the samples in order.
+                - columns (np.ndarray): one array per buffer field with the values of the samples.
+                - row (int): row to append to.
+        """
+        if (self.pyramid is not None or self.stats is not None) and len(timestamps) > 0:
+            block_timestamps = np.asarray(timestamps, dtype=np.float64)
+            values = np.array(columns, dtype=np.float64).reshape(len(self.fields), len(timestamps))
+            if self.pyramid is not None:
+                self.pyramid.extend_row(row, block_timestamps, values)
+            if self.stats is not None:
+                self.stats.extend_row(row, block_timestamps, values)
+        count = min(len(timestamps), self.capacity)
+        if count == 0:
+            return
+        head = int(self._heads[row])
+        indices = (head + np.arange(count)) % self.capacity
+        for index, column in enumerate((timestamps,) + columns):
+            tail = np.asarray(column)[-count:]
+            self._data[index, row, indices] = tail
+            self._data[index, row, indices + self.capacity] = tail
+        self._heads[row] = (head + count) % self.capacity
+        self._counts[row] = min(int(self._counts[row]) + count, self.capacity)
+
+    def move_row(self, source: int, destination: int):
+        """Copies the ring of \a source over \a destination and clears \a source."""
+        self._data[:, destination] = self._data[:, source]
+        self._heads[destination] = self._heads[source]
+        self._counts[destination] = self._counts[source]
+        if self.pyramid is not None:
+            self.pyramid.move_row(source, destination)
+        if self.stats is not None:
+            self.stats.move_row(source, destination)
+        self.clear(source)
+
+    def count(self, row: int = 0) -> int:
+        """Number of samples stored in \a row."""
+        return int(self._counts[row])
+
+    def _window(self, count: int, row: int) -> slice:
+        """Returns the slice of the mirrored storage holding the latest \a count samples of \a row."""
+        stored = int(self._counts[row])
+        if count is None or count > stored:
+            count = stored
+        head = int(self._heads[row])
+        end = head if head >= count else head + self.capacity
+        return slice(end - count, end)
+
+    def timestamps(self, count: int = None, row: int = 0) -> np.ndarray:
+        """Returns a view of the latest \a count timestamps of \a row, or all of them when count is None."""
+        return self._data[0, row, self._window(count, row)]
+
+    def values(self, field: str, count: int = None, row: int = 0) -> np.ndarray:
+        """Returns a view of the latest \a count values of \a field in \a row, or all of them when count is None."""
+        return self._data[self._rows[field], row, self._window(count, row)]
+
+    def latest(self, field: str, row: int = 0) -> float:
+        """Returns the most recent value of \a field in \a row."""
+        if self._counts[row] == 0:
+            raise Exception("History is empty")
+        return float(self._data[self._rows[field], row, int(self._heads[row]) - 1 + self.capacity])
+
+    def downsample(self, field: str, span: float = None, max_points: int = 200, row: int = 0) -> tuple:
+        """
+            Returns at most \a max_points points of \a field covering the last \a span seconds.
+            Raw samples are returned as views when they fit, otherwise the finest pyramid level
+            that covers the span with few enough buckets is used and each bucket becomes a
+            min/max point pair. Without a pyramid the raw window is decimated by striding.
+
+            Parameters:
+                - field (str): field to read.
+                - span (float): length of the window ending at the latest sample, the whole
+                  history is used when None.
+                - max_points (int): maximum number of returned points, e.g. the chart width in pixels.
+                - row (int): row to read.
+
+            Returns:
+                Tuple of (timestamps, values) arrays.
+        """
+        timestamps = self.timestamps(row=row)
+        values = self.values(field, row=row)
+        if len(timestamps) == 0:
+            return timestamps, values
+        start = -np.inf if span is None else timestamps[-1] - span
+        first = int(np.searchsorted(timestamps, start, "left"))
+        raw_covers = first > 0 or self._counts[row] < self.capacity
+        if raw_covers and len(timestamps) - first <= max_points:
+            return timestamps[first:], values[first:]
+        if self.pyramid is not None:
+            result = self.pyramid.downsample(field, start, max_points, row)
+            if result is not None:
+                return result
+        step = -(-(len(timestamps) - first) // max_points)
+        return timestamps[first::step], values[first::step]
+
+    def clear(self, row: int = 0):
+        """Drops all samples of \a row, the preallocated storage is kept."""
+        self._counts[row] = 0
+        self._heads[row] = 0
+        if self.pyramid is not None:
+            self.pyramid.clear(row)
+        if self.stats is not None:
+            self.stats.clear(row)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the preallocated columns in bytes."""
+        nbytes = self._data.nbytes + self._heads.nbytes + self._counts.nbytes
+        if self.pyramid is not None:
+            nbytes += self.pyramid.nbytes
+        if self.stats is not None:
+            nbytes += self.stats.nbytes
+        return nbytes
+
+
+class HistoryPyramid():
+    """
+        Incrementally maintained min/max downsampling pyramid over the rows of a HistoryBuffer.
+        Level k stores buckets of FACTOR ** (k + 1) raw samples in its own ring buffer, each bucket
+        keeping its first and last timestamp and the minimum and maximum of every field. Partial
+        buckets are accumulated per row and level, so appending a sample costs O(levels) and any
+        window can be read back with a bounded number of points.
+        A level costs (2 * fields + 2) * 16 bytes per bucket and row, e.g. 14 KB per row for one field
+        and the 225 buckets spanning the default 3600 raw samples.
+    """
+    FACTOR = 16
+
+    def __init__(self, fields: tuple, rows: int, levels: int, bucket_capacity: int):
+        """
+            Parameters:
+                - fields (tuple): names of the value fields.
+                - rows (int): number of preallocated rows.
+                - levels (int): number of levels.
+                - bucket_capacity (int): number of buckets kept per level and row.
+        """
+        self.fields = tuple(fields)
+        self._field_index = {name: index for index, name in enumerate(self.fields)}
+        level_fields = ("timestamp_last",) + tuple(
+            f"{name}_{kind}" for name in self.fields for kind in ("min", "max"))
+        self.levels = [HistoryBuffer(level_fields, bucket_capacity, rows) for _ in range(levels)]
+        self._allocate_accumulators(rows)
+
+    def _allocate_accumulators(self, rows: int):
+        """Allocates empty partial bucket accumulators for \a rows rows."""
+        shape = (len(self.levels), len(self.fields), rows)
+        self._min = np.full(shape, np.inf)
+        self._max = np.full(shape, -np.inf)
+        self._first = np.zeros((len(self.levels), rows))
+        self._last = np.zeros((len(self.levels), rows))
+        self._fill = np.zeros((len(self.levels), rows), dtype=np.int64)
+
+    def resize(self, rows: int):
+        """Reallocates the pyramid to hold \a rows rows, existing rows are kept."""
+        kept = min(rows, self._fill.shape[1])
+        previous = (self._min, self._max, self._first, self._last, self._fill)
+        self._allocate_accumulators(rows)
+        for current, old in zip((self._min, self._max, self._first, self._last, self._fill), previous):
+            current[..., :kept] = old[..., :kept]
+        for level in self.levels:
+            level.resize(rows)
+
+    def move_row(self, source: int, destination: int):
+        """Copies the pyramid of \a source over \a destination and clears \a source."""
+        for accumulator in (self._min, self._max, self._first, self._last, self._fill):
+            accumulator[..., destination] = accumulator[..., source]
+        for level in self.levels:
+            level.move_row(source, destination)
+        self.clear(source)
+
+    def clear(self, row: int):
+        """Drops all buckets of \a row."""
+        self._min[..., row] = np.inf
+        self._max[..., row] = -np.inf
+        self._fill[:, row] = 0
+        for level in self.levels:
+            level.clear(row)
+
+    def append_rows(self, rows: np.ndarray, timestamps: np.ndarray, values: np.ndarray):
+        """Adds one sample to each of \a rows, \a values has one row per field and one column per row."""
+        self._accumulate_rows(0, rows, timestamps, timestamps, values, values)
+
+    def _accumulate_rows(self, level: int, rows, first, last, minimums, maximums):
+        """Adds one item to the partial bucket of \a level for each of \a rows and emits the completed buckets."""
+        fill = self._fill[level, rows]
+        self._first[level, rows] = np.where(fill == 0, first, self._first[level, rows])
+        self._last[level, rows] = last
+        self._min[level][:, rows] = np.minimum(self._min[level][:, rows], minimums)
+        self._max[level][:, rows] = np.maximum(self._max[level][:, rows], maximums)
+        fill += 1
+        self._fill[level, rows] = fill
+        complete = fill == self.FACTOR
+        if not complete.any():
+            return
+        done = rows[complete]
+        first = self._first[level, done]
+        last = self._last[level, done]
+        minimums = self._min[level][:, done]
+        maximums = self._max[level][:, done]
+        self.levels[level].append_rows(done, first, last, *self._interleave(minimums, maximums))
+        self._min[level][:, done] = np.inf
+        self._max[level][:, done] = -np.inf
+        self._fill[level, done] = 0
+        if level + 1 < len(self.levels):
+            self._accumulate_rows(level + 1, done, first, last, minimums, maximums)
+
+    def extend_row(self, row: int, timestamps: np.ndarray, values: np.ndarray):
+        """Adds a block of samples to \a row, \a values has one row per field and one column per sample."""
+        self._extend_row(0, row, timestamps, timestamps, values, values)
+
+    def _extend_row(self, level: int, row: int, first, last, minimums, maximums):
+        """Adds a block of items to the partial bucket of \a level in \a row, reducing full buckets with reshapes."""
+        fill = int(self._fill[level, row])
+        count = len(first)
+        # Complete the current partial bucket first.
+        head = min(self.FACTOR - fill, count)
+        if head > 0:
+            if fill == 0:
+                self._first[level, row] = first[0]
+            self._last[level, row] = last[head - 1]
+            self._min[level, :, row] = np.minimum(self._min[level, :, row], minimums[:, :head].min(axis=1))
+            self._max[level, :, row] = np.maximum(self._max[level, :, row], maximums[:, :head].max(axis=1))
+            fill += head
+            self._fill[level, row] = fill
+        if fill < self.FACTOR:
+            return
+        bucket_first = [self._first[level, row:row + 1].copy()]
+        bucket_last = [self._last[level, row:row + 1].copy()]
+        bucket_min = [self._min[level, :, row:row + 1].copy()]
+        bucket_max = [self._max[level, :, row:row + 1].copy()]
+        self._min[level, :, row] = np.inf
+        self._max[level, :, row] = -np.inf
+        self._fill[level, row] = 0
+
+        # Reduce the remaining whole buckets at once and keep the tail as the new partial bucket.
+        whole = (count - head) // self.FACTOR
+        end = head + whole * self.FACTOR
+        if whole > 0:
+            bucket_first.append(first[head:end:self.FACTOR])
+            bucket_last.append(last[head + self.FACTOR - 1:end:self.FACTOR])
+            fields = len(self.fields)
+            bucket_min.append(minimums[:, head:end].reshape(fields, whole, self.FACTOR).min(axis=2))
+            bucket_max.append(maximums[:, head:end].reshape(fields, whole, self.FACTOR).max(axis=2))
+        if end < count:
+            self._first[level, row] = first[end]
+            self._last[level, row] = last[-1]
+            self._min[level, :, row] = minimums[:, end:].min(axis=1)
+            self._max[level, :, row] = maximums[:, end:].max(axis=1)
+            self._fill[level, row] = count - end
+
+        first = np.concatenate(bucket_first)
+        last = np.concatenate(bucket_last)
+        minimums = np.concatenate(bucket_min, axis=1)
+        maximums = np.concatenate(bucket_max, axis=1)
+        self.levels[level].extend(first, last, *self._interleave(minimums, maximums), row=row)
+        if level + 1 < len(self.levels):
+            self._extend_row(level + 1, row, first, last, minimums, maximums)
+
+    @staticmethod
+    def _interleave(minimums: np.ndarray, maximums: np.ndarray) -> list:
+        """Orders the per-field minimum and maximum arrays as the level buffer fields."""
+        columns = list()
+        for minimum, maximum in zip(minimums, maximums):
+            columns.append(minimum)
+            columns.append(maximum)
+        return columns
+
+    def downsample(self, field: str, start: float, max_points: int, row: int) -> tuple:
+        """
+            Returns the min/max envelope of \a field from \a start on using the finest level that fits
+            into \a max_points, or None when no level covers the window.
+        """
+        index = self._field_index[field]
+        chosen = None
+        for level_index, level in enumerate(self.levels):
+            timestamps = level.timestamps(row=row)
+            # Every bucket gives two points, plus one point pair per partial bucket of this and the finer levels.
+            budget = (max_points - 2 * (level_index + 1)) // 2
+            if len(timestamps) == 0 or budget <= 0:
+                break
+            # First bucket ending inside the window.
+            first = int(np.searchsorted(level.values("timestamp_last", row=row), start, "left"))
+            covers = first > 0 or level.count(row) < level.capacity
+            fits = len(timestamps) - first <= budget
+            chosen = (level_index, max(first, len(timestamps) - budget))
+            if covers and fits:
+                break
+        if chosen is None:
+            return None
+
+        level_index, first = chosen
+        level = self.levels[level_index]
+        minimums = level.values(f"{field}_min", row=row)[first:]
+        maximums = level.values(f"{field}_max", row=row)[first:]
+        firsts = level.timestamps(row=row)[first:]
+        lasts = level.values("timestamp_last", row=row)[first:]
+        # Partial buckets from the coarsest to the finest level cover the samples after the last full bucket.
+        partial = [k for k in range(level_index, -1, -1) if self._fill[k, row] > 0]
+        firsts = np.concatenate((firsts, self._first[partial, row]))
+        lasts = np.concatenate((lasts, self._last[partial, row]))
+        minimums = np.concatenate((minimums, self._min[partial, index, row]))
+        maximums = np.concatenate((maximums, self._max[partial, index, row]))
+        return np.column_stack((firsts, lasts)).ravel(), np.column_stack((minimums, maximums)).ravel()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the levels and the accumulators in bytes."""
+        accumulators = (self._min, self._max, self._first, self._last, self._fill)
+        return sum(level.nbytes for level in self.levels) + sum(array.nbytes for array in accumulators)
+
+
+class HistoryRow():
+    """Lightweight handle exposing a single row of a HistoryBuffer."""
+    __slots__ = ("buffer", "row")
+
+    def __init__(self, buffer: HistoryBuffer, row: int):
+        self.buffer = buffer
+        self.row = row
+
+    @property
+    def count(self) -> int:
+        """Number of samples stored in the row."""
+        return self.buffer.count(self.row)
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of samples the row keeps."""
+        return self.buffer.capacity
+
+    def append(self, timestamp: float, *values: float):
+        """Appends one sample, values are given in the order of the buffer fields."""
+        self.buffer.append(timestamp, *values, row=self.row)
+
+    def extend(self, timestamps: np.ndarray, *columns: np.ndarray):
+        """Appends a block of samples, only the last capacity samples are kept."""
+        self.buffer.extend(timestamps, *columns, row=self.row)
+
+    def timestamps(self, count: int = None) -> np.ndarray:
+        """Returns a view of the latest \a count timestamps, or all of them when count is None."""
+        return self.buffer.timestamps(count, self.row)
+
+    def values(self, field: str, count: int = None) -> np.ndarray:
+        """Returns a view of the latest \a count values of \a field, or all of them when count is None."""
+        return self.buffer.values(field, count, self.row)
+
+    def latest(self, field: str) -> float:
+        """Returns the most recent value of \a field."""
+        return self.buffer.latest(field, self.row)
+
+    def downsample(self, field: str, span: float = None, max_points: int = 200) -> tuple:
+        """Returns at most \a max_points (timestamps, values) of \a field covering the last \a span seconds."""
+        return self.buffer.downsample(field, span, max_points, self.row)
+
+    def window_stats(self, field: str, now: float = None) -> dict:
+        """Returns the rolling window statistics of \a field, see RollingStats.field_stats(), or None when none are kept."""
+        if self.buffer.stats is None:
+            return None
+        return self.buffer.stats.field_stats(field, self.row, now)
+
+    def clear(self):
+        """Drops all samples of the row."""
+        self.buffer.clear(self.row)
@@ -0,0 +1,212 @@
+import numpy as np
+
+# Length of the statistics window in seconds, one day.
+DEFAULT_STATS_WINDOW = 86400.0
+
+
+class RollingStats():
+    """
+        Rolling window statistics of the fields of many rows, maintained in O(1) per sample.
+        The window is split into BUCKETS buckets aligned to the timestamps. Each bucket keeps the
+        count, mean, sum of squared deviations, min, max and time integral of the samples falling
+        into it, so a sample updates only its own bucket and a query merges the buckets of the
+        window instead of rescanning the history. The window therefore slides by whole buckets:
+        it covers the current bucket and the BUCKETS - 1 before it.
+        The time integral is the trapezoid of the consecutive samples in field units times hours,
+        e.g. the energy in kWh of a power in kW. Gaps longer than a bucket count as missing data
+        and are not integrated.
+    """
+    BUCKETS = 24
+    STATS = ("count", "mean", "min", "max", "stddev", "integral")
+    # Bucket id of the buckets without samples.
+    _EMPTY = np.iinfo(np.int64).min
+    # Accumulators of an empty bucket: mean, sum of squared deviations, min, max and integral.
+    _EMPTY_ACCUMULATORS = np.array([0.0, 0.0, np.inf, -np.inf, 0.0])[:, None]
+
+    def __init__(self, fields: tuple, rows: int = 1, window: float = DEFAULT_STATS_WINDOW):
+        """
+            Parameters:
+                - fields (tuple): names of the value fields.
+                - rows (int): number of preallocated rows.
+                - window (float): length of the window in seconds.
+        """
+        if window <= 0:
+            raise Exception("Statistics window must be positive")
+        self.fields = tuple(fields)
+        self.window = window
+        self.bucket_span = window / self.BUCKETS
+        self._field_index = {name: index for index, name in enumerate(self.fields)}
+        self._allocate(rows)
+
+    def _allocate(self, rows: int):
+        """Allocates empty buckets for \a rows rows."""
+        self._bucket = np.full((rows, self.BUCKETS), self._EMPTY, dtype=np.int64)
+        self._count = np.zeros((rows, self.BUCKETS), dtype=np.int64)
+        # The accumulators of a bucket are kept together, so a merge gathers and scatters them at once.
+        self._accumulators = np.empty((rows, self.BUCKETS, len(self._EMPTY_ACCUMULATORS), len(self.fields)))
+        self._accumulators[:] = self._EMPTY_ACCUMULATORS
+        self._mean, self._m2, self._min, self._max, self._integral = (
+            self._accumulators[:, :, index] for index in range(len(self._EMPTY_ACCUMULATORS)))
+        # Latest sample of each row, the start of the next integral step.
+        self._last_time = np.full(rows, np.nan)
+        self._last_values = np.zeros((rows, len(self.fields)))
+
+    def _arrays(self) -> tuple:
+        """Arrays indexed by the row first."""
+        return (
+            self._bucket, self._count, self._accumulators, self._last_time, self._last_values)
+
+    @property
+    def rows(self) -> int:
+        """Number of allocated rows."""
+        return len(self._last_time)
+
+    def resize(self, rows: int):
+        """Reallocates the statistics to hold \a rows rows, existing rows are kept."""
+        kept = min(rows, self.rows)
+        previous = self._arrays()
+        self._allocate(rows)
+        for current, old in zip(self._arrays(), previous):
+            current[:kept] = old[:kept]
+
+    def move_row(self, source: int, destination: int):
+        """Copies the statistics of \a source over \a destination and clears \a source."""
+        for array in self._arrays():
+            array[destination] = array[source]
+        self.clear(source)
+
+    def clear(self, row: int):
+        """Drops all samples of \a row."""
+        self._bucket[row] = self._EMPTY
+        self._last_time[row] = np.nan
+
+    def append_rows(self, rows: np.ndarray, timestamps: np.ndarray, values: np.ndarray):
+        """Adds one sample to each of \a rows, \a values has one row per field and one column per row."""
+        values = values.T
+        buckets = np.floor(timestamps / self.bucket_span).astype(np.int64)
+        integral = (self._last_values[rows] + values) * self._steps(timestamps - self._last_time[rows])
+        self._last_time[rows] = timestamps
+        self._last_values[rows] = values
+        self._merge(rows, buckets, np.ones(len(rows), dtype=np.int64), values, 0.0, values, values, integral)
+
+    def extend_row(self, row: int, timestamps: np.ndarray, values: np.ndarray):
+        """
+            Adds a block of samples in time order to \a row, \a values has one row per field and one column
+            per sample. Only the samples of the last BUCKETS buckets of the block are reduced.
+        """
+        if len(timestamps) == 0:
+            return
+        values = values.T
+        previous_time = np.concatenate(([self._last_time[row]], timestamps[:-1]))
+        previous_values = np.concatenate((self._last_values[row:row + 1], values[:-1]))
+        integral = (previous_values + values) * self._steps(timestamps - previous_time)
+        self._last_time[row] = timestamps[-1]
+        self._last_values[row] = values[-1]
+
+        buckets = np.floor(timestamps / self.bucket_span).astype(np.int64)
+        first = int(np.searchsorted(buckets, buckets[-1] - self.BUCKETS, "right"))
+        buckets, values, integral = buckets[first:], values[first:], integral[first:]
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        counts = np.diff(np.append(starts, len(buckets)))
+        means = np.add.reduceat(values, starts) / counts[:, None]
+        deviations = values - np.repeat(means, counts, axis=0)
+        rows = np.full(len(starts), row, dtype=np.int64)
+        self._merge(
+            rows, buckets[starts], counts, means, np.add.reduceat(deviations * deviations, starts),
+            np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts), np.add.reduceat(integral, starts))
+
+    def _steps(self, steps: np.ndarray) -> np.ndarray:
+        """Trapezoid weights in hours of the integral \a steps, 0 for gaps and for the first sample of a row."""
+        # NaN steps before the first sample fail the comparisons as well.
+        return np.where((steps > 0.0) & (steps <= self.bucket_span), steps, 0.0)[:, None] / 7200.0
+
+    def _merge(self, rows, buckets, counts, means, m2, minimums, maximums, integrals):
+        """
+            Merges the partial statistics of one bucket per entry into the buckets of \a rows,
+            a bucket slot holding an older bucket is reset first. The entries of a row have distinct buckets.
+        """
+        block = len(rows) > 1 and (buckets == buckets[0]).all() and (np.diff(rows) == 1).all()
+        if block:
+            # A tick of a block of rows within one bucket, the slots are updated in place through views.
+            slot = (slice(rows[0], rows[-1] + 1), buckets[0] % self.BUCKETS)
+            bucket, count, current = self._bucket[slot], self._count[slot], self._accumulators[slot]
+            previous = count.copy()
+            stale = bucket != buckets
+        else:
+            # Flat index of the bucket slot of every entry.
+            slot = rows * self.BUCKETS + buckets % self.BUCKETS
+            bucket, count = self._bucket.reshape(-1), self._count.reshape(-1)
+            accumulators = self._accumulators.reshape(-1, *self._accumulators.shape[2:])
+            current = accumulators[slot]
+            previous = count[slot]
+            stale = bucket[slot] != buckets
+        if stale.any():
+            if block:
+                bucket[stale] = buckets[stale]
+            else:
+                bucket[slot[stale]] = buckets[stale]
+            current[stale] = self._EMPTY_ACCUMULATORS
+            previous[stale] = 0
+        mean, squares, minimum, maximum, integral = (current[:, column] for column in range(current.shape[1]))
+        # Combines the count, mean and squared deviations of both parts (Chan et al.).
+        total = previous + counts
+        delta = means - mean
+        mean += delta * (counts / total)[:, None]
+        squares += m2 + delta * delta * (previous * counts / total)[:, None]
+        np.minimum(minimum, minimums, out=minimum)
+        np.maximum(maximum, maximums, out=maximum)
+        integral += integrals
+        if block:
+            count[:] = total
+        else:
+            count[slot] = total
+            accumulators[slot] = current
+
+    def window_stats(self, rows=None, now: np.ndarray = None) -> dict:
+        """
+            Returns the statistics of the window ending at \a now of each of \a rows.
+
+            Parameters:
+                - rows (np.ndarray): indices of the rows, every row when not given.
+                - now (np.ndarray): end of the window of each row, the latest sample of the row when not given.
+
+            Returns:
+                Dict of STATS, the count as an array with one entry per row and the others as
+                (rows, fields) arrays, NaN for rows without samples in the window.
+        """
+        if rows is None:
+            rows = slice(None)
+        if now is None:
+            now = self._last_time[rows]
+        current = np.floor(np.nan_to_num(now, nan=-np.inf) / self.bucket_span)[:, None]
+        bucket = self._bucket[rows]
+        valid = (bucket > current - self.BUCKETS) & (bucket <= current)
+        weights = np.where(valid, self._count[rows], 0)[..., None]
+        count = weights.sum(axis=1)
+        bucket_means = self._mean[rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (weights * bucket_means).sum(axis=1) / count
+            deviations = bucket_means - mean[:, None]
+            m2 = (np.where(valid[..., None], self._m2[rows], 0.0) + weights * deviations * deviations).sum(axis=1)
+            stddev = np.sqrt(m2 / count)
+        valid = valid[..., None]
+        empty = count == 0
+        return {
+            "count": count[:, 0],
+            "mean": mean,
+            "min": np.where(empty, np.nan, np.where(valid, self._min[rows], np.inf).min(axis=1)),
+            "max": np.where(empty, np.nan, np.where(valid, self._max[rows], -np.inf).max(axis=1)),
+            "stddev": stddev,
+            "integral": np.where(empty, np.nan, np.where(valid, self._integral[rows], 0.0).sum(axis=1)),
+        }
+
+    def field_stats(self, field: str, row: int = 0, now: float = None) -> dict:
+        """Returns the window statistics of \a field of one row as floats, see window_stats()."""
+        index = self._field_index[field]
+        stats = self.window_stats(np.array([row]), None if now is None else np.array([now]))
+        return {name: float(value[0]) if value.ndim == 1 else float(value[0, index]) for name, value in stats.items()}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the buckets in bytes."""
+        return sum(array.nbytes for array in self._arrays())
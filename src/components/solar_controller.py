@@ -1,6 +1,9 @@
-import random
+import numpy as np
 
-from components.component import Component
+from components import synthetic_profiles
+from components.component import Component, FLOW_SOURCE
+from components.component_store import ComponentStore, StoreField
+from components.history_buffer import DEFAULT_HISTORY_CAPACITY
 
 
 class SolarController(Component):
@@ -8,25 +11,78 @@ class SolarController(Component):
         This controller is responsible to manage solar panel data and to control the panels.
         All charts panel and panal array related actions and data lives here.
     """
-    def __init__(self):
-        super(SolarController, self).__init__()
-        random.seed(1000)
-        self.voltage_V = 0
-        self.rated_power_kWh = 10
-        self.power_kWh = 0
-        self.power_history = list()
-        self.power_history_timestamps = list()
-        self.efficiency = 0
-        self.timestamp = 0
+    __slots__ = ()
+
+    HISTORY_FIELDS = ("power_kWh",)
+    FLOW_ROLE = FLOW_SOURCE
+    FLOW_FIELD = "power_kWh"
+    INGEST_FIELDS = ("power_kWh", "voltage_V")
+
+    voltage_V = StoreField(0)
+    rated_power_kWh = StoreField(10)
+    power_kWh = StoreField(0)
+    efficiency = StoreField(0)
+
+    # Demo weather: mean cloud cover, its standard deviation and correlation time in seconds,
+    # and the share of the clear sky power a full cover blocks.
+    CLOUD_MEAN = 0.3
+    CLOUD_VARIABILITY = 0.25
+    CLOUD_CORRELATION_S = 1800.0
+    CLOUD_ATTENUATION = 0.75
+    # Demo string voltage at rated power and its noise.
+    NOMINAL_VOLTAGE_V = 24.0
+    VOLTAGE_NOISE_V = 0.2
+
+    # Deviation of the demo cloud cover from its mean, the state of its random process.
+    cloud_state = StoreField(0, tracked=False)
+
+    def __init__(
+            self, store: ComponentStore = None, history_capacity: int = DEFAULT_HISTORY_CAPACITY, component_id: int = None):
+        super(SolarController, self).__init__(store, history_capacity, component_id)
 
     def generate_demo_data(self):
         """Generates a demo/functional test data."""
-        self.power_kWh = random.randint(800, 1000) / 100
-        self.voltage_V = random.randint(0, 24000) / 1000
-        self.efficiency = self.power_kWh * 100.0 / self.rated_power_kWh
-        self.power_history.append(self.power_kWh)
-        self.timestamp += 1
-        self.power_history_timestamps.append(self.timestamp)
-        if len(self.power_history) > 50:
-            self.power_history.pop(0)
-            self.power_history_timestamps.pop(0)
+        self.generate_demo_batch(self.store, np.array([self.row]))
+
+    @classmethod
+    def generate_demo_batch(cls, store: ComponentStore, rows=None):
+        """Generates demo data for \a rows of \a store at once, for every solar panel when not given."""
+        if rows is None:
+            rows = np.arange(store.size)
+        timestamps, (power,) = cls.generate_demo_steps(store, rows, 1)
+        store.history.append_rows(rows, timestamps[0], power[0])
+
+    @classmethod
+    def generate_demo_steps(cls, store: ComponentStore, rows: np.ndarray, steps: int) -> tuple:
+        """
+            Generates \a steps demo updates for \a rows of \a store at once, see Component.generate_demo_steps.
+            The power follows the clear sky curve of the day dimmed by a correlated random cloud cover.
+        """
+        columns = store.columns
+        periods = columns["update_period"][rows]
+        timestamps = columns["timestamp"][rows] + np.outer(np.arange(1, steps + 1), periods)
+        correlation = synthetic_profiles.persistence(periods, cls.CLOUD_CORRELATION_S)
+        # Every step draws a cloud and a voltage sample, so the data does not depend on how the steps are chunked.
+        samples = store.normal(rows, 2 * steps)
+        innovations = samples[0::2] * (cls.CLOUD_VARIABILITY * np.sqrt(1 - correlation ** 2))
+        clouds = synthetic_profiles.ar1(columns["cloud_state"][rows], innovations, correlation)
+        cover = np.clip(clouds + cls.CLOUD_MEAN, 0.0, 1.0)
+        rated = columns["rated_power_kWh"][rows]
+        power = rated * synthetic_profiles.clear_sky(timestamps) * (1.0 - cls.CLOUD_ATTENUATION * cover)
+        voltage = np.where(
+            power[-1] > 0,
+            cls.NOMINAL_VOLTAGE_V * (0.9 + 0.1 * power[-1] / rated) + cls.VOLTAGE_NOISE_V * samples[-1],
+            0.0)
+
+        columns["cloud_state"][rows] = clouds[-1]
+        store.write("power_kWh", rows, power[-1])
+        store.write("voltage_V", rows, voltage)
+        cls.update_derived(store, rows)
+        store.write("timestamp", rows, timestamps[-1])
+        return timestamps, (power,)
+
+    @classmethod
+    def update_derived(cls, store: ComponentStore, rows):
+        """Recomputes the efficiency of \a rows from their power."""
+        columns = store.columns
+        store.write("efficiency", rows, columns["power_kWh"][rows] * 100.0 / columns["rated_power_kWh"][rows])
@@ -0,0 +1,51 @@
+"""
+    Building blocks of the synthetic demo data: daily profiles and correlated noise,
+    all evaluated on (steps, components) arrays so years of samples are generated in bulk.
+    Timestamps are demo seconds counted from DEMO_START_HOUR of the first day.
+"""
+import numpy as np
+
+# Local hour of the demo timestamp 0, the demo starts in daylight.
+DEMO_START_HOUR = 10.0
+
+
+def hour_of_day(timestamps: np.ndarray) -> np.ndarray:
+    """Local hour (0 - 24) of the demo \a timestamps, which are not negative."""
+    return np.fmod(timestamps / 3600.0 + DEMO_START_HOUR, 24.0)
+
+
+def clear_sky(timestamps: np.ndarray) -> np.ndarray:
+    """Relative irradiance of a clear sky, 0 at night and 1 at noon with sunrise at 6:00 and sunset at 18:00."""
+    return np.maximum(np.sin(np.pi * (hour_of_day(timestamps) - 6.0) / 12.0), 0.0) ** 1.5
+
+
+def persistence(periods: np.ndarray, correlation_time: float) -> np.ndarray:
+    """Per step correlation of a process with \a correlation_time sampled every \a periods seconds."""
+    return np.exp(-periods / correlation_time)
+
+
+def ar1(initial: np.ndarray, innovations: np.ndarray, persistence: np.ndarray) -> np.ndarray:
+    """
+        Evaluates the first order autoregressive process x[t] = persistence * x[t - 1] + innovations[t]
+        for every column without a loop over the steps: within a block x[t] = a^t * (x0 + cumsum(e[k] / a^k)).
+        The block length keeps a^-t finite for the fastest decaying column.
+
+        Parameters:
+            - initial (np.ndarray): state of each column before the first step.
+            - innovations (np.ndarray): (steps, columns) innovations.
+            - persistence (np.ndarray): correlation a of each column, 0 < a <= 1.
+
+        Returns:
+            (steps, columns) array of the process states.
+    """
+    steps = len(innovations)
+    states = np.empty_like(innovations)
+    decay = max(-np.log10(np.min(persistence)), 1e-12) if len(initial) else 1e-12
+    block = int(min(max(100.0 / decay, 1), max(steps, 1)))
+    state = np.asarray(initial, dtype=np.float64)
+    for start in range(0, steps, block):
+        chunk = innovations[start:start + block]
+        powers = persistence ** np.arange(1, len(chunk) + 1)[:, None]
+        states[start:start + len(chunk)] = powers * (state + np.cumsum(chunk / powers, axis=0))
+        state = states[start + len(chunk) - 1]
+    return states
@@ -1,13 +1,18 @@
+import time
+from collections import deque
+
 from PyQt5 import QtWidgets, QtGui
 
 from PyQt5.QtCore import (
-    QPointF
+    QPointF,
+    QTimer
 )
 
 import resources_rc # noqa
 
 from gui.channel import Channel
 from gui.component_gui import ComponentGui
+from instrumentation import Instrumentation
 
 from helper_defs import (
     TYPE_SOLAR_PANEL,
@@ -16,10 +21,26 @@ from helper_defs import (
 
 
 class CustomScene(QtWidgets.QGraphicsScene):
-    """ Custom scene to handle special background"""
+    """
+        Custom scene to handle special background.
+        Counts the items added and removed through it, reading the count does not list every item like items() does.
+    """
     def __init__(self, background_image_path, parent=None):
         super().__init__(parent)
         self.background_image = QtGui.QPixmap(background_image_path)
+        self.item_count = 0
+
+    def addItem(self, item):
+        super().addItem(item)
+        self.item_count += 1
+
+    def addWidget(self, widget, *args):
+        self.item_count += 1
+        return super().addWidget(widget, *args)
+
+    def removeItem(self, item):
+        super().removeItem(item)
+        self.item_count -= 1
 
     def drawBackground(self, painter, rect):
         """
@@ -42,7 +63,21 @@ class CustomScene(QtWidgets.QGraphicsScene):
 
 
 class Canvas(QtWidgets.QGraphicsView):
-    """Custom canvas to plot the smart home ui."""
+    """
+        Custom canvas to plot the smart home ui.
+        Components added in bulk get their charts created afterwards in small batches from the event loop,
+        so a large layout is shown and usable before every chart widget exists. The channel arrows
+        are animated by one timer, and only in the visible part of the scene.
+    """
+    # Time spent creating deferred charts per event loop iteration, a chart takes tens of milliseconds.
+    CHART_BUDGET_S = 0.03
+    # Period of the channel arrow animation.
+    ANIMATION_PERIOD_MS = 100
+    ICON_PATHS = {
+        TYPE_SOLAR_PANEL: ":/icons/solar_panel_icon.png",
+        TYPE_BATTERY: ":/icons/battery_icon.png",
+    }
+
     def __init__(self):
         super().__init__()
         self.scene = CustomScene(":/backgrounds/canvas_bg.jpg")
@@ -50,8 +85,32 @@ class Canvas(QtWidgets.QGraphicsView):
         self.setScene(self.scene)
         self.setRenderHint(QtGui.QPainter.Antialiasing)
         self.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        self.component_list = list()
-        self.channels = list()
+        # Component gui items and channels keyed by the stable ids of their backend counterparts.
+        self.component_list = dict()
+        self.channels = dict()
+        # Ids of the components whose chart is still to be created.
+        self.pending_charts = deque()
+        self.chart_timer = QTimer(self)
+        self.chart_timer.timeout.connect(self._create_pending_charts)
+        # One timer steps the arrows of the channels in view, instead of a timer per channel.
+        self.animation_timer = QTimer(self)
+        self.animation_timer.timeout.connect(self._animate_channels)
+        self.animation_timer.start(self.ANIMATION_PERIOD_MS)
+        # Times the frames (`paint`) and the arrow animation steps when enabled.
+        self.instrumentation = Instrumentation()
+
+    def paintEvent(self, event):
+        """Paints the visible part of the scene, timed as the `paint` stage, the frame time of the gui."""
+        with self.instrumentation.timer("paint"):
+            super().paintEvent(event)
+
+    def item_counts(self) -> dict:
+        """Numbers of component guis, channels and graphics items of the scene. Has to be called in the gui thread."""
+        return {
+            "components": len(self.component_list),
+            "channels": len(self.channels),
+            "scene_items": self.scene.item_count,
+        }
 
     def add_new_component_gui(self, id: int, type: int, x: int, y: int):
         """
@@ -64,21 +123,92 @@ class Canvas(QtWidgets.QGraphicsView):
                 - x (int): x coordinate where the gui item expected to be created at
                 - y (int): y coordinate where the gui item expected to be created at
         """
-        if type == TYPE_SOLAR_PANEL:
-            self.component_list.append(ComponentGui(id, self.scene, x, y, ":/icons/solar_panel_icon.png"))
-        elif type == TYPE_BATTERY:
-            self.component_list.append(ComponentGui(id, self.scene, x, y, ":/icons/battery_icon.png"))
-        else:
-            raise Exception("Unknown component id")
-
-        if len(self.component_list) - 1 != id:
+        if id in self.component_list:
             raise Exception("GUI and backend component id mismatch")
+        if type not in self.ICON_PATHS:
+            raise Exception("Unknown component type")
+        self.component_list[id] = ComponentGui(id, self.scene, x, y, self.ICON_PATHS[type])
 
-    def add_new_channel(self, id_start, id_end):
+    def add_new_component_guis(self, ids, types, xs, ys):
+        """
+            Creates the gui items of many components at once, see add_new_component_gui().
+            The scene is filled with its index and the view updates disabled, and the charts are
+            created afterwards from the event loop.
+
+            Parameters:
+                - ids: ids of the components the gui items will be created for.
+                - types: type of each gui item.
+                - xs, ys: coordinates of each gui item.
+        """
+        ids, types, xs, ys = (list(map(int, values)) for values in (ids, types, xs, ys))
+        if any(id in self.component_list for id in ids):
+            raise Exception("GUI and backend component id mismatch")
+        if any(type not in self.ICON_PATHS for type in types):
+            raise Exception("Unknown component type")
+        self._begin_bulk_insert()
+        try:
+            for id, type, x, y in zip(ids, types, xs, ys):
+                self.component_list[id] = ComponentGui(id, self.scene, x, y, self.ICON_PATHS[type], defer_chart=True)
+        finally:
+            self._end_bulk_insert()
+        self.pending_charts.extend(ids)
+        self.chart_timer.start(0)
+
+    def _create_pending_charts(self):
+        """Creates deferred charts for one time budget, stops the timer once all of them exist."""
+        deadline = time.perf_counter() + self.CHART_BUDGET_S
+        while self.pending_charts and time.perf_counter() < deadline:
+            component = self.component_list.get(self.pending_charts.popleft())
+            if component is not None:
+                component.create_chart()
+        if not self.pending_charts:
+            self.chart_timer.stop()
+
+    def _animate_channels(self):
+        """Moves the arrows of the channels intersecting the visible part of the scene."""
+        with self.instrumentation.timer("animate_channels", len(self.channels)):
+            visible = self.mapToScene(self.viewport().rect()).boundingRect()
+            for channel in self.channels.values():
+                if channel.bounds.intersects(visible):
+                    channel.animate_arrows()
+
+    def _begin_bulk_insert(self):
+        """Stops indexing and repainting the scene while many items are added."""
+        self.setUpdatesEnabled(False)
+        self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+
+    def _end_bulk_insert(self):
+        """Rebuilds the scene index once and repaints the view."""
+        self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.BspTreeIndex)
+        self.setUpdatesEnabled(True)
+
+    def remove_component_gui(self, id: int):
+        """Removes the gui item of the component \a id from the scene."""
+        self.component_list.pop(id).remove()
+
+    def move_component_gui(self, id: int, x: int, y: int, channel_ids: list):
+        """
+            Moves the gui item of the component \a id and re-routes only the given channels.
+
+            Parameters:
+                - id (int): id of the component to move.
+                - x (int): new x coordinate of the component.
+                - y (int): new y coordinate of the component.
+                - channel_ids (list): ids of the channels connected to the component.
+        """
+        self.component_list[id].move(x, y)
+        for channel_id in channel_ids:
+            channel = self.channels[channel_id]
+            channel.reroute(self.component_list[channel.id_start].rect(), self.component_list[channel.id_end].rect())
+
+    def add_new_channel(self, channel_id, id_start, id_end):
         """
             Adds a new channel between the start and end component
             defined by \a id_start and \a id_end.
+            The channel is stored under the id of the backend connection \a channel_id.
         """
+        if channel_id in self.channels:
+            raise Exception("GUI and backend connection id mismatch")
         channel = Channel(
             id_start,
             id_end,
@@ -86,4 +216,20 @@ class Canvas(QtWidgets.QGraphicsView):
             self.component_list[id_end].rect(),
             self.scene)
         channel.draw()
-        self.channels.append(channel)
+        self.channels[channel_id] = channel
+
+    def add_new_channels(self, channel_ids, ids_start, ids_end):
+        """Adds a channel for every connection of \a channel_ids at once, see add_new_channel()."""
+        channel_ids, ids_start, ids_end = (list(map(int, values)) for values in (channel_ids, ids_start, ids_end))
+        if any(channel_id in self.channels for channel_id in channel_ids):
+            raise Exception("GUI and backend connection id mismatch")
+        self._begin_bulk_insert()
+        try:
+            for channel_id, id_start, id_end in zip(channel_ids, ids_start, ids_end):
+                self.add_new_channel(channel_id, id_start, id_end)
+        finally:
+            self._end_bulk_insert()
+
+    def remove_channel(self, channel_id):
+        """Removes the channel stored under \a channel_id from the scene."""
+        self.channels.pop(channel_id).remove()
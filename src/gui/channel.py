@@ -1,5 +1,5 @@
 from PyQt5 import QtWidgets, QtGui, QtCore
-from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtCore import QObject
 
 from PyQt5.QtGui import (
     QColor
@@ -23,24 +23,36 @@ class Arrowhead(QtWidgets.QGraphicsPolygonItem):
         The direction of the arrows tells whether the flow is normal or inverted. Their density
         describes the amount and the speed is the speed of the flow if applicable.
     """
+    COLOR = QColor(0, 0, 255, 200)
+    PEN = QtGui.QPen(QColor(255, 255, 255, 200), 1)
+    BRUSH = QtGui.QBrush(COLOR)
+    # Arrowhead shapes keyed by size, shared by every arrow of the channels.
+    _shapes = dict()
+
     def __init__(self, size=10, segment_index=0, parent=None):
         super().__init__(parent)
         self.size = size
-        self.color = QColor(0, 0, 255, 200)
-        self.setPen(QtGui.QPen(QColor(255, 255, 255, 200), 1))
-        self.setBrush(QtGui.QBrush(self.color))
+        self.color = self.COLOR
+        self.setPen(self.PEN)
+        self.setBrush(self.BRUSH)
         self.segment_index = segment_index
-
-        # Create the arrowhead shape
-        triangle = QtGui.QPolygonF([
-            QPointF(0, 0),
-            QPointF(-size / 3, -size / 2),
-            QPointF(-size, -size / 2),
-            QPointF(-2 * size / 3, 0),
-            QPointF(-size, size / 2),
-            QPointF(-size / 3, size / 2),
-        ])
-        self.setPolygon(triangle)
+        self.setPolygon(self._shape(size))
+
+    @classmethod
+    def _shape(cls, size) -> QtGui.QPolygonF:
+        """Returns the arrowhead shape of \a size."""
+        triangle = cls._shapes.get(size)
+        if triangle is None:
+            # Create the arrowhead shape
+            triangle = cls._shapes[size] = QtGui.QPolygonF([
+                QPointF(0, 0),
+                QPointF(-size / 3, -size / 2),
+                QPointF(-size, -size / 2),
+                QPointF(-2 * size / 3, 0),
+                QPointF(-size, size / 2),
+                QPointF(-size / 3, size / 2),
+            ])
+        return triangle
 
 
 class Channel(QObject):
@@ -61,14 +73,17 @@ class Channel(QObject):
         self.model = ChannelModel()
         self.model.animation_speed = 5
         self.model.arrow_density = 20
-        self.model.channel_color = QColor('green')
-        self.model.arrow_color = QColor(0, 0, 255, 200)
         self.model.text = '3 kWh'
         self.scene = scene
         self.text_item = QtWidgets.QGraphicsTextItem(self.model.text)
         self.text_item.setDefaultTextColor(QColor('lightgray'))
         self.text_item.setFont(QtGui.QFont("Arial", 12, QtGui.QFont.Bold))
         self.scene.addItem(self.text_item)
+        # Path items of the channel tube, filled in by draw().
+        self.path_items = list()
+        # Hidden arrows kept in the scene for reuse, removing and adding scene items gets slow in large scenes.
+        self.spare_arrowheads = list()
+        self.arrowheads = list()
 
         # Prepare the error animation
         self.error_animation = QtCore.QPropertyAnimation(self.text_item, b"opacity")
@@ -78,11 +93,19 @@ class Channel(QObject):
         self.error_animation.setKeyValueAt(0.5, 1)
         self.error_animation.setKeyValueAt(1, 0)
 
+        # The arrows are animated by the canvas, which only steps the channels in view.
+        self._layout(start_rect, end_rect)
+
+    def _layout(self, start_rect: QRect, end_rect: QRect):
+        """Calculates the channel geometry between the two bounding rectangles and creates the arrows."""
         # Calculate closest edge points and corner
         self.start_edge_point, self.corner_point, self.end_edge_point = self._get_connecting_edge_points(
             start_rect, end_rect
         )
         self._set_text_position()
+        # Scene area covered by the channel and its arrows.
+        self.bounds = QtGui.QPolygonF(
+            [self.start_edge_point, self.corner_point, self.end_edge_point]).boundingRect().adjusted(-10, -10, 10, 10)
 
         # Initialize the arrows
         self.arrowheads = self.create_arrows(self.start_edge_point, self.end_edge_point, num_arrows=self.model.arrow_density)
@@ -96,10 +119,20 @@ class Channel(QObject):
             # Normalize direction vector
             self.direction_vector /= length
 
-        # Set up arrows animation
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.animate_arrows)
-        self.timer.start(100)
+    def reroute(self, start_rect: QRect, end_rect: QRect):
+        """
+            Redraws the channel between the new bounding rectangles of its components.
+
+            Parameters:
+                - start_rect (QRect): bounding rectangle of the start component.
+                - end_rect (QRect): bounding rectangle of the end component.
+        """
+        for item in self.path_items:
+            self.scene.removeItem(item)
+        self.path_items = list()
+        self._release_arrows()
+        self._layout(start_rect, end_rect)
+        self.draw()
 
     def _set_text_position(self):
         """
@@ -136,12 +169,40 @@ class Channel(QObject):
             self.text_item.setPlainText(self.model.text)
 
     def update_channel(self):
-        """Updates the channel gui via the model data."""
+        """Updates the channel gui via the model data, the arrows are only recreated when their number changes."""
         self.text_item.setPlainText(self.model.text)
+        density = self.model.arrow_density
+        if len(self.arrowheads) == (2 * int(density / 2) if density >= 2 else 0):
+            return
+        self._release_arrows()
+        self.arrowheads = self.create_arrows(self.start_edge_point, self.end_edge_point, num_arrows=self.model.arrow_density)
+
+    def _release_arrows(self):
+        """Hides the arrows of the channel and keeps them for reuse by create_arrows()."""
         for arrow in self.arrowheads:
-            self.scene.removeItem(arrow)
+            arrow.setVisible(False)
+        self.spare_arrowheads.extend(self.arrowheads)
         self.arrowheads = list()
-        self.arrowheads = self.create_arrows(self.start_edge_point, self.end_edge_point, num_arrows=self.model.arrow_density)
+
+    def _take_arrow(self, segment_index: int) -> Arrowhead:
+        """Returns a spare arrow shown again, or a new arrow added to the scene."""
+        if self.spare_arrowheads:
+            arrowhead = self.spare_arrowheads.pop()
+            arrowhead.segment_index = segment_index
+            arrowhead.setVisible(True)
+            return arrowhead
+        arrowhead = Arrowhead(size=7, segment_index=segment_index)
+        self.scene.addItem(arrowhead)
+        return arrowhead
+
+    def remove(self):
+        """Stops the animations and removes every scene item of the channel."""
+        self.error_animation.stop()
+        for item in self.arrowheads + self.spare_arrowheads + self.path_items + [self.text_item]:
+            self.scene.removeItem(item)
+        self.arrowheads = list()
+        self.spare_arrowheads = list()
+        self.path_items = list()
 
     def _get_connecting_edge_points(self, rect1, rect2):
         """Get the connecting edge points between two icon bounding rectangles."""
@@ -210,14 +271,12 @@ class Channel(QObject):
         step_y = dy / num_arrows
 
         for i in range(num_arrows):
-            arrowhead = Arrowhead(size=7, segment_index=0)
+            arrowhead = self._take_arrow(0)
             position = QPointF(start_point.x() + step_x * i, start_point.y() + step_y * i)
 
             # Calculate angle and rotate arrowhead to follow the path direction
             arrowhead.setRotation(self._get_rotation(start_segment_direction))
             arrowhead.setPos(position)
-
-            self.scene.addItem(arrowhead)
             arrowheads.append(arrowhead)
 
         dx = end_point.x() - self.corner_point.x()
@@ -227,14 +286,12 @@ class Channel(QObject):
         step_y = dy / num_arrows
 
         for i in range(num_arrows):
-            arrowhead = Arrowhead(size=7, segment_index=1)
+            arrowhead = self._take_arrow(1)
             position = QPointF(self.corner_point.x() + step_x * i, self.corner_point.y() + step_y * i)
 
             # Calculate angle and rotate arrowhead to follow the path direction
             arrowhead.setRotation(self._get_rotation(end_segment_direction))
             arrowhead.setPos(position)
-
-            self.scene.addItem(arrowhead)
             arrowheads.append(arrowhead)
 
         return arrowheads
@@ -263,6 +320,7 @@ class Channel(QObject):
         outline.setBrush(QtGui.QBrush(QtCore.Qt.NoBrush))
         outline.setZValue(-2)
         self.scene.addItem(outline)
+        self.path_items.append(outline)
 
         direction_start = self._get_direction(self.start_edge_point, self.corner_point)
         direction_end = self._get_direction(self.corner_point, self.end_edge_point)
@@ -348,12 +406,14 @@ class Channel(QObject):
         fill1.setPen(inner_pen1)
         fill1.setZValue(-1)
         self.scene.addItem(fill1)
+        self.path_items.append(fill1)
 
         fill2 = QtWidgets.QGraphicsPathItem()
         fill2.setPath(fill_path2)
         fill2.setPen(inner_pen2)
         fill2.setZValue(-1)
         self.scene.addItem(fill2)
+        self.path_items.append(fill2)
 
         if (direction_start != direction_end):
             inner_pen3 = QtGui.QPen(gradient3, 4)
@@ -362,6 +422,7 @@ class Channel(QObject):
             triangle_fill1.setPen(inner_pen3)
             triangle_fill1.setZValue(-1)
             self.scene.addItem(triangle_fill1)
+            self.path_items.append(triangle_fill1)
 
     def _get_movement_rate(self, direction: int) -> QPointF:
         """Returns the directional movement rate in a from of a 2D point."""
@@ -435,12 +496,12 @@ class Channel(QObject):
 
     def animate_arrows(self):
         """Animate the arrowheads to simulate flow through an L-shaped channel."""
+        start_segment_direction = self._get_direction(self.start_edge_point, self.corner_point)
+        end_segment_direction = self._get_direction(self.corner_point, self.end_edge_point)
+        start_segment_rate = self._get_movement_rate(start_segment_direction)
+        end_segment_rate = self._get_movement_rate(end_segment_direction)
         for arrow in self.arrowheads:
             current_pos = arrow.pos()
-            start_segment_direction = self._get_direction(self.start_edge_point, self.corner_point)
-            end_segment_direction = self._get_direction(self.corner_point, self.end_edge_point)
-            start_segment_rate = self._get_movement_rate(start_segment_direction)
-            end_segment_rate = self._get_movement_rate(end_segment_direction)
             rate = start_segment_rate
             if self._segment_end_reached(
                current_pos, self.corner_point, start_segment_direction, start_segment_rate):
@@ -1,4 +1,4 @@
-from PyQt5.QtCore import QObject, QRect, QPointF
+from PyQt5.QtCore import QObject, QRect, QPointF, Qt
 from PyQt5.QtGui import QTransform
 
 import pyqtgraph as pg
@@ -11,27 +11,61 @@ class ComponentGui(QObject):
     """
         A component defines an icon and belonging chart.
     """
-    def __init__(self, component_id, scene, x, y, image_path):
+    MEAN_PEN = pg.mkPen((200, 200, 200, 150), width=2, style=Qt.DashLine)
+
+    def __init__(self, component_id, scene, x, y, image_path, defer_chart: bool = False):
+        """
+            Parameters:
+                - component_id (int): id of the backend component.
+                - scene (QGraphicsScene): scene the items are added to.
+                - x, y (int): location of the component in the scene.
+                - image_path (str): resource path of the icon image.
+                - defer_chart (bool): when true the chart is created later by create_chart(),
+                  creating the chart widget costs most of the component creation time.
+        """
         self.component_id = component_id
         self.scene = scene
         self.model = ComponentModel()
         self.model.main_icon_path = image_path
         self.model.component_location = QPointF(x, y)
         self.plot = None
+        self.curve = None
+        self.mean_curve = None
+        self.graph = None
         self.icon = self._create_icon(x, y, 128, 128)
-        self.graph = self._create_graph(x + 120, y - 80)
+        if not defer_chart:
+            self.create_chart()
+
+    def create_chart(self):
+        """Creates the chart of the component at its current location, showing the latest model data."""
+        if self.graph is None:
+            location = self.model.component_location
+            self.graph = self._create_graph(location.x() + 120, location.y() - 80)
 
     def rect(self) -> QRect:
         """Returns the component gui element bounding rectangle."""
         return self.icon.sceneBoundingRect()
 
+    def move(self, x: int, y: int):
+        """Moves the icon and the chart of the component to the new location."""
+        self.model.component_location = QPointF(x, y)
+        self.icon.setPos(x, y)
+        if self.graph is not None:
+            self.graph.setPos(x + 120, y - 80)
+
+    def remove(self):
+        """Removes the icon and the chart of the component from the scene."""
+        self.icon.error_animation.stop()
+        self.scene.removeItem(self.icon)
+        if self.graph is not None:
+            self.scene.removeItem(self.graph)
+
     def _create_icon(self, x, y, width, height):
         """Add an icon image to the canvas at the specified coordinates."""
         icon = AnimatedIcon(self.model.main_icon_path, width, height)
         icon.text = self.model.main_icon_data
         icon.setPos(x, y)
         self.scene.addItem(icon)
-        # icon.trigger_error()
         return icon
 
     def _create_graph(self, x, y):
@@ -41,7 +75,11 @@ class ComponentGui(QObject):
         graph_widget = pg.GraphicsLayoutWidget()
         graph_widget.setStyleSheet("GraphicsLayoutWidget { background-color: rgba(255, 255, 255, 30); }")
         self.plot = graph_widget.addPlot()
-        self.plot.plot(self.model.thumbnail_chart_timestamp, self.model.thumbnail_chart_data1)  # Example data
+        # The curve is kept and fed with new data on updates, recreating it costs more than the plotting.
+        self.curve = self.plot.plot(self.model.thumbnail_chart_timestamp, self.model.thumbnail_chart_data1)
+        # Mean of the rolling statistics window, drawn once the model has one.
+        self.mean_curve = self.plot.plot(pen=self.MEAN_PEN)
+        self._update_mean_curve()
         self.plot.getViewBox().setBackgroundColor((0, 0, 0, 0))
 
         # Convert the GraphicsLayoutWidget to a QGraphicsProxyWidget
@@ -54,7 +92,22 @@ class ComponentGui(QObject):
         """Updates the component gui via the data model."""
         self.icon.setPos(self.model.component_location.x(), self.model.component_location.y())
         self.icon.text = self.model.main_icon_data
-        self.graph.setPos(self.model.component_location.x() + 120, self.model.component_location.y() - 80)
-        self.plot.clear()
-        self.plot.plot(self.model.thumbnail_chart_timestamp, self.model.thumbnail_chart_data1)
+        if self.graph is not None:
+            self.graph.setPos(self.model.component_location.x() + 120, self.model.component_location.y() - 80)
+            self.curve.setData(self.model.thumbnail_chart_timestamp, self.model.thumbnail_chart_data1)
+            self._update_mean_curve()
         self.icon.update()
+
+    def update_state(self):
+        """Shows the state of the data model on the icon, an error blinks it and keeps it red until cleared."""
+        if self.model.main_icon_state == ComponentModel.STATE_ERROR:
+            self.icon.trigger_error()
+        else:
+            self.icon.clear_error()
+
+    def _update_mean_curve(self):
+        """Shows the window mean of the model as the second chart line, or hides it when there is none."""
+        if self.model.thumbnail_chart_data2 is None:
+            self.mean_curve.setData([], [])
+        else:
+            self.mean_curve.setData(self.model.thumbnail_chart_timestamp, self.model.thumbnail_chart_data2)
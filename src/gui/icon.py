@@ -16,17 +16,31 @@ from helper_defs import invert_colors
 class AnimatedIcon(QtWidgets.QGraphicsPixmapItem):
     """
     Animated icon where there is an image icon in the center surrounded by a circle
-    and a text written under the icon. The whole icon is blinking in red during error.
+    and a text written under the icon. The whole icon blinks when an error starts and stays red until it is cleared.
     """
     ERROR_COLOR = QColor('red')
     DEFAULT_COLOR = QColor('lightblue')
+    # Point size of the text in the unscaled icon and the number of lines fitting under the image at that size,
+    # longer texts are drawn smaller.
+    FONT_SIZE = 70
+    FONT_LINES = 2
+
+    # Source icons, the icons inverted and rescaled, and the rings drawn around them, shared by the icons with
+    # the same image and colors. Only the text differs between the icons, so creating thousands of them mostly
+    # hits these caches.
+    _source_pixmaps = dict()
+    _prepared_pixmaps = dict()
+    _ring_masks = dict()
 
     def __init__(self, image_path, width, height, parent=None):
         super().__init__(parent)
-        self.original_pixmap = QPixmap(image_path)
+        self.original_pixmap = self._source_pixmaps.get(image_path)
+        if self.original_pixmap is None:
+            self.original_pixmap = self._source_pixmaps[image_path] = QPixmap(image_path)
         self.border_color = self.DEFAULT_COLOR
         self.text = "--"
         self.text_color = self.DEFAULT_COLOR
+        self.error = False
 
         # Create an animation for the opacity effect
         self.opacity_effect = QtWidgets.QGraphicsOpacityEffect()
@@ -43,73 +57,113 @@ class AnimatedIcon(QtWidgets.QGraphicsPixmapItem):
         self._set_pixmap(self.original_pixmap, width, height)
         self.error_animation.finished.connect(self._on_blink_animation_finished)
 
+    @classmethod
+    def _prepared_pixmap(cls, pixmap: QPixmap, scale: float) -> QPixmap:
+        """Returns \a pixmap inverted and scaled to its size within the circle of an icon drawn at \a scale."""
+        key = (pixmap.cacheKey(), scale)
+        prepared = cls._prepared_pixmaps.get(key)
+        if prepared is None:
+            # The icon is drawn with black color, so inversion is done (should be done during icon preprocessing instead)
+            prepared = invert_colors(pixmap)
+            prepared = prepared.scaled(
+                max(int(prepared.size().width() / 1.5 * scale), 1),
+                max(int(prepared.size().height() / 1.5 * scale), 1),
+                QtCore.Qt.KeepAspectRatio,
+                QtCore.Qt.SmoothTransformation)
+            cls._prepared_pixmaps[key] = prepared
+        return prepared
+
+    @classmethod
+    def _ring_mask(cls, mask_size: QtCore.QSize, border_width: int, border_color: QColor, size: QtCore.QSize) -> QPixmap:
+        """Returns the pixmap of the gradient circle around an icon of \a mask_size, scaled down to \a size."""
+        key = (mask_size.width(), mask_size.height(), border_width, border_color.rgba(), size.width(), size.height())
+        mask = cls._ring_masks.get(key)
+        if mask is None:
+            mask = QPixmap(mask_size)
+            mask.fill(QtCore.Qt.transparent)
+            painter = QPainter(mask)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.drawRect(mask.rect())
+            gradient = QRadialGradient(
+                mask_size.width() / 2, mask_size.height() / 2, mask_size.width() / 2 + border_width * 0.3)
+            gradient.setColorAt(1, QtCore.Qt.transparent)
+            gradient.setColorAt(0, border_color)  # Start of the gradient (inside)
+            painter.setPen(QPen(QBrush(gradient), 100))
+            painter.drawEllipse(
+                int(border_width / 2),
+                int(border_width / 2),
+                mask_size.width() - border_width,
+                mask_size.height() - border_width)
+            painter.end()
+            mask = mask.scaled(size, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+            cls._ring_masks[key] = mask
+        return mask
+
     def _set_pixmap(self, pixmap: QPixmap, width: int, height: int):
         """
         Create a component icon that is containing the icon of the component a circle around it
         and the most dominant parameters describing the component.
+        The icon is composed at its size in the scene from the cached image and circle, only the text
+        is drawn for every update.
 
         Parameters:
             - pixmap (QPixmap): pixmap to show as icons
             - width (int): width of the animated icon in the scene.
             - height (int): height of the animated icon in the scene.
         """
-        # The icon is drawn with black color, so inversion is done (should be done during icon preprocessing instead)
-        pixmap = invert_colors(pixmap)
         border_width = 80  # Set the width of the border
         # Mask pixmap to draw a circle around the icon
         mask_size = pixmap.size() + QtCore.QSize(border_width * 4, border_width * 4)
-        mask = QPixmap(mask_size)
-        mask.fill(QtCore.Qt.transparent)
-        painter = QPainter(mask)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.drawRect(mask.rect())
-        self.gradient = QRadialGradient(
-            mask_size.width() / 2, mask_size.height() / 2, mask_size.width() / 2 + border_width * 0.3)
-        self.gradient.setColorAt(1, QtCore.Qt.transparent)
-        self.gradient.setColorAt(0, self.border_color)  # Start of the gradient (inside)
-        painter.setPen(QPen(QBrush(self.gradient), 100))
-        painter.drawEllipse(
-            int(border_width / 2),
-            int(border_width / 2),
-            mask_size.width() - border_width,
-            mask_size.height() - border_width)
+        # Scale of the final icon, the composition keeps the aspect ratio of the mask.
+        scale = min(width / mask_size.width(), height / mask_size.height())
+        size = QtCore.QSize(max(round(mask_size.width() * scale), 1), max(round(mask_size.height() * scale), 1))
+        mask = self._ring_mask(mask_size, border_width, self.border_color, size)
+        pixmap = self._prepared_pixmap(pixmap, scale)
 
         # Draw the icon, rescaled position within the circle. Also add a text under the icon.
-        masked_pixmap = QPixmap(mask_size)
-        pixmap = pixmap.scaled(
-            int(pixmap.size().width() / 1.5),
-            int(pixmap.size().height() / 1.5),
-            QtCore.Qt.KeepAspectRatio,
-            QtCore.Qt.SmoothTransformation)
+        masked_pixmap = QPixmap(size)
         masked_pixmap.fill(QtCore.Qt.transparent)
         painter = QPainter(masked_pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.TextAntialiasing)
         painter.drawPixmap(
-            int(mask_size.width() / 2 - pixmap.size().width() / 2),
-            int(mask_size.height() / 2 - pixmap.size().height() / 1.5),
+            int(size.width() / 2 - pixmap.size().width() / 2),
+            int(size.height() / 2 - pixmap.size().height() / 1.5),
             pixmap)
         painter.drawPixmap(0, 0, mask)
-        painter.setFont(QFont("Arial", 70, QFont.Bold))
+        # The text is laid out in the coordinates of the unscaled mask.
+        painter.scale(scale, scale)
+        lines = self.text.count("\n") + 1 if self.text else 1
+        painter.setFont(QFont("Arial", self.FONT_SIZE * self.FONT_LINES // max(lines, self.FONT_LINES), QFont.Bold))
         painter.setPen(self.text_color)
-        text_rect = QtCore.QRect(0, int(mask_size.height() / 2), mask.width(), 300)  # Position the text below the image
+        text_rect = QtCore.QRect(0, int(mask_size.height() / 2), mask_size.width(), 300)  # Position the text below the image
         painter.drawText(text_rect, QtCore.Qt.AlignCenter | QtCore.Qt.AlignBottom, self.text)
         painter.end()
-
-        # Scale the final icon to the neccessary size.
-        self.setPixmap(masked_pixmap.scaled(width, height, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
+        self.setPixmap(masked_pixmap)
 
     def trigger_error(self):
         """ Trigger error animations. """
+        self.error = True
         self.text_color = self.ERROR_COLOR
         self.border_color = self.ERROR_COLOR
         self._set_pixmap(self.original_pixmap, self.width, self.height)
         self.error_animation.start()
 
+    def clear_error(self):
+        """ Stop the error animations and restore the default colors. """
+        if not self.error:
+            return
+        self.error = False
+        self.error_animation.stop()
+        self.opacity_effect.setOpacity(1.0)
+        self._on_blink_animation_finished()
+
     def _on_blink_animation_finished(self):
-        """ Reset border color to blue when the animation finishes. """
+        """ Reset the colors when the animation finishes, unless the error is still active. """
+        if self.error:
+            return
         self.border_color = self.DEFAULT_COLOR
-        self.text = "5 kWh"
-        self.text_color = QColor('#CCCCCCCC')
+        self.text_color = self.DEFAULT_COLOR
         self._set_pixmap(self.original_pixmap, self.width, self.height)
 
     def update(self):
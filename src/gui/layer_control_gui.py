@@ -1,10 +1,23 @@
 from PyQt5.QtWidgets import (
+    QLabel,
     QPushButton,
     QWidget,
     QVBoxLayout
 )
+from PyQt5.QtCore import pyqtSignal
+
+from layers.layer_registry import LAYER_ELECTRICAL, LAYER_HEAT, LAYER_LIGHT
+
 
 class LayerControlWidget(QWidget):
+    """
+        Buttons switching the layers of the layout on and off.
+        The electrical (System) layer is always on, the others are activated on demand.
+        The summary of the layer totals is shown below the buttons.
+    """
+    # Emitted with the layer name and whether it was switched on.
+    layer_toggled = pyqtSignal(str, bool)
+
     def __init__(self, parent=None):
         super(LayerControlWidget, self).__init__(parent)
         system_layer_button = QPushButton("System")
@@ -19,4 +32,22 @@ class LayerControlWidget(QWidget):
         self.setLayout(layout)
         layout.addWidget(system_layer_button)
         layout.addWidget(heatmap_layer_button)
-        layout.addWidget(light_layer_button)
\ No newline at end of file
+        layout.addWidget(light_layer_button)
+        self.totals_label = QLabel()
+        self.totals_label.setStyleSheet("QLabel { color: #CCCCCC; }")
+        layout.addWidget(self.totals_label)
+
+        self.layer_buttons = {
+            LAYER_ELECTRICAL: system_layer_button,
+            LAYER_HEAT: heatmap_layer_button,
+            LAYER_LIGHT: light_layer_button,
+        }
+        for name, button in self.layer_buttons.items():
+            button.setCheckable(True)
+            button.toggled.connect(lambda checked, name=name: self.layer_toggled.emit(name, checked))
+        system_layer_button.setChecked(True)
+        system_layer_button.setEnabled(False)
+
+    def set_totals(self, text: str):
+        """Shows \a text as the summary of the layer totals."""
+        self.totals_label.setText(text)
@@ -6,9 +6,12 @@ from PyQt5.QtWidgets import (
     QDesktopWidget
 )
 
-from PyQt5.QtCore import QThread, QTimer, Qt
+from PyQt5.QtCore import QThread, Qt, QMetaObject, QTimer, Q_ARG
 
 from backend import Backend
+from component_layout import ComponentLayout
+from instrumentation import Instrumentation
+from metrics_server import MetricsServer, instrumentation_metrics
 from gui.canvas import Canvas
 from gui.draggable_option import DraggableButton, Options
 from models.model_updater import ModelUpdater
@@ -23,10 +26,29 @@ from helper_defs import (
 
 # Main Qt UI window
 class MainWindow(QMainWindow):
-    def __init__(self, *args, **kwargs):
+    # Layout shown when no layout file is given: a solar panel charging a battery.
+    DEFAULT_LAYOUT = ComponentLayout([0, 1], [TYPE_SOLAR_PANEL, TYPE_BATTERY], [0, 400], [0, 400], [0], [1])
+    # Period of the scene item counts published to the metrics endpoint, the counts are kept by the scene.
+    METRICS_PERIOD_MS = 1000
+
+    def __init__(
+            self,
+            *args,
+            archive_dir: str = None,
+            simulate_devices: bool = False,
+            simulation_speed: float = None,
+            layout_path: str = None,
+            layout: ComponentLayout = None,
+            instrumentation_path: str = None,
+            metrics_port: int = None,
+            **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
+        # Timers of the backend and gui update stages, enabled and dumped to this file on exit when given,
+        # and enabled for the metrics endpoint.
+        self.instrumentation = Instrumentation(enabled=instrumentation_path is not None or metrics_port is not None)
+        self.instrumentation_path = instrumentation_path
         self.workerThread = QThread(self)
-        self.worker = Backend()
+        self.worker = Backend(archive_dir, simulate_devices, simulation_speed, self.instrumentation)
         self.worker.signals.error.connect(self.sigint_handler)
         self.worker.signals.finished.connect(self.thread_complete)
 
@@ -37,27 +59,49 @@ class MainWindow(QMainWindow):
         self.showMaximized()
         self.setWindowTitle("Smart Home")
         self.canvas = self.create_canvas_layout()
-        self.create_component(TYPE_SOLAR_PANEL, 0, 0)
-        self.create_component(TYPE_BATTERY, 400, 400)
-        self.create_connection(0, 1)
-        self.worker.update_data()
+        self.canvas.instrumentation = self.instrumentation
+        self.model_updater = ModelUpdater(self.canvas.component_list, self.canvas.channels, self.instrumentation)
+        # Queued across the threads once the worker has moved, the models are updated as soon as a tick completes.
+        self.worker.signals.tick_completed.connect(self._update_models)
+        # A layout given directly is created instead of the layout file, e.g. an empty one by the benchmarks.
+        if layout is None:
+            layout = ComponentLayout.load(layout_path) if layout_path else self.DEFAULT_LAYOUT
+        self.load_layout(layout)
         self.setCentralWidget(self.canvas)
         main_layout = QVBoxLayout(self.canvas)
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout = self._create_options(main_layout)
         main_layout = self._create_layer_buttons(main_layout)
-        self.model_updater = ModelUpdater(self.canvas.component_list, self.canvas.channels, self.worker)
-
-        self.update_timer = QTimer(self)
-        self.update_timer.timeout.connect(self._update_models)
-        self.update_timer.start(1000)
+        self.worker.update_data()
 
         self.worker.moveToThread(self.workerThread)
         self.workerThread.finished.connect(self.worker.deleteLater)
         self.workerThread.started.connect(self.worker.run)
         self.workerThread.start()
+        self.metrics_server = None
+        if metrics_port is not None:
+            self._start_metrics_server(metrics_port)
         self.show()
 
+    def _start_metrics_server(self, port: int):
+        """
+            Serves the backend, stage and scene metrics on \a port. The scene item counts are published from
+            the gui thread by a timer, the scrapes only read the published values.
+        """
+        self.metrics_server = MetricsServer(port)
+        self.metrics_server.add_collector(self.worker.core.metrics)
+        self.metrics_server.add_collector(lambda: instrumentation_metrics(self.instrumentation))
+        self._publish_scene_metrics()
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self._publish_scene_metrics)
+        self.metrics_timer.start(self.METRICS_PERIOD_MS)
+        self.metrics_server.start()
+
+    def _publish_scene_metrics(self):
+        """Publishes the item counts of the canvas to the metrics endpoint."""
+        for kind, count in self.canvas.item_counts().items():
+            self.metrics_server.set_gauge("smart_home_scene_items", count, "Items of the gui scene.", {"kind": kind})
+
     def _create_options(self, main_layout):
         """
             Creates the dropdown options menu.
@@ -80,10 +124,16 @@ class MainWindow(QMainWindow):
         return main_layout
 
     def _create_layer_buttons(self, main_layout):
-        layer_control_container = LayerControlWidget()
-        main_layout.addWidget(layer_control_container)
+        self.layer_controls = LayerControlWidget()
+        self.layer_controls.layer_toggled.connect(self.set_layer_active)
+        main_layout.addWidget(self.layer_controls)
         return main_layout
 
+    def set_layer_active(self, name: str, active: bool):
+        """Activates or tears down a backend layer, the layer is loaded on first activation."""
+        QMetaObject.invokeMethod(
+            self.worker, "set_layer_active", Qt.QueuedConnection, Q_ARG(str, name), Q_ARG(bool, active))
+
     def create_component(self, type: int, x: int, y: int):
         """
             Creates a new backend and ui component for the appropriate component type.
@@ -92,9 +142,36 @@ class MainWindow(QMainWindow):
                 - type (int): component type to create
                 - x (int): x coordinate where it was requested to be created at.
                 - y (int): y coordinate where it was requested to be created at.
+
+            Returns:
+                Stable id of the new component.
         """
-        id = self.worker.electrical_layer_controller.add_component(type)
+        id = self.worker.add_component(type)
         self.canvas.add_new_component_gui(id, type, x, y)
+        return id
+
+    def remove_component(self, id: int):
+        """
+            Removes a backend and ui component together with all of its connections.
+
+            Parameters:
+                - id (int): id of the component to remove.
+        """
+        for channel_id in self.worker.remove_component(id):
+            self.canvas.remove_channel(channel_id)
+        self.canvas.remove_component_gui(id)
+
+    def move_component(self, id: int, x: int, y: int):
+        """
+            Moves a ui component, only the channels of the component are re-routed.
+
+            Parameters:
+                - id (int): id of the component to move.
+                - x (int): new x coordinate of the component.
+                - y (int): new y coordinate of the component.
+        """
+        channel_ids = self.worker.connection_ids(id)
+        self.canvas.move_component_gui(id, x, y, channel_ids)
 
     def create_connection(self, id_start: int, id_end: int):
         """
@@ -103,13 +180,52 @@ class MainWindow(QMainWindow):
             Parameters:
                 - id_start (int): id of the start component.
                 - id_end (int): id of the end component.
+
+            Returns:
+                Stable id of the new connection.
         """
-        self.worker.electrical_layer_controller.add_component_pair(id_start, id_end)
-        self.canvas.add_new_channel(id_start, id_end)
+        channel_id = self.worker.add_connection(id_start, id_end)
+        self.canvas.add_new_channel(channel_id, id_start, id_end)
+        return channel_id
 
-    def _update_models(self):
-        """Periodicallay called method to update gui data models."""
-        self.model_updater.update_component_models()
+    def load_layout(self, layout: ComponentLayout) -> dict:
+        """
+            Creates the components and connections of \a layout with one bulk call each.
+
+            Returns:
+                Ids of the new components keyed by their id in the layout.
+        """
+        ids = self.worker.add_components(layout.types)
+        self.canvas.add_new_component_guis(ids, layout.types, layout.x, layout.y)
+        start, end = layout.connection_indices()
+        ids_start = [ids[index] for index in start.tolist()]
+        ids_end = [ids[index] for index in end.tolist()]
+        channel_ids = self.worker.add_connections(ids_start, ids_end)
+        self.canvas.add_new_channels(channel_ids, ids_start, ids_end)
+        return dict(zip(layout.ids.tolist(), ids))
+
+    def export_layout(self) -> ComponentLayout:
+        """Returns the current components with their canvas locations and the connections between them."""
+        ids = list(self.canvas.component_list)
+        locations = [self.canvas.component_list[id].model.component_location for id in ids]
+        edges = self.worker.connections()
+        return ComponentLayout(
+            ids,
+            self.worker.component_types(ids),
+            [int(location.x()) for location in locations],
+            [int(location.y()) for location in locations],
+            [start for start, _ in edges],
+            [end for _, end in edges])
+
+    def save_layout(self, path: str):
+        """Writes the current layout to \a path, as JSON or as a numpy archive when it ends with .npz."""
+        self.export_layout().save(path)
+
+    def _update_models(self, snapshot):
+        """Updates the gui data models of the items changed by a completed backend tick."""
+        self.model_updater.update_component_models(snapshot)
+        if snapshot.totals:
+            self.layer_controls.set_totals(self.model_updater.layer_totals_text())
 
     def create_canvas_layout(self):
         """Create the main canvas interface."""
@@ -122,10 +238,15 @@ class MainWindow(QMainWindow):
 
     def sigint_handler(self):
         """Terminate UI and the threads appropriately."""
-        if self.worker is not None:
-            self.worker.stop = True
+        if self.worker is not None and self.workerThread.isRunning():
+            # Stop the backend in its own thread, then leave the thread's event loop.
+            QMetaObject.invokeMethod(self.worker, "stop", Qt.BlockingQueuedConnection)
             self.workerThread.quit()
             self.workerThread.wait()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.instrumentation_path is not None:
+            self.instrumentation.dump(self.instrumentation_path)
         print("Exiting app through GUI")
         QApplication.quit()
 
@@ -0,0 +1,198 @@
+"""
+    Headless entry point: runs the backend (layer controller ticks, device ingestion and
+    history persistence) without importing Qt, for servers and benchmarks.
+
+    Usage: python src/headless.py --components 1000 --ticks 1000
+           python src/headless.py --components 1000 --scheduled 10
+           python src/headless.py --components 10 --simulate 31536000
+           python src/headless.py --layout house.json --ticks 100
+           python src/headless.py --components 1000 --ticks 1000 --instrument stages.json
+           python src/headless.py --components 1000 --period 1 --metrics-port 9464
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse # noqa
+import sys # noqa
+
+from backend_core import BackendCore # noqa
+from component_layout import ComponentLayout # noqa
+from components.component_types import TYPE_SOLAR_PANEL, TYPE_BATTERY # noqa
+from instrumentation import Instrumentation # noqa
+from metrics_server import MetricsServer, instrumentation_metrics # noqa
+from layers.layer_registry import LayerRegistry # noqa
+
+
+class HeadlessRunner():
+    """Drives a BackendCore with a plain loop instead of Qt timers."""
+    def __init__(self, core: BackendCore):
+        self.core = core
+        self.ticks = 0
+        self.tick_seconds = 0.0
+
+    def build_demo_layout(self, components: int):
+        """Creates alternating solar panels and batteries, each panel connected to the next battery."""
+        layer = self.core.electrical_layer_controller
+        previous = None
+        for index in range(components):
+            id = self.core.add_component(TYPE_SOLAR_PANEL if index % 2 == 0 else TYPE_BATTERY)
+            if previous is not None:
+                layer.add_component_pair(previous, id)
+            previous = id
+
+    def load_layout(self, path: str):
+        """Creates the components and connections of the layout file \a path, the locations are ignored."""
+        layout = ComponentLayout.load(path)
+        ids = self.core.add_components(layout.types)
+        start, end = layout.connection_indices()
+        self.core.electrical_layer_controller.add_component_pairs(
+            [ids[index] for index in start.tolist()], [ids[index] for index in end.tolist()])
+
+    def run(self, ticks: int = None, period: float = None):
+        """
+            Ticks the backend.
+
+            Parameters:
+                - ticks (int): number of ticks to run, runs until interrupted when None.
+                - period (float): seconds between the ticks, ticks back to back when None.
+        """
+        self.core.start()
+        next_tick = time.monotonic()
+        try:
+            while ticks is None or self.ticks < ticks:
+                if period is not None:
+                    delay = next_tick - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_tick += period
+                start = time.perf_counter()
+                self.core.tick()
+                self.tick_seconds += time.perf_counter() - start
+                self.ticks += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.core.stop()
+
+    def run_scheduled(self, duration: float):
+        """Runs the component scheduler in real time for \a duration seconds, sleeping until each deadline."""
+        scheduler = self.core.scheduler
+        self.core.start()
+        end = scheduler.clock() + duration
+        try:
+            while True:
+                start = time.perf_counter()
+                delay = self.core.run_due()
+                self.tick_seconds += time.perf_counter() - start
+                self.ticks += 1
+                now = scheduler.clock()
+                if now >= end:
+                    break
+                wakeup = end if delay is None else min(now + delay, end)
+                if wakeup > now:
+                    time.sleep(wakeup - now)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.core.stop()
+
+
+def loaded_layers() -> set:
+    """Names of the layers whose plugin module has been imported."""
+    return {
+        name for name, path in LayerRegistry.PLUGINS.items()
+        if path.split(":")[0] in sys.modules
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", type=int, default=2, help="number of demo components to create")
+    parser.add_argument("--layout", default=None, help="layout file (.json or .npz) to create instead of the demo chain")
+    parser.add_argument("--ticks", type=int, default=None, help="number of ticks, runs until Ctrl+C when omitted")
+    parser.add_argument("--period", type=float, default=None, help="seconds between ticks, back to back when omitted")
+    parser.add_argument(
+        "--scheduled", type=float, default=None, metavar="SECONDS",
+        help="run the per component scheduler in real time for SECONDS instead of ticking every component")
+    parser.add_argument(
+        "--speed", type=float, default=None,
+        help="with --scheduled, run the demo data on a simulation clock this many times faster than real time")
+    parser.add_argument(
+        "--simulate", type=float, default=None, metavar="SECONDS",
+        help="generate SECONDS of simulated demo data as fast as possible and exit")
+    parser.add_argument("--layers", default="", help="comma separated layers to activate next to the electrical one")
+    parser.add_argument("--archive-dir", default=None, help="directory of the persistent history archives")
+    parser.add_argument("--simulate-devices", action="store_true", help="feed the components from simulated devices")
+    parser.add_argument(
+        "--instrument", default=None, metavar="FILE",
+        help="time the tick stages, print them and dump them with their latency histograms to FILE")
+    parser.add_argument(
+        "--metrics-port", type=int, default=None, metavar="PORT",
+        help="serve the backend and stage metrics in the Prometheus text format on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    tick_period = args.period if args.period is not None else 1.0
+    instrumentation = Instrumentation(enabled=args.instrument is not None or args.metrics_port is not None)
+    core = BackendCore(
+        args.archive_dir, args.simulate_devices, tick_period, publish_snapshots=False, simulation_speed=args.speed,
+        instrumentation=instrumentation)
+    runner = HeadlessRunner(core)
+    if args.layout is not None:
+        runner.load_layout(args.layout)
+        args.components = len(core.electrical_layer_controller.components)
+    else:
+        runner.build_demo_layout(args.components)
+    for name in filter(None, args.layers.split(",")):
+        core.set_layer_active(name, True)
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(args.metrics_port)
+        metrics_server.add_collector(core.metrics)
+        metrics_server.add_collector(lambda: instrumentation_metrics(instrumentation))
+        metrics_server.start()
+    startup = time.perf_counter() - STARTED
+
+    wall_start = time.perf_counter()
+    if args.simulate is not None:
+        generated = core.electrical_layer_controller.simulate_until(args.simulate)
+        wall = time.perf_counter() - wall_start
+        core.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        print(f"simulated: {args.simulate:g} s of {args.components} components in {wall:.3f} s, "
+              f"{args.simulate / wall:.0f}x real time, {generated / wall / 1e6:.1f} M samples/s")
+        report_instrumentation(instrumentation, args.instrument)
+        return
+    if args.scheduled is not None:
+        runner.run_scheduled(args.scheduled)
+    else:
+        runner.run(args.ticks, args.period)
+    wall = time.perf_counter() - wall_start
+    if metrics_server is not None:
+        metrics_server.stop()
+
+    print(f"startup: {startup * 1000:.1f} ms (imports and {args.components} components)")
+    print(f"ticks: {runner.ticks} in {wall:.3f} s, {runner.ticks / wall if wall > 0 else 0:.1f} ticks/s, "
+          f"{runner.tick_seconds / max(runner.ticks, 1) * 1000:.3f} ms per tick")
+    for period, stats in sorted(core.scheduler.lag_stats().items()):
+        print(f"period {period:g} s: {stats['runs']} runs, mean lag {stats['mean_lag'] * 1000:.3f} ms, "
+              f"max lag {stats['max_lag'] * 1000:.3f} ms, {stats['late']} late, {stats['skipped']} skipped")
+    print(f"layers loaded: {', '.join(sorted(loaded_layers()))}")
+    print(f"qt loaded: {any(name.startswith('PyQt5') for name in sys.modules)}")
+    report_instrumentation(instrumentation, args.instrument)
+
+
+def report_instrumentation(instrumentation: Instrumentation, path: str):
+    """Prints the stage timings and the cost per component type and dumps them to \a path, when instrumented."""
+    if path is None:
+        return
+    print(instrumentation.report())
+    for stage in ("update_demo", "ingest", "simulate"):
+        for part, cost in instrumentation.breakdown(stage).items():
+            print(f"{stage} {part}: {cost['share'] * 100:.0f}%, {cost['per_item_us']:.2f} us per component")
+    instrumentation.dump(path)
+
+
+if __name__ == "__main__":
+    main()
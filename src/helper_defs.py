@@ -8,8 +8,7 @@ from PyQt5.QtCore import (
     QTextStream
 )
 
-TYPE_SOLAR_PANEL = 0
-TYPE_BATTERY = 1
+from components.component_types import TYPE_SOLAR_PANEL, TYPE_BATTERY # noqa
 
 
 def invert_colors(pixmap):
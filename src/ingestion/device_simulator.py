@@ -0,0 +1,106 @@
+import abc
+import asyncio
+import random
+import time
+
+from components.component_types import TYPE_SOLAR_PANEL, TYPE_BATTERY
+
+
+class DeviceSample():
+    """One reading of a device, values are given in the INGEST_FIELDS order of the component type."""
+    __slots__ = ("component_id", "timestamp", "values")
+
+    def __init__(self, component_id: int, timestamp: float, values: tuple):
+        self.component_id = component_id
+        self.timestamp = timestamp
+        self.values = values
+
+
+class DeviceStream(abc.ABC):
+    """
+        Base class of the device streams read by the ingestion pipeline.
+        A real device implementation awaits its transport (socket, serial line, modbus etc.) in read().
+    """
+    def __init__(self, component_id: int):
+        self.component_id = component_id
+
+    @abc.abstractmethod
+    async def read(self) -> DeviceSample:
+        """Waits for and returns the next sample of the device."""
+
+    async def close(self):
+        """Releases the transport of the device."""
+        pass
+
+
+class SimulatedInverter(DeviceStream):
+    """Stands in for a solar inverter, reports power and panel voltage with a random walk."""
+    def __init__(
+            self,
+            component_id: int,
+            period: float = 1.0,
+            rated_power_kWh: float = 10,
+            seed: int = None,
+            clock=time.monotonic):
+        """
+            Parameters:
+                - component_id (int): component fed by the device.
+                - period (float): mean seconds between two samples.
+                - rated_power_kWh (float): upper bound of the reported power.
+                - seed (int): seed of the random walk.
+                - clock (callable): returns the timestamp of a new sample in seconds.
+        """
+        super(SimulatedInverter, self).__init__(component_id)
+        self.clock = clock
+        self.period = period
+        self.rated_power_kWh = rated_power_kWh
+        self.random = random.Random(seed)
+        self.power_kWh = rated_power_kWh * 0.9
+
+    async def read(self) -> DeviceSample:
+        await asyncio.sleep(self.period * self.random.uniform(0.95, 1.05))
+        self.power_kWh = min(max(self.power_kWh + self.random.gauss(0, 0.2), 0), self.rated_power_kWh)
+        voltage_V = 20 + self.random.gauss(0, 0.5) if self.power_kWh > 0 else 0
+        return DeviceSample(self.component_id, self.clock(), (self.power_kWh, voltage_V))
+
+
+class SimulatedBatteryBMS(DeviceStream):
+    """Stands in for a battery management system, reports the stored charge."""
+    def __init__(
+            self,
+            component_id: int,
+            period: float = 1.0,
+            capacity_kWh: float = 36,
+            seed: int = None,
+            clock=time.monotonic):
+        """
+            Parameters:
+                - component_id (int): component fed by the device.
+                - period (float): mean seconds between two samples.
+                - capacity_kWh (float): upper bound of the reported charge.
+                - seed (int): seed of the random walk.
+                - clock (callable): returns the timestamp of a new sample in seconds.
+        """
+        super(SimulatedBatteryBMS, self).__init__(component_id)
+        self.clock = clock
+        self.period = period
+        self.capacity_kWh = capacity_kWh
+        self.random = random.Random(seed)
+        self.charge_kWh = capacity_kWh * 0.5
+
+    async def read(self) -> DeviceSample:
+        await asyncio.sleep(self.period * self.random.uniform(0.95, 1.05))
+        self.charge_kWh = min(max(self.charge_kWh + self.random.uniform(-0.02, 0.04), 0), self.capacity_kWh)
+        return DeviceSample(self.component_id, self.clock(), (self.charge_kWh,))
+
+
+def create_simulated_device(component_id: int, type: int, period: float = 1.0, clock=time.monotonic) -> DeviceStream:
+    """
+        Returns a simulated device stream for a component of the given type,
+        its samples are stamped with \a clock.
+    """
+    if type == TYPE_SOLAR_PANEL:
+        return SimulatedInverter(component_id, period, seed=component_id, clock=clock)
+    elif type == TYPE_BATTERY:
+        return SimulatedBatteryBMS(component_id, period, seed=component_id, clock=clock)
+    raise Exception("Unknown component type")
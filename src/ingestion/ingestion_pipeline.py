@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import traceback
+
+from ingestion.device_simulator import DeviceStream
+
+
+class IngestionPipeline():
+    """
+        Reads many device streams concurrently on an asyncio loop running in its own thread.
+        Samples are collected on the loop and handed over once per tick as a single batch through
+        the on_batch callback, which is called from the pipeline thread. The callback must only
+        enqueue the batch (e.g. emit a queued Qt signal), the controllers are updated by the consumer.
+    """
+    def __init__(self, on_batch, tick_period: float = 1.0):
+        """
+            Parameters:
+                - on_batch (callable): called with the list of DeviceSample-s collected during a tick.
+                - tick_period (float): batching period in seconds.
+        """
+        self.on_batch = on_batch
+        self.tick_period = tick_period
+        self.loop = None
+        self._thread = None
+        # Reader tasks keyed by component id, and the streams added before the pipeline started.
+        self._tasks = dict()
+        self._waiting_streams = dict()
+        self._pending = list()
+        self._ready = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        """True while the pipeline thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def device_count(self) -> int:
+        """Number of devices being read."""
+        return len(self._tasks) + len(self._waiting_streams)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of samples waiting for the next batch."""
+        return len(self._pending)
+
+    def start(self):
+        """Starts the pipeline thread and its event loop."""
+        if self.running:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="IngestionPipeline", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        """Stops reading the devices and joins the pipeline thread."""
+        if not self.running:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def add_device(self, stream: DeviceStream):
+        """Starts reading \a stream, can be called from any thread."""
+        if self.running:
+            self.loop.call_soon_threadsafe(self._start_reader, stream)
+        else:
+            self._waiting_streams[stream.component_id] = stream
+
+    def remove_device(self, component_id: int):
+        """Stops reading the device of \a component_id, can be called from any thread."""
+        if self.running:
+            self.loop.call_soon_threadsafe(self._stop_reader, component_id)
+        else:
+            self._waiting_streams.pop(component_id, None)
+
+    def _run(self):
+        """Pipeline thread body."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        for stream in self._waiting_streams.values():
+            self._start_reader(stream)
+        self._waiting_streams = dict()
+        flush_task = self.loop.create_task(self._flush_periodically())
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            flush_task.cancel()
+            self.loop.run_until_complete(asyncio.gather(flush_task, return_exceptions=True))
+            self.loop.close()
+
+    def _start_reader(self, stream: DeviceStream):
+        """Creates the reader task of \a stream."""
+        self._stop_reader(stream.component_id)
+        self._tasks[stream.component_id] = (stream, self.loop.create_task(self._read_device(stream)))
+
+    def _stop_reader(self, component_id: int):
+        """Cancels the reader task of \a component_id."""
+        entry = self._tasks.pop(component_id, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def _read_device(self, stream: DeviceStream):
+        """Reads \a stream until cancelled."""
+        try:
+            while True:
+                sample = await stream.read()
+                # Looked up after the await, the flush task swaps the pending list.
+                self._pending.append(sample)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            await stream.close()
+
+    async def _flush_periodically(self):
+        """Hands the samples collected during the tick over in one batch."""
+        while True:
+            await asyncio.sleep(self.tick_period)
+            if self._pending:
+                batch = self._pending
+                self._pending = list()
+                self.on_batch(batch)
+
+    async def _shutdown(self):
+        """Cancels every reader task and waits for them to finish."""
+        tasks = [task for _, task in self._tasks.values()]
+        self._tasks = dict()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,222 @@
+import contextlib
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class LatencyHistogram():
+    """
+        Histogram of durations in nanoseconds with log-linear buckets, like an HDR histogram:
+        durations below 2^SUB_BUCKET_BITS ns get a bucket each, every power of two above is split into
+        2^(SUB_BUCKET_BITS - 1) buckets. Recording is O(1) and every percentile is reported with a relative
+        error below 2^-(SUB_BUCKET_BITS - 1), whatever the range of the durations.
+    """
+    SUB_BUCKET_BITS = 7
+    # Longest distinguished duration, about 18 minutes, longer durations count into the last bucket.
+    MAX_BITS = 40
+    _SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    _HALF = _SUB_BUCKETS // 2
+    BUCKETS = _SUB_BUCKETS + (MAX_BITS - SUB_BUCKET_BITS) * _HALF
+    # Highest duration of each bucket, the value reported for the percentiles falling into it.
+    _index = np.arange(BUCKETS - _SUB_BUCKETS)
+    _shift = _index // _HALF + 1
+    UPPER_BOUNDS = np.concatenate((
+        np.arange(_SUB_BUCKETS), ((_index % _HALF + _HALF + 1) << _shift) - 1)).astype(np.int64)
+    del _index, _shift
+
+    def __init__(self):
+        # A list, incrementing one of its ints is cheaper than indexing a numpy array.
+        self.counts = [0] * self.BUCKETS
+
+    @classmethod
+    def bucket(cls, duration: int) -> int:
+        """Returns the index of the bucket of \a duration nanoseconds."""
+        if duration < cls._SUB_BUCKETS:
+            return max(duration, 0)
+        shift = duration.bit_length() - cls.SUB_BUCKET_BITS
+        return min(cls._SUB_BUCKETS + (shift - 1) * cls._HALF + (duration >> shift) - cls._HALF, cls.BUCKETS - 1)
+
+    def record(self, duration: int):
+        """Adds one duration of \a duration nanoseconds."""
+        self.counts[self.bucket(duration)] += 1
+
+    def percentiles(self, quantiles) -> np.ndarray:
+        """Returns the durations in nanoseconds below which the \a quantiles (0 - 1) of the recorded ones fall."""
+        cumulative = np.cumsum(self.counts)
+        if cumulative[-1] == 0:
+            return np.zeros(len(quantiles), dtype=np.int64)
+        ranks = np.maximum(np.ceil(np.asarray(quantiles) * cumulative[-1]), 1)
+        return self.UPPER_BOUNDS[np.searchsorted(cumulative, ranks)]
+
+    def nonzero(self) -> dict:
+        """Counts of the used buckets keyed by the highest duration of the bucket."""
+        counts = np.asarray(self.counts)
+        used = np.flatnonzero(counts)
+        return dict(zip(self.UPPER_BOUNDS[used].tolist(), counts[used].tolist()))
+
+
+class StageStats():
+    """Durations of one instrumented stage: a latency histogram, totals and the runs over the budget of the stage."""
+    __slots__ = ("histogram", "count", "total", "minimum", "maximum", "items", "budget", "overruns")
+
+    def __init__(self, budget: int = None):
+        self.histogram = LatencyHistogram()
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = 0
+        # Number of items, e.g. components, processed by the runs.
+        self.items = 0
+        # Longest expected run in nanoseconds, longer runs count as overruns.
+        self.budget = budget
+        self.overruns = 0
+
+    def record(self, duration: int, items: int):
+        """Adds a run of \a duration nanoseconds processing \a items items."""
+        self.histogram.record(duration)
+        self.count += 1
+        self.total += duration
+        self.items += items
+        if self.minimum is None or duration < self.minimum:
+            self.minimum = duration
+        if duration > self.maximum:
+            self.maximum = duration
+        if self.budget is not None and duration > self.budget:
+            self.overruns += 1
+
+    def summary(self) -> dict:
+        """Statistics of the stage in milliseconds, the cost per item in microseconds."""
+        # The highest duration of a bucket may exceed the longest run recorded into it.
+        percentiles = np.minimum(self.histogram.percentiles((0.5, 0.9, 0.99, 0.999)), self.maximum)
+        p50, p90, p99, p999 = (percentiles / 1e6).tolist()
+        return {
+            "count": self.count,
+            "total_ms": self.total / 1e6,
+            "mean_ms": self.total / self.count / 1e6 if self.count else 0.0,
+            "min_ms": (self.minimum or 0) / 1e6,
+            "max_ms": self.maximum / 1e6,
+            "p50_ms": p50,
+            "p90_ms": p90,
+            "p99_ms": p99,
+            "p999_ms": p999,
+            "items": self.items,
+            "per_item_us": self.total / self.items / 1e3 if self.items else 0.0,
+            "budget_ms": self.budget / 1e6 if self.budget is not None else None,
+            "overruns": self.overruns,
+        }
+
+
+class _StageTimer():
+    """Context manager timing one run of a stage."""
+    __slots__ = ("stats", "items", "start")
+
+    def __init__(self, stats: StageStats, items: int):
+        self.stats = stats
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(time.perf_counter_ns() - self.start, self.items)
+
+
+class Instrumentation():
+    """
+        Timers of the stages of the backend tick and of the gui updates, e.g. `update_demo`, with a latency
+        histogram, the number of runs over the stage budget and the number of processed items per stage.
+        Stages named `stage:part` break the cost of a stage down, e.g. per component type.
+        When disabled, timer() returns a shared no-op context, so the instrumented code costs one call per stage.
+        Every stage is recorded by a single thread, the statistics can be queried from any thread while
+        running, a query may miss the runs being recorded meanwhile.
+    """
+    _DISABLED = contextlib.nullcontext()
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # StageStats keyed by stage name.
+        self._stages = dict()
+        # Budgets in nanoseconds keyed by stage name, also applied to stages created later.
+        self._budgets = dict()
+        self._lock = threading.Lock()
+
+    def _stage(self, name: str) -> StageStats:
+        """Returns the statistics of the stage \a name, creates them on first use."""
+        stats = self._stages.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._stages.setdefault(name, StageStats(self._budgets.get(name)))
+        return stats
+
+    def timer(self, name: str, items: int = 1):
+        """
+            Returns a context manager timing one run of the stage \a name.
+
+            Parameters:
+                - name (str): name of the stage.
+                - items (int): number of items, e.g. components, processed by the run.
+        """
+        if not self.enabled:
+            return self._DISABLED
+        return _StageTimer(self._stage(name), items)
+
+    def record(self, name: str, seconds: float, items: int = 1):
+        """Adds a run of the stage \a name that took \a seconds, when enabled."""
+        if self.enabled:
+            self._stage(name).record(int(seconds * 1e9), items)
+
+    def set_budget(self, name: str, seconds: float):
+        """Counts the runs of the stage \a name longer than \a seconds as overruns."""
+        budget = int(seconds * 1e9)
+        with self._lock:
+            self._budgets[name] = budget
+            stats = self._stages.get(name)
+            if stats is not None:
+                stats.budget = budget
+
+    def reset(self):
+        """Drops the recorded runs of every stage, the budgets are kept."""
+        with self._lock:
+            self._stages = dict()
+
+    def stats(self) -> dict:
+        """Returns StageStats.summary() of every stage keyed by the stage name."""
+        return {name: stats.summary() for name, stats in sorted(list(self._stages.items()))}
+
+    def breakdown(self, stage: str) -> dict:
+        """
+            Returns the cost of the parts of \a stage, e.g. of each component type of `update_demo`, keyed by
+            the part name: the total in milliseconds, its share of the parts and the cost per item in microseconds.
+        """
+        prefix = stage + ":"
+        parts = {name[len(prefix):]: stats for name, stats in list(self._stages.items()) if name.startswith(prefix)}
+        total = sum(stats.total for stats in parts.values())
+        return {
+            part: {
+                "total_ms": stats.total / 1e6,
+                "share": stats.total / total if total else 0.0,
+                "per_item_us": stats.total / stats.items / 1e3 if stats.items else 0.0,
+            }
+            for part, stats in sorted(parts.items())
+        }
+
+    def report(self) -> str:
+        """Returns the statistics of every stage as a text table."""
+        lines = [f"{'stage':40} {'runs':>7} {'mean':>8} {'p50':>8} {'p99':>8} {'max':>8} {'us/item':>8} {'over':>5}"]
+        for name, stats in self.stats().items():
+            lines.append(
+                f"{name:40} {stats['count']:7d} {stats['mean_ms']:8.3f} {stats['p50_ms']:8.3f} {stats['p99_ms']:8.3f} "
+                f"{stats['max_ms']:8.3f} {stats['per_item_us']:8.2f} {stats['overruns']:5d}")
+        return "\n".join(lines)
+
+    def dump(self, path: str):
+        """Writes the statistics and the used histogram buckets of every stage to the JSON file \a path."""
+        stages = {
+            name: dict(stats.summary(), histogram_ns=stats.histogram.nonzero())
+            for name, stats in sorted(list(self._stages.items()))
+        }
+        with open(path, "w") as file:
+            json.dump({"stages": stages}, file, indent=1)
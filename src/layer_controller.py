@@ -1,44 +1,484 @@
-from helper_defs import (
+import os
+
+import numpy as np
+
+from components.component_types import (
     TYPE_SOLAR_PANEL,
-    TYPE_BATTERY
+    TYPE_BATTERY,
+    TYPE_NAMES
 )
 from components.solar_controller import SolarController
 from components.battery_controller import BatteryController
+from components.component_store import ComponentStore
+from components.history_buffer import DEFAULT_HISTORY_CAPACITY, DEFAULT_PYRAMID_LEVELS
+from components.history_archive import HistoryArchive
+from components.rolling_stats import RollingStats, DEFAULT_STATS_WINDOW
+from component_graph import ComponentGraph
+from change_set import ChangeSet
+from alarm_engine import AlarmEngine, AlarmRule, ALARM_HIGH, ALARM_LOW, ALARM_RATE, ALARM_STALE
+from power_flow import PowerFlowSolver, PowerFlowResult
+from layers.layer import Layer
+from instrumentation import Instrumentation
 
 
-class LayerController():
+class LayerController(Layer):
     """
         Generic class to handle layers of the smart home layout.
         Layers can be, heat flow, electrical flow, heat mapped floor plan etc.
+        Registered as the electrical layer plugin, its components are scheduled one by one
+        by the backend, so the layer itself has no tick.
     """
-    def __init__(self):
-        self.components = list()
-        self.component_pairs = list()
-
-    def add_component(self, type: int) -> int:
-        """Creates a new backend component and returns its id in the list."""
-        if type == TYPE_SOLAR_PANEL:
-            self.components.append(SolarController())
-        elif type == TYPE_BATTERY:
-            self.components.append(BatteryController())
-        else:
+    NAME = "electrical"
+    # Controller class of each component type.
+    COMPONENT_TYPES = {
+        TYPE_SOLAR_PANEL: SolarController,
+        TYPE_BATTERY: BatteryController,
+    }
+    # Root seed of the random streams of the demo data generators.
+    DEMO_SEED = 1000
+    # Smallest change of a connection flow that is reported in the change sets.
+    FLOW_CHANGE_TOLERANCE = 1e-4
+    # Number of samples generated per vectorized simulation chunk, bounds the memory of long simulations.
+    SIMULATION_CHUNK_SAMPLES = 1 << 21
+    # Alarms checked when no rules are given: implausible panel voltages and power jumps, low battery
+    # charge, components missing five updates in a row and overloaded connections.
+    DEFAULT_ALARM_RULES = (
+        AlarmRule("overvoltage", ALARM_HIGH, 27.0, 0.5, SolarController, "voltage_V"),
+        AlarmRule("power jump", ALARM_RATE, 2.0, 0.5, SolarController, "power_kWh"),
+        AlarmRule("no data", ALARM_STALE, 5.0, 1.0, SolarController),
+        AlarmRule("low charge", ALARM_LOW, 15.0, 5.0, BatteryController, "charge_percent"),
+        AlarmRule("no data", ALARM_STALE, 5.0, 1.0, BatteryController),
+        AlarmRule("overload", ALARM_HIGH, 50.0, 5.0),
+    )
+
+    def __init__(
+            self,
+            vectorized: bool = True,
+            archive_dir: str = None,
+            pyramid_levels: int = DEFAULT_PYRAMID_LEVELS,
+            stats_window: float = DEFAULT_STATS_WINDOW,
+            alarm_rules: list = None,
+            instrumentation: Instrumentation = None):
+        """
+            Parameters:
+                - vectorized (bool): when true all components of a type are updated
+                  in one batch per tick, otherwise one by one.
+                - archive_dir (str): directory of the persistent history archives,
+                  histories are kept in memory only when not given.
+                - pyramid_levels (int): number of min/max downsampling levels kept per history, 0 disables them.
+                  The thumbnail charts read the raw samples unless their window holds more than
+                  LayerSnapshot.CHART_POINTS samples, one level covers their window for update periods down
+                  to 64 ms. Every level adds about 14 KB per component next to the 115 KB of the raw history.
+                - stats_window (float): window of the rolling statistics of every history and of the
+                  layer totals in seconds, None disables them.
+                - alarm_rules (list): AlarmRule-s checked by evaluate_alarms(), DEFAULT_ALARM_RULES when not given.
+                - instrumentation (Instrumentation): timers of the update stages, disabled ones when not given.
+        """
+        # Components keyed by their stable id. Ids are never reused, so removing a component
+        # does not invalidate the ids held by the gui.
+        self.components = dict()
+        # Connections between the components, the edge ids are the stable pair ids.
+        self.graph = ComponentGraph()
+        self._next_component_id = 0
+        self.power_flow_solver = PowerFlowSolver()
+        # Result of the latest power flow solution.
+        self.power_flow = None
+        self.vectorized = vectorized
+        self.pyramid_levels = pyramid_levels
+        self.stats_window = stats_window
+        # Rolling statistics of the sums of the history fields over all components of a type,
+        # keyed by the component type and sampled whenever the layer updates.
+        self.totals = dict()
+        self.archive_dir = archive_dir
+        # History archives keyed by component id.
+        self.archives = dict()
+        # Component stores keyed by (component type, history capacity).
+        self.stores = dict()
+        # Connection flows reported by the latest change set, in the edge order of the power flow result.
+        self._published_edge_ids = None
+        self._published_flow = None
+        self.alarms = AlarmEngine(self.DEFAULT_ALARM_RULES if alarm_rules is None else alarm_rules)
+        # Active alarm names of the components and connections whose alarms changed since the previous change set.
+        self._alarm_components = dict()
+        self._alarm_channels = dict()
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+    def _get_store(self, type: int, history_capacity: int) -> ComponentStore:
+        """Returns the store of the given component type and history capacity, creates it on first use."""
+        key = (type, history_capacity)
+        store = self.stores.get(key)
+        if store is None:
+            store = ComponentStore(
+                self.COMPONENT_TYPES[type], history_capacity, self.DEMO_SEED,
+                pyramid_levels=self.pyramid_levels, stats_window=self.stats_window)
+            self.stores[key] = store
+            if self.stats_window and type not in self.totals:
+                self.totals[type] = RollingStats(self.COMPONENT_TYPES[type].HISTORY_FIELDS, 1, self.stats_window)
+        return store
+
+    def add_component(
+            self,
+            type: int,
+            history_capacity: int = DEFAULT_HISTORY_CAPACITY,
+            update_period: float = None,
+            update_jitter: float = None) -> int:
+        """
+            Creates a new backend component and returns its stable id.
+
+            Parameters:
+                - type (int): component type to create
+                - history_capacity (int): number of samples the component keeps in its history.
+                - update_period (float): seconds between two updates, the type default when not given.
+                - update_jitter (float): tolerated update lateness in seconds, the type default when not given.
+        """
+        if type not in self.COMPONENT_TYPES:
+            raise Exception("Unknown component type")
+        return self._create_component(type, self._get_store(type, history_capacity), update_period, update_jitter)
+
+    def add_components(
+            self,
+            types,
+            history_capacity: int = DEFAULT_HISTORY_CAPACITY,
+            update_period: float = None,
+            update_jitter: float = None) -> list:
+        """
+            Creates a backend component for every entry of \a types in one call, the stores are grown
+            once per type instead of doubling while the components are added. See add_component().
+
+            Returns:
+                Stable ids of the new components, in the order of \a types.
+        """
+        types = np.asarray(types, dtype=np.int64)
+        unknown = set(np.unique(types).tolist()) - set(self.COMPONENT_TYPES)
+        if unknown:
             raise Exception("Unknown component type")
+        stores = dict()
+        for type, count in zip(*np.unique(types, return_counts=True)):
+            stores[int(type)] = self._get_store(int(type), history_capacity)
+            stores[int(type)].reserve(int(count))
+        return [
+            self._create_component(type, stores[type], update_period, update_jitter)
+            for type in types.tolist()
+        ]
+
+    def _create_component(self, type: int, store: ComponentStore, update_period: float, update_jitter: float) -> int:
+        """Creates a component of \a type in \a store under the next id and returns the id."""
+        # The demo data of a component depends only on the seed and its id, not on the rest of the layout.
+        component = self.COMPONENT_TYPES[type](store, component_id=self._next_component_id)
+        if update_period is not None:
+            component.update_period = update_period
+        if update_jitter is not None:
+            component.update_jitter = update_jitter
+        self.components[component.component_id] = component
+        self.graph.add_node(component.component_id)
+        self._next_component_id += 1
+        if self.archive_dir is not None:
+            self._open_archive(component, type)
+        return component.component_id
+
+    def component_type(self, id: int) -> int:
+        """Returns the component type the component \a id was created with."""
+        component = self.components.get(id)
+        if component is None:
+            raise Exception("Invalid component id")
+        return next(type for type, controller in self.COMPONENT_TYPES.items() if component.__class__ is controller)
+
+    def _open_archive(self, component, type: int):
+        """
+            Opens the history archive of \a component and restores its latest state and history from it.
+            The file is named by the component type and id, so a component created under the id of an
+            archived component of another type starts its own archive instead of reading a foreign one.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{TYPE_NAMES[type]}_{component.component_id}.hist")
+        archive = HistoryArchive(path, component.HISTORY_FIELDS)
+        self.archives[component.component_id] = archive
+        records = archive.latest(component.history.capacity)
+        if len(records) == 0:
+            return
+        component.history.extend(records["timestamp"], *(records[name] for name in component.HISTORY_FIELDS))
+        component.timestamp = records["timestamp"][-1]
+        for name in component.HISTORY_FIELDS:
+            setattr(component, name, records[name][-1])
+
+    def _archive_latest(self, ids=None):
+        """Appends the latest state of the archived components in \a ids, all when not given, to their archives."""
+        for id in (self.archives if ids is None else ids):
+            archive = self.archives.get(id)
+            if archive is None:
+                continue
+            component = self.components[id]
+            archive.append(component.timestamp, *(getattr(component, name) for name in component.HISTORY_FIELDS))
+
+    def close(self):
+        """Flushes and closes the history archives."""
+        for archive in self.archives.values():
+            archive.close()
+        self.archives = dict()
+
+    def teardown(self):
+        """Closes the history archives."""
+        self.close()
+
+    def remove_component(self, id: int) -> list:
+        """
+            Removes a component and all of its connections.
 
-        return len(self.components) - 1
+            Parameters:
+                - id (int): id of the component to remove.
+
+            Returns:
+                List of the removed pair ids.
+        """
+        component = self.components.get(id)
+        if component is None:
+            raise Exception("Invalid component id")
+        removed_pairs = self.graph.remove_node(id)
+        del self.components[id]
+        # The history of a removed component is dropped, a later component with the same id starts empty.
+        archive = self.archives.pop(id, None)
+        if archive is not None:
+            archive.delete()
+        component.store.release(component.row)
+        return removed_pairs
+
+    def add_component_pair(self, id_start: int, id_end: int) -> int:
+        """
+            Connects two backend items.
+
+            Parameters:
+                - id_start (int): id of the start component.
+                - id_end (int): id of the end component.
+
+            Returns:
+                Stable id of the connection.
+        """
+        if id_start not in self.components or id_end not in self.components:
+            raise Exception("Invalid component id")
+        return self.graph.add_edge(id_start, id_end)
 
-    def add_component_pair(self, id_start: int, id_end: int):
+    def add_component_pairs(self, ids_start, ids_end) -> list:
         """
-            Connects two backend items. Each item will maintain the list of connected id-s
+            Connects \a ids_start[i] to \a ids_end[i] for every index in one call.
 
-            Parameters
+            Returns:
+                Stable ids of the new connections, in the order of the endpoints.
         """
-        if id_start >= len(self.components) or id_end >= len(self.components):
+        ids_start = [int(id) for id in ids_start]
+        ids_end = [int(id) for id in ids_end]
+        if not self.components.keys() >= set(ids_start) | set(ids_end):
             raise Exception("Invalid component id")
-        self.components[id_start].connected_ids.append(id_end)
-        self.components[id_end].connected_ids.append(id_start)
-        self.component_pairs.append((self.components[id_start], self.components[id_end]))
-
-    def update_demo(self):
-        """Updates the data of each controller."""
-        for component in self.components:
-            component.generate_demo_data()
+        return self.graph.add_edges(ids_start, ids_end)
+
+    def remove_component_pair(self, pair_id: int):
+        """Removes the connection identified by \a pair_id."""
+        if pair_id not in self.graph.edges:
+            raise Exception("Invalid connection id")
+        self.graph.remove_edge(pair_id)
+
+    def connected_ids(self, id: int) -> list:
+        """Returns the ids of the components connected to the component \a id."""
+        return self.graph.neighbors(id)
+
+    def component_pair_ids(self, id: int) -> list:
+        """Returns the ids of the connections of the component \a id."""
+        return self.graph.incident_edges(id)
+
+    def ingest(self, samples: list):
+        """
+            Applies a batch of device samples to the controllers. Samples of the same store are
+            written with one vectorized call per round, a round holding at most one sample per
+            component, so several samples of one device in a batch are applied in order.
+
+            Parameters:
+                - samples (list): DeviceSample-s, samples of removed components are dropped.
+        """
+        rounds_per_store = dict()
+        for sample in samples:
+            component = self.components.get(sample.component_id)
+            if component is None:
+                continue
+            rounds = rounds_per_store.setdefault(component.store, [dict()])
+            for round in rounds:
+                if component.row not in round:
+                    round[component.row] = sample
+                    break
+            else:
+                rounds.append({component.row: sample})
+
+        for store, rounds in rounds_per_store.items():
+            component_type = store.component_type
+            with self.instrumentation.timer("ingest:" + component_type.__name__, sum(len(round) for round in rounds)):
+                for round in rounds:
+                    rows = np.fromiter(round, dtype=np.int64, count=len(round))
+                    timestamps = np.array([sample.timestamp for sample in round.values()])
+                    values = np.array([sample.values for sample in round.values()], dtype=np.float64).T
+                    component_type.apply_samples(store, rows, timestamps, values)
+                    if self.archives:
+                        self._archive_rows(store, rows)
+        self._record_totals()
+
+    def _archive_rows(self, store: ComponentStore, rows: np.ndarray):
+        """Appends the latest state of the archived components in \a rows of \a store to their archives."""
+        fields = store.component_type.HISTORY_FIELDS
+        for row in rows.tolist():
+            archive = self.archives.get(store.owners[row].component_id)
+            if archive is not None:
+                archive.append(store.columns["timestamp"][row], *(store.columns[name][row] for name in fields))
+
+    def solve_power_flow(self) -> PowerFlowResult:
+        """Computes the per-connection flows and per-component balance of the whole layer."""
+        with self.instrumentation.timer("power_flow", len(self.graph.edges)):
+            self.power_flow = self.power_flow_solver.solve(self.graph, self.components)
+        return self.power_flow
+
+    def simulate_until(self, time: float) -> int:
+        """
+            Generates the demo updates of every component up to the simulated \a time at once.
+            Each component gets one update per update period elapsed since its latest timestamp,
+            the updates of the components with the same step count are generated together in
+            vectorized chunks, and the power flow is solved once at the end.
+
+            Returns:
+                Number of generated updates.
+        """
+        generated = 0
+        for store in self.stores.values():
+            if store.size == 0:
+                continue
+            periods = store.column("update_period")
+            steps = np.floor((time - store.column("timestamp")) / periods).astype(np.int64)
+            store_generated = int(steps[steps > 0].sum())
+            with self.instrumentation.timer("simulate:" + store.component_type.__name__, store_generated):
+                for count in np.unique(steps[steps > 0]).tolist():
+                    rows = np.flatnonzero(steps == count)
+                    chunk = max(1, self.SIMULATION_CHUNK_SAMPLES // len(rows))
+                    for done in range(0, count, chunk):
+                        self._simulate_steps(store, rows, min(chunk, count - done))
+            generated += store_generated
+        if generated:
+            self.solve_power_flow()
+            self._record_totals()
+        return generated
+
+    def _simulate_steps(self, store: ComponentStore, rows: np.ndarray, steps: int):
+        """Generates \a steps updates of \a rows of \a store and records them in the histories and archives."""
+        component_type = store.component_type
+        samples = component_type.generate_demo_steps(store, rows, steps)
+        if samples is None:
+            if self.archives:
+                self._archive_rows(store, rows)
+            return
+        timestamps, columns = samples
+        for index, row in enumerate(rows.tolist()):
+            row_columns = tuple(column[:, index] for column in columns)
+            store.history.extend(timestamps[:, index], *row_columns, row=row)
+            archive = self.archives.get(store.owners[row].component_id)
+            if archive is not None:
+                archive.extend(timestamps[:, index], *row_columns)
+
+    def collect_changes(self) -> ChangeSet:
+        """
+            Collects the components whose tracked fields changed, the connections whose flow
+            moved by more than FLOW_CHANGE_TOLERANCE and the alarm transitions since the previous call.
+        """
+        components = dict()
+        for store in self.stores.values():
+            rows, masks = store.take_changes()
+            owners = store.owners
+            for row, mask in zip(rows.tolist(), masks.tolist()):
+                components[owners[row].component_id] = mask
+
+        channels = dict()
+        result = self.power_flow
+        if result is not None:
+            if self._published_edge_ids is not result.edge_ids:
+                # The topology changed, every connection is reported once.
+                self._published_edge_ids = result.edge_ids
+                self._published_flow = result.edge_flow.copy()
+                changed = np.arange(len(result.edge_ids))
+            else:
+                changed = np.flatnonzero(np.abs(result.edge_flow - self._published_flow) > self.FLOW_CHANGE_TOLERANCE)
+                self._published_flow[changed] = result.edge_flow[changed]
+            channels = dict(zip(result.edge_ids[changed].tolist(), result.edge_flow[changed].tolist()))
+        alarms, self._alarm_components = self._alarm_components, dict()
+        channel_alarms, self._alarm_channels = self._alarm_channels, dict()
+        return ChangeSet(components, channels, alarms, channel_alarms)
+
+    def evaluate_alarms(self, now: float):
+        """
+            Checks the alarm rules on every component and connection, the transitions are reported by the next
+            change set. A component raising and clearing an alarm between two change sets is reported cleared.
+
+            Parameters:
+                - now (float): current time in the clock of the update periods, see AlarmEngine.
+        """
+        with self.instrumentation.timer("alarms", len(self.components)):
+            components, channels = self.alarms.evaluate(self.stores.values(), self.power_flow, now)
+        self._alarm_components.update(components)
+        self._alarm_channels.update(channels)
+
+    def active_alarms(self) -> dict:
+        """Returns the names of the active alarms keyed by component id, for the components with any."""
+        return self.alarms.active_alarms(self.stores.values())
+
+    def update_demo(self, ids: list = None):
+        """
+            Updates the data of the controllers and the power flow between them.
+
+            Parameters:
+                - ids (list): ids of the components to update, every component is updated when not given.
+        """
+        timer = self.instrumentation.timer
+        with timer("update_demo", len(self.components) if ids is None else len(ids)):
+            if ids is None:
+                if self.vectorized:
+                    for store in self.stores.values():
+                        with timer("update_demo:" + store.component_type.__name__, store.size):
+                            store.component_type.generate_demo_batch(store)
+                else:
+                    for component in self.components.values():
+                        component.generate_demo_data()
+            elif self.vectorized:
+                rows_per_store = dict()
+                for id in ids:
+                    component = self.components[id]
+                    rows_per_store.setdefault(component.store, list()).append(component.row)
+                for store, rows in rows_per_store.items():
+                    with timer("update_demo:" + store.component_type.__name__, len(rows)):
+                        store.component_type.generate_demo_batch(store, np.array(rows, dtype=np.int64))
+            else:
+                for id in ids:
+                    self.components[id].generate_demo_data()
+            self._archive_latest(ids)
+        self.solve_power_flow()
+        self._record_totals()
+
+    def _record_totals(self):
+        """Adds the current sums of the history fields of every component type to the layer totals."""
+        with self.instrumentation.timer("totals", len(self.components)):
+            for type, totals in self.totals.items():
+                stores = [store for (store_type, _), store in self.stores.items() if store_type == type and store.size]
+                if not stores:
+                    continue
+                timestamp = max(store.column("timestamp").max() for store in stores)
+                sums = [sum(store.column(name).sum() for store in stores) for name in totals.fields]
+                totals.append_rows(np.zeros(1, dtype=np.int64), np.array([timestamp]), np.array(sums).reshape(-1, 1))
+
+    def history_nbytes(self) -> dict:
+        """Returns the memory held by the histories in bytes, keyed by the name of the controller class."""
+        nbytes = dict()
+        for store in list(self.stores.values()):
+            name = store.component_type.__name__
+            nbytes[name] = nbytes.get(name, 0) + store.history.nbytes
+        return nbytes
+
+    def total_stats(self) -> dict:
+        """
+            Returns the rolling window statistics of the layer totals, keyed by the controller class of the
+            component type, like the snapshots of its components, and the history field, see RollingStats.field_stats().
+        """
+        return {
+            self.COMPONENT_TYPES[type]: {field: totals.field_stats(field) for field in totals.fields}
+            for type, totals in self.totals.items()
+        }
@@ -0,0 +1,45 @@
+import numpy as np
+
+from layers.layer import Layer
+
+
+class HeatLayer(Layer):
+    """
+        Temperature map of the floor plan for the heatmap view. The floor plan is divided into a grid
+        of cells, heat sources warm their cell, heat spreads to the neighbour cells with an explicit
+        diffusion step and every cell loses heat towards the ambient temperature.
+    """
+    NAME = "heat"
+    TICK_PERIOD = 5.0
+    # Fraction of the temperature difference exchanged with the neighbour cells per tick, at most 0.25.
+    DIFFUSION = 0.2
+    # Fraction of the difference to the ambient temperature lost per tick.
+    COOLING = 0.01
+
+    def __init__(self, grid_shape: tuple = (64, 64), ambient_C: float = 20.0):
+        """
+            Parameters:
+                - grid_shape (tuple): number of (rows, columns) of the temperature grid.
+                - ambient_C (float): outside temperature the cells cool down to.
+        """
+        self.ambient_C = ambient_C
+        self.temperature_C = np.full(grid_shape, ambient_C, dtype=np.float64)
+        # Temperature rise per tick added by the heat sources of each cell.
+        self.heating = np.zeros(grid_shape, dtype=np.float64)
+
+    def set_heat_source(self, row: int, column: int, heating_C: float):
+        """Sets the temperature rise per tick of the cell at (\a row, \a column), 0 removes the source."""
+        self.heating[row, column] = heating_C
+
+    def tick(self, now: float):
+        """Applies one diffusion and cooling step to the whole grid."""
+        temperature = self.temperature_C
+        # Neighbour sum with insulated walls: the border cells mirror themselves.
+        padded = np.pad(temperature, 1, mode="edge")
+        laplacian = (padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]) - 4 * temperature
+        temperature += self.DIFFUSION * laplacian + self.heating - self.COOLING * (temperature - self.ambient_C)
+
+    def teardown(self):
+        """Drops the temperature and heating grids, a new activation starts from the ambient temperature."""
+        self.temperature_C = None
+        self.heating = None
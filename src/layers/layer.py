@@ -0,0 +1,20 @@
+class Layer():
+    """
+        Base class of the layer plugins of the LayerRegistry.
+        A layer is created when it is first activated and torn down when deactivated,
+        inactive layers are neither imported nor ticked.
+    """
+    # Name the layer is registered under.
+    NAME = None
+    # Seconds between two ticks of the layer, layers with None are not ticked by the registry.
+    TICK_PERIOD = None
+    # Tolerated lateness of the ticks in seconds.
+    TICK_JITTER = 0.1
+
+    def tick(self, now: float):
+        """Advances the layer to \a now, given in seconds on the scheduler clock."""
+        pass
+
+    def teardown(self):
+        """Releases the resources of the layer, the layer is not used afterwards."""
+        pass
@@ -0,0 +1,83 @@
+import importlib
+
+# Names of the available layers.
+LAYER_ELECTRICAL = "electrical"
+LAYER_HEAT = "heat"
+LAYER_LIGHT = "light"
+
+
+class LayerRegistry():
+    """
+        Registry of the layer plugins. Every plugin is given as a "module:Class" path and
+        its module is imported only when the layer is first activated, so startup does not
+        pay for layers that are never shown and inactive layers cost nothing.
+        The registry schedules the ticks of the active layers on an UpdateScheduler.
+    """
+    # Plugin path of each layer.
+    PLUGINS = {
+        LAYER_ELECTRICAL: "layer_controller:LayerController",
+        LAYER_HEAT: "layers.heat_layer:HeatLayer",
+        LAYER_LIGHT: "layers.light_layer:LightLayer",
+    }
+
+    def __init__(self, scheduler, layer_options: dict = None):
+        """
+            Parameters:
+                - scheduler (UpdateScheduler): scheduler the layer ticks are registered on,
+                  the tick keys are ("layer", name) tuples.
+                - layer_options (dict): keyword arguments of the layer constructors keyed by layer name.
+        """
+        self.scheduler = scheduler
+        self.layer_options = layer_options or dict()
+        # Active layers keyed by name.
+        self.layers = dict()
+
+    @staticmethod
+    def tick_key(name: str) -> tuple:
+        """Scheduler key of the ticks of the layer \a name."""
+        return ("layer", name)
+
+    def is_active(self, name: str) -> bool:
+        return name in self.layers
+
+    def get(self, name: str):
+        """Returns the layer \a name, activating it on first use."""
+        layer = self.layers.get(name)
+        if layer is None:
+            layer = self.activate(name)
+        return layer
+
+    def activate(self, name: str):
+        """Imports and creates the layer \a name unless it is active already, returns the layer."""
+        layer = self.layers.get(name)
+        if layer is not None:
+            return layer
+        path = self.PLUGINS.get(name)
+        if path is None:
+            raise Exception(f"Unknown layer: {name}")
+        module_name, class_name = path.split(":")
+        layer_class = getattr(importlib.import_module(module_name), class_name)
+        layer = layer_class(**self.layer_options.get(name, dict()))
+        self.layers[name] = layer
+        if layer.TICK_PERIOD is not None:
+            self.scheduler.add(self.tick_key(name), layer.TICK_PERIOD, layer.TICK_JITTER, self.scheduler.clock())
+        return layer
+
+    def deactivate(self, name: str):
+        """Stops ticking the layer \a name and tears it down."""
+        layer = self.layers.pop(name, None)
+        if layer is None:
+            return
+        self.scheduler.remove(self.tick_key(name))
+        layer.teardown()
+
+    def tick(self, name: str, now: float):
+        """Ticks the layer \a name if it is still active."""
+        layer = self.layers.get(name)
+        if layer is not None:
+            layer.tick(now)
+
+    def teardown(self):
+        """Tears down every active layer."""
+        for name in list(self.layers):
+            self.deactivate(name)
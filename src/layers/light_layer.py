@@ -0,0 +1,50 @@
+import math
+import time
+
+import numpy as np
+
+from layers.layer import Layer
+
+
+class LightLayer(Layer):
+    """
+        Illuminance of the lighting zones of the home for the light view: the daylight of the
+        time of day plus the artificial light set per zone.
+    """
+    NAME = "light"
+    TICK_PERIOD = 60.0
+    # Daylight illuminance at noon in lux.
+    PEAK_DAYLIGHT_LUX = 10000.0
+
+    def __init__(self, zones: int = 16, clock=time.time):
+        """
+            Parameters:
+                - zones (int): number of lighting zones.
+                - clock (callable): returns the wall clock time in seconds, the daylight follows its local hour.
+        """
+        self.clock = clock
+        # Light produced by the lamps of each zone in lux.
+        self.artificial_lux = np.zeros(zones, dtype=np.float64)
+        # Total illuminance of each zone after the latest tick.
+        self.illuminance_lux = np.zeros(zones, dtype=np.float64)
+        self.daylight_lux = 0.0
+
+    def set_zone_light(self, zone: int, lux: float):
+        """Sets the light produced by the lamps of \a zone."""
+        self.artificial_lux[zone] = lux
+
+    def daylight(self, timestamp: float) -> float:
+        """Daylight illuminance at \a timestamp, a half sine between 6:00 and 18:00 local time."""
+        local = time.localtime(timestamp)
+        hour = local.tm_hour + local.tm_min / 60
+        return self.PEAK_DAYLIGHT_LUX * max(0.0, math.sin(math.pi * (hour - 6) / 12))
+
+    def tick(self, now: float):
+        """Updates the daylight and the illuminance of every zone."""
+        self.daylight_lux = self.daylight(self.clock())
+        np.add(self.artificial_lux, self.daylight_lux, out=self.illuminance_lux)
+
+    def teardown(self):
+        """Drops the illuminance arrays of the zones, a new activation starts with the lamps off."""
+        self.artificial_lux = None
+        self.illuminance_lux = None
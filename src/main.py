@@ -1,3 +1,4 @@
+import os
 import sys
 
 from PyQt5.QtCore import Qt
@@ -7,6 +8,15 @@ from gui_main import MainWindow
 if __name__ == "__main__":
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
     app = QApplication(sys.argv + ["--no-sandbox"])
-    window = MainWindow()
+    # Histories are persisted and restored on restart when an archive directory is configured.
+    simulation_speed = os.environ.get("SMART_HOME_SIMULATION_SPEED")
+    metrics_port = os.environ.get("SMART_HOME_METRICS_PORT")
+    window = MainWindow(
+        archive_dir=os.environ.get("SMART_HOME_ARCHIVE_DIR"),
+        simulate_devices=os.environ.get("SMART_HOME_SIMULATE_DEVICES") == "1",
+        simulation_speed=float(simulation_speed) if simulation_speed else None,
+        layout_path=os.environ.get("SMART_HOME_LAYOUT"),
+        instrumentation_path=os.environ.get("SMART_HOME_INSTRUMENTATION"),
+        metrics_port=int(metrics_port) if metrics_port else None)
 
     sys.exit(app.exec_())
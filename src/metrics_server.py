@@ -0,0 +1,156 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import Instrumentation
+
+
+class MetricFamily():
+    """Samples of one metric in the Prometheus text format."""
+    __slots__ = ("name", "type", "help", "samples")
+
+    def __init__(self, name: str, type: str, help: str, samples: list = None):
+        """
+            Parameters:
+                - name (str): metric name, e.g. `smart_home_components`.
+                - type (str): `gauge`, `counter` or `summary`.
+                - help (str): description of the metric.
+                - samples (list): (suffix, labels, value) tuples, the suffix is appended to the name (e.g. `_sum`)
+                  and the labels are a dict.
+        """
+        self.name = name
+        self.type = type
+        self.help = help
+        self.samples = samples if samples is not None else list()
+
+    def add(self, value: float, labels: dict = None, suffix: str = ""):
+        """Adds a sample of \a value."""
+        self.samples.append((suffix, labels or dict(), value))
+
+    def render(self) -> str:
+        """Returns the family in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples:
+            label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+            label_text = f"{{{label_text}}}" if labels else ""
+            lines.append(f"{self.name}{suffix}{label_text} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format(value: float) -> str:
+    """Formats a sample value, with the spelling of the text format for NaN and the infinities."""
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    """Escapes a label value for the text format."""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def instrumentation_metrics(instrumentation: Instrumentation) -> list:
+    """Returns the durations, overruns and processed items of the instrumented stages as metric families."""
+    seconds = MetricFamily("smart_home_stage_seconds", "summary", "Duration of the instrumented backend and gui stages.")
+    overruns = MetricFamily("smart_home_stage_overruns_total", "counter", "Runs of a stage longer than its budget.")
+    items = MetricFamily("smart_home_stage_items_total", "counter", "Items, e.g. components, processed by a stage.")
+    for stage, stats in instrumentation.stats().items():
+        labels = {"stage": stage}
+        for quantile, key in (("0.5", "p50_ms"), ("0.9", "p90_ms"), ("0.99", "p99_ms")):
+            seconds.add(stats[key] / 1e3, dict(labels, quantile=quantile))
+        seconds.add(stats["total_ms"] / 1e3, labels, "_sum")
+        seconds.add(stats["count"], labels, "_count")
+        overruns.add(stats["overruns"], labels)
+        items.add(stats["items"], labels)
+    return [seconds, overruns, items]
+
+
+class MetricsServer():
+    """
+        Local HTTP endpoint serving `/metrics` in the Prometheus text format from a background thread.
+        Every scrape calls the collectors in the server thread, so they may only read data that is safe to read
+        from any thread: the instrumentation, the sizes of the backend arrays and queues, and the gauges other
+        threads set with set_gauge(). The gui publishes its own values as gauges from its thread, a scrape never
+        waits for or calls into the gui thread.
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        """
+            Parameters:
+                - port (int): port to listen on, a free one is picked for 0 (see the port property).
+                - host (str): address to listen on, only the local machine by default.
+        """
+        self.host = host
+        self._requested_port = port
+        # Callables returning lists of MetricFamily-s.
+        self.collectors = list()
+        # (help, {labels tuple: value}) of the gauges set by other threads, keyed by metric name.
+        self._gauges = dict()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        """Port the server listens on, the requested one until started."""
+        return self._server.server_address[1] if self._server is not None else self._requested_port
+
+    def add_collector(self, collector):
+        """Adds a callable returning a list of MetricFamily-s, called from the server thread on every scrape."""
+        self.collectors.append(collector)
+
+    def set_gauge(self, name: str, value: float, help: str = "", labels: dict = None):
+        """Sets the gauge \a name with \a labels to \a value, can be called from any thread."""
+        with self._lock:
+            gauge = self._gauges.setdefault(name, (help, dict()))
+            gauge[1][tuple(sorted((labels or dict()).items()))] = value
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text format."""
+        families = list()
+        for collector in self.collectors:
+            families.extend(collector())
+        with self._lock:
+            for name, (help, values) in sorted(self._gauges.items()):
+                families.append(MetricFamily(
+                    name, "gauge", help, [("", dict(labels), value) for labels, value in values.items()]))
+        return "".join(family.render() for family in families)
+
+    def start(self):
+        """Starts serving in a daemon thread."""
+        if self._server is not None:
+            return
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", MetricsServer.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self._requested_port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
@@ -2,11 +2,24 @@ from PyQt5.QtGui import QColor
 
 
 class ChannelModel():
-    """Data model for the channel gui item"""
+    """
+        Data model for the channel gui item.
+        The model is slotted and its colors refer to shared QColor constants instead of
+        allocating its own, which keeps it at about 100 bytes (see benchmarks/bench_memory.py).
+        The colors are never modified in place, a new color is assigned by replacing the reference.
+    """
+    # Color of the wire, the gradient of the channel path starts with it.
+    CHANNEL_COLOR = QColor('green')
+    # Arrow colors of a flow from the start to the end component and of the reverse flow.
+    FORWARD_ARROW_COLOR = QColor(0, 0, 255, 200)
+    REVERSE_ARROW_COLOR = QColor(255, 0, 0, 200)
+
+    __slots__ = ("animation_speed", "arrow_density", "text", "channel_color", "arrow_color", "arrows_reversed")
+
     def __init__(self):
         self.animation_speed = 1
         self.arrow_density = 1
         self.text = "--"
-        self.channel_color = QColor(0, 255, 0, 200)
-        self.arrow_color = QColor(0, 0, 255, 200)
+        self.channel_color = self.CHANNEL_COLOR
+        self.arrow_color = self.FORWARD_ARROW_COLOR
         self.arrows_reversed = False
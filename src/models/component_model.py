@@ -1,18 +1,32 @@
+import numpy as np
 from PyQt5.QtCore import QPointF
 
 
 class ComponentModel():
-    """Data model for component Gui items."""
+    """
+        Data model for component Gui items.
+        The model is slotted and starts out referring to shared default values, which keeps it at
+        about 100 bytes (see benchmarks/bench_memory.py). The defaults are never modified in place,
+        new values are assigned by replacing the reference.
+    """
     STATE_OK = 0
     STATE_ERROR = 1
+    ORIGIN = QPointF()
+    # Read-only like the chart arrays of the snapshots.
+    EMPTY_CHART = np.empty(0)
+    EMPTY_CHART.flags.writeable = False
+
+    __slots__ = (
+        "main_icon_data", "main_icon_state", "main_icon_path", "component_location", "thumbnail_chart_data1",
+        "thumbnail_chart_data2", "thumbnail_chart_area1", "thumbnail_chart_area2", "thumbnail_chart_timestamp")
 
     def __init__(self):
         self.main_icon_data = None
         self.main_icon_state = self.STATE_OK
         self.main_icon_path = ""
-        self.component_location = QPointF()
-        self.thumbnail_chart_data1 = list()
+        self.component_location = self.ORIGIN
+        self.thumbnail_chart_data1 = self.EMPTY_CHART
         self.thumbnail_chart_data2 = None
         self.thumbnail_chart_area1 = None
         self.thumbnail_chart_area2 = None
-        self.thumbnail_chart_timestamp = list()
+        self.thumbnail_chart_timestamp = self.EMPTY_CHART
@@ -0,0 +1,120 @@
+import string
+
+import numpy as np
+
+from components.rolling_stats import RollingStats
+from snapshot import ComponentSnapshot
+
+
+class ModelBinding():
+    """
+        Declarative mapping of the snapshots of one controller type onto the ComponentModel of its gui.
+        The icon text is given as format strings of the state fields and of the rolling window statistics,
+        e.g. `"{efficiency:.1f}%"` and `"{min:.1f} - {max:.1f} kWh"`, and compile() turns the binding into one
+        update function, so a tick dispatches every component with one dict lookup by its controller class.
+        The line of the type in the layer totals summary is given the same way, see totals_text().
+        The templates are checked against the state fields and RollingStats.STATS when the binding is created.
+    """
+    __slots__ = ("component_type", "displayed_fields", "lines", "stats_lines", "chart", "window_mean", "totals_line")
+
+    def __init__(
+            self,
+            component_type: type,
+            displayed_fields: tuple,
+            lines: tuple,
+            stats_lines: tuple = (),
+            chart: bool = True,
+            window_mean: bool = True,
+            totals_line: str = None):
+        """
+            Parameters:
+                - component_type (type): controller class of the bound components.
+                - displayed_fields (tuple): state fields shown by the gui, changes of the other fields need no redraw.
+                - lines (tuple): format strings of the icon text lines, formatted with the state fields.
+                - stats_lines (tuple): format strings of the lines appended when rolling window statistics
+                  are kept, formatted with the statistics of the charted field (see RollingStats.STATS).
+                - chart (bool): plot the recent history of the charted field in the thumbnail chart.
+                - window_mean (bool): draw the mean of the statistics window as the second chart line.
+                - totals_line (str): format string of the line of the type in the layer totals summary,
+                  formatted with the statistics of the charted field summed over the layer. No line when not given.
+        """
+        unknown = [field for field in displayed_fields if field not in component_type.STATE_FIELDS]
+        if unknown:
+            raise Exception(f"Unknown state fields of {component_type.__name__}: {', '.join(unknown)}")
+        self._check_templates(component_type, lines, component_type.STATE_FIELDS, "state fields")
+        stats_templates = tuple(stats_lines) + ((totals_line,) if totals_line is not None else ())
+        if stats_templates and not component_type.HISTORY_FIELDS:
+            raise Exception(f"{component_type.__name__} keeps no history the statistics lines could show")
+        self._check_templates(component_type, stats_templates, RollingStats.STATS, "statistics")
+        self.component_type = component_type
+        self.displayed_fields = tuple(displayed_fields)
+        self.lines = tuple(lines)
+        self.stats_lines = tuple(stats_lines)
+        self.chart = chart
+        self.window_mean = window_mean
+        self.totals_line = totals_line
+
+    @staticmethod
+    def _check_templates(component_type: type, templates, names, kind: str):
+        """Raises when a replacement field of \a templates is not one of \a names."""
+        unknown = list()
+        for template in templates:
+            for _, field, _, _ in string.Formatter().parse(template):
+                # Only the name is looked up, attribute and index accesses apply to its value.
+                name = field.split(".")[0].split("[")[0] if field is not None else None
+                if name is not None and name not in names and name not in unknown:
+                    unknown.append(name)
+        if unknown:
+            raise Exception(f"Unknown {kind} of {component_type.__name__} in the templates: {', '.join(unknown)}")
+
+    def totals_text(self, totals: dict) -> str:
+        """
+            Returns the line of the type in the layer totals summary, or None without a totals line or samples.
+
+            Parameters:
+                - totals (dict): statistics of the layer totals keyed by controller class and history field,
+                  see LayerController.total_stats().
+        """
+        if self.totals_line is None:
+            return None
+        stats = totals.get(self.component_type, dict()).get(self.component_type.HISTORY_FIELDS[0])
+        if not stats or not stats["count"]:
+            return None
+        return self.totals_line.format_map(stats)
+
+    def compile(self):
+        """
+            Returns the update function of the binding, called with a ComponentSnapshot and its ComponentGui.
+            It redraws the gui when a displayed field changed, or the history grew when the chart is shown,
+            and does nothing otherwise.
+        """
+        mask = self.component_type.field_mask(*self.displayed_fields)
+        if self.chart:
+            # A new timestamp means new history, the chart scrolls even when the displayed values stay the same.
+            mask |= self.component_type.field_mask("timestamp")
+        # The lines are joined into one template each, the icon text costs one format call.
+        text_format = "\n  ".join(self.lines).format_map
+        stats_format = "".join("\n  " + line for line in self.stats_lines).format_map
+        chart = self.chart
+        window_mean = self.window_mean
+
+        def update(component: ComponentSnapshot, component_gui):
+            if not component.changed_fields & mask:
+                return
+            model = component_gui.model
+            stats = component.stats
+            text = text_format(component.fields)
+            if stats is not None:
+                text += stats_format(stats)
+            model.main_icon_data = text
+            if chart:
+                model.thumbnail_chart_timestamp = component.chart_timestamps
+                model.thumbnail_chart_data1 = component.chart_values
+            if window_mean:
+                if stats is None or component.chart_timestamps is None:
+                    model.thumbnail_chart_data2 = None
+                else:
+                    model.thumbnail_chart_data2 = np.full(len(component.chart_timestamps), stats["mean"])
+            component_gui.update_component()
+
+        return update
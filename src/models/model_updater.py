@@ -1,55 +1,108 @@
-from PyQt5.QtGui import QColor
-
 from components.solar_controller import SolarController
 from components.battery_controller import BatteryController
-from backend import Backend
-from gui.component_gui import ComponentGui
 from gui.channel import Channel
-from components.component import Component
+from models.channel_model import ChannelModel
+from models.component_model import ComponentModel
+from models.model_binding import ModelBinding
+from snapshot import LayerSnapshot
+from instrumentation import Instrumentation
 
 
 class ModelUpdater():
-    """This class is repsonsible to update the data models of the different UI scene items."""
-    def __init__(self, component_gui_list: list, channel_gui_list: list, backend: Backend):
+    """
+        This class is repsonsible to update the data models of the different UI scene items.
+        The models are filled from the immutable snapshots published by the backend, the live
+        controllers of the backend thread are never read from the gui thread.
+    """
+    # Number of channel arrows drawn per kWh of flow.
+    ARROWS_PER_KWH = 5
+    # How the snapshots of each controller type fill the component models. The solar panels show the energy
+    # of the statistics window, the batteries the range of their charge.
+    DEFAULT_BINDINGS = (
+        ModelBinding(
+            SolarController, ("power_kWh", "rated_power_kWh", "efficiency"),
+            ("{rated_power_kWh:.2f} kWh", "{efficiency:.1f}%"), ("\u03a3 {integral:.1f} kWh",),
+            totals_line="Solar \u03a3 {integral:.1f} kWh, peak {max:.1f} kWh"),
+        ModelBinding(
+            BatteryController, ("battery_charge_kWh", "battery_capacity_kWh", "charge_percent"),
+            ("{battery_capacity_kWh:.2f} kWh", "{charge_percent:.1f}%"), ("{min:.1f} - {max:.1f} kWh",),
+            totals_line="Batteries {mean:.1f} kWh, {min:.1f} - {max:.1f} kWh"),
+    )
+
+    def __init__(
+            self,
+            component_gui_list: dict,
+            channel_gui_list: dict,
+            instrumentation: Instrumentation = None,
+            bindings: tuple = None):
+        """
+            Parameters:
+                - component_gui_list (dict): ComponentGui-s keyed by component id.
+                - channel_gui_list (dict): Channel-s keyed by connection id.
+                - instrumentation (Instrumentation): times the model updates when enabled.
+                - bindings (tuple): ModelBinding-s of the controller types, DEFAULT_BINDINGS when not given.
+        """
         self.component_gui_list = component_gui_list
         self.channel_gui_list = channel_gui_list
-        self.backend = backend
-
-    def update_component_models(self):
-        """Updates all component gui data models and the data models of the channels inbetween."""
-        for component_gui in self.component_gui_list:
-            component = self.backend.electrical_layer_controller.components[component_gui.component_id]
-            if isinstance(component, SolarController):
-                component_gui = self._update_solar_panel_model_data(component, component_gui)
-            elif isinstance(component, BatteryController):
-                component_gui = self._update_battery_model_data(component, component_gui)
-
-        for channel in self.channel_gui_list:
-            component = self.backend.electrical_layer_controller.components[channel.id_start]
-            if isinstance(component, SolarController):
-                channel = self._update_solar_channel_model_data(component, channel)
-
-    def _update_solar_panel_model_data(self, component: Component, component_gui: ComponentGui) -> ComponentGui:
-        """Updates solar panel gui data model."""
-        component_gui.model.thumbnail_chart_data1 = component.power_history
-        component_gui.model.main_icon_data = f"{component.rated_power_kWh:.2f} kWh\n  {component.efficiency:.1f}%"
-        component_gui.model.thumbnail_chart_timestamp = component.power_history_timestamps
-        component_gui.update_component()
-        return component_gui
-
-    def _update_solar_channel_model_data(self, component: Component, channel_gui: Channel) -> Channel:
-        """Updates solar panel channel gui data model."""
-        channel_gui.model.text = f"{component.power_kWh} kWh"
-        channel_gui.model.arrow_color = QColor(0, 0, 255, 200) if component.power_kWh >= 0 else QColor(255, 0, 0, 200)
-        channel_gui.model.arrow_density = component.efficiency / 2
-        channel_gui.model.arrows_reversed = False if component.power_kWh >= 0 else True
+        # Rolling window statistics of the layer totals from the latest snapshot, see LayerController.total_stats().
+        self.layer_totals = dict()
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        # Bindings and their compiled update functions keyed by controller class, components of unbound types
+        # are not drawn.
+        self._bindings = dict()
+        self._updaters = dict()
+        for binding in (bindings if bindings is not None else self.DEFAULT_BINDINGS):
+            self.register_binding(binding)
+
+    def register_binding(self, binding: ModelBinding):
+        """Compiles \a binding and uses it for its controller type, replacing the previous binding of the type."""
+        self._bindings[binding.component_type] = binding
+        self._updaters[binding.component_type] = binding.compile()
+
+    def update_component_models(self, snapshot: LayerSnapshot):
+        """
+            Updates the data models of the components and channels listed in \a snapshot,
+            items without changes are not touched. Alarms are only shown when they are raised or cleared.
+        """
+        with self.instrumentation.timer("update_models", len(snapshot.components) + len(snapshot.channels)):
+            self._update_models(snapshot)
+
+    def _update_models(self, snapshot: LayerSnapshot):
+        """Updates the models listed in \a snapshot, see update_component_models()."""
+        self.layer_totals = snapshot.totals
+        updaters = self._updaters
+        component_guis = self.component_gui_list
+        for component_id, component in snapshot.components.items():
+            component_gui = component_guis.get(component_id)
+            update = updaters.get(component.component_type)
+            if component_gui is not None and update is not None:
+                update(component, component_gui)
+
+        for channel_id, flow in snapshot.channels.items():
+            channel = self.channel_gui_list.get(channel_id)
+            if channel is not None:
+                channel = self._update_channel_model_data(flow, channel)
+
+        for component_id, alarms in snapshot.alarms.items():
+            component_gui = self.component_gui_list.get(component_id)
+            if component_gui is not None:
+                component_gui.model.main_icon_state = ComponentModel.STATE_ERROR if alarms else ComponentModel.STATE_OK
+                component_gui.update_state()
+        for channel_id, alarms in snapshot.channel_alarms.items():
+            channel = self.channel_gui_list.get(channel_id)
+            if channel is not None:
+                channel.triggerError(bool(alarms))
+
+    def _update_channel_model_data(self, flow: float, channel_gui: Channel) -> Channel:
+        """Updates channel gui data model from the power flowing from its start to its end component."""
+        channel_gui.model.text = f"{flow:.2f} kWh"
+        channel_gui.model.arrow_color = ChannelModel.FORWARD_ARROW_COLOR if flow >= 0 else ChannelModel.REVERSE_ARROW_COLOR
+        channel_gui.model.arrow_density = abs(flow) * self.ARROWS_PER_KWH
+        channel_gui.model.arrows_reversed = False if flow >= 0 else True
         channel_gui.update_channel()
         return channel_gui
 
-    def _update_battery_model_data(self, component: Component, component_gui: ComponentGui) -> ComponentGui:
-        """Updates battery gui data model."""
-        component_gui.model.main_icon_data = f"{component.battery_capacity_kWh:.2f} kWh\n  {component.charge_percent:.1f}%"
-        component_gui.model.thumbnail_chart_data1 = component.charge_history
-        component_gui.model.thumbnail_chart_timestamp = component.charge_history_timestamps
-        component_gui.update_component()
-        return component_gui
+    def layer_totals_text(self) -> str:
+        """Summary of the layer totals, the totals line of every binding with samples, see ModelBinding.totals_text()."""
+        lines = (binding.totals_text(self.layer_totals) for binding in self._bindings.values())
+        return "\n".join(line for line in lines if line is not None)
@@ -0,0 +1,221 @@
+from collections import deque
+
+import numpy as np
+
+from component_graph import ComponentGraph
+from components.component import FLOW_SOURCE, FLOW_LOAD, FLOW_STORAGE
+
+
+class PowerFlowResult():
+    """Per-edge flows and per-node balance of one power flow solution."""
+    def __init__(self, node_ids, edge_ids, edge_index, injection, storage, mismatch, edge_flow, iterations, residual):
+        # Component ids of the nodes, every per-node array below is in this order.
+        self.node_ids = node_ids
+        # Connection ids of the edges, every per-edge array below is in this order.
+        self.edge_ids = edge_ids
+        self._edge_index = edge_index
+        # Power produced (positive) or consumed (negative) by the sources and loads.
+        self.injection = injection
+        # Power absorbed (positive) or supplied (negative) by the storage nodes.
+        self.storage = storage
+        # Power of islands without storage that could not be balanced, spread over their nodes.
+        self.mismatch = mismatch
+        # Power flowing from the start to the end component of each edge.
+        self.edge_flow = edge_flow
+        self.iterations = iterations
+        self.residual = residual
+
+    def flow(self, edge_id: int) -> float:
+        """Returns the power flowing from the start to the end component of \a edge_id."""
+        return float(self.edge_flow[self._edge_index[edge_id]])
+
+
+class _Topology():
+    """Graph arrays derived from the component graph, rebuilt only when the graph changes."""
+    def __init__(self, graph: ComponentGraph, components: dict):
+        self.version = graph.version
+        self.node_ids = np.fromiter(components, dtype=np.int64, count=len(components))
+        node_index = {node: i for i, node in enumerate(self.node_ids.tolist())}
+        self.edge_ids = np.fromiter(graph.edges, dtype=np.int64, count=len(graph.edges))
+        self.edge_index = {edge_id: i for i, edge_id in enumerate(self.edge_ids.tolist())}
+        endpoints = np.array([
+            (node_index[start], node_index[end]) for start, end in graph.edges.values()
+        ], dtype=np.int64).reshape(-1, 2)
+        self.start = endpoints[:, 0]
+        self.end = endpoints[:, 1]
+        count = len(self.node_ids)
+        self.degree = np.bincount(self.start, minlength=count) + np.bincount(self.end, minlength=count)
+
+        # Node indices and store rows of every store, so injections are gathered with fancy indexing.
+        gathers = dict()
+        self.is_storage = np.zeros(count, dtype=bool)
+        for i, component in enumerate(components.values()):
+            role = component.FLOW_ROLE
+            if role == FLOW_STORAGE:
+                self.is_storage[i] = True
+            elif role in (FLOW_SOURCE, FLOW_LOAD):
+                nodes, rows = gathers.setdefault(component.store, (list(), list()))
+                nodes.append(i)
+                rows.append(component.row)
+        self.gathers = [
+            (store, np.array(nodes, dtype=np.int64), np.array(rows, dtype=np.int64))
+            for store, (nodes, rows) in gathers.items()
+        ]
+        self.island = self._label_islands(graph, node_index)
+        self.island_count = int(self.island.max()) + 1 if count else 0
+        self.storage_per_island = np.bincount(self.island[self.is_storage], minlength=self.island_count)
+        self.nodes_per_island = np.bincount(self.island, minlength=self.island_count)
+        # Without cycles the flows follow directly from subtree sums, no iterative solve is needed.
+        self.is_forest = len(self.edge_ids) == count - self.island_count
+        if self.is_forest:
+            self._prepare_subtrees(graph, node_index)
+
+    def _prepare_subtrees(self, graph: ComponentGraph, node_index: dict):
+        """
+            Orders the nodes of the forest in DFS preorder, so every subtree is a contiguous range,
+            and records for each edge its child node and whether the edge points from the child.
+        """
+        count = len(self.node_ids)
+        self.preorder_position = np.zeros(count, dtype=np.int64)
+        self.subtree_size = np.ones(count, dtype=np.int64)
+        self.preorder = np.zeros(count, dtype=np.int64)
+        self.edge_child = np.zeros(len(self.edge_ids), dtype=np.int64)
+        visited = np.zeros(count, dtype=bool)
+        position = 0
+        for root in range(count):
+            if visited[root]:
+                continue
+            visited[root] = True
+            # Stack of (node index, parent index), the exit marker is a negative node index.
+            stack = [(root, -1)]
+            while stack:
+                node, parent = stack.pop()
+                if node < 0:
+                    node = -node - 1
+                    if parent >= 0:
+                        self.subtree_size[parent] += self.subtree_size[node]
+                    continue
+                self.preorder[position] = node
+                self.preorder_position[node] = position
+                position += 1
+                stack.append((-node - 1, parent))
+                node_id = int(self.node_ids[node])
+                for edge_id in graph.incident_edges(node_id):
+                    start, end = graph.edge(edge_id)
+                    child = node_index[end if start == node_id else start]
+                    if not visited[child]:
+                        visited[child] = True
+                        self.edge_child[self.edge_index[edge_id]] = child
+                        stack.append((child, node))
+        self.edge_from_child = self.start == self.edge_child
+
+    def subtree_flows(self, b: np.ndarray) -> np.ndarray:
+        """Returns the flow of every edge of the forest, the net injection of the subtree below it."""
+        prefix = np.concatenate(([0.0], np.cumsum(b[self.preorder])))
+        start = self.preorder_position[self.edge_child]
+        exported = prefix[start + self.subtree_size[self.edge_child]] - prefix[start]
+        return np.where(self.edge_from_child, exported, -exported)
+
+    def _label_islands(self, graph: ComponentGraph, node_index: dict) -> np.ndarray:
+        """Labels the connected parts of the graph, each node gets the index of its island."""
+        island = np.full(len(self.node_ids), -1, dtype=np.int64)
+        label = 0
+        for node in self.node_ids.tolist():
+            if island[node_index[node]] >= 0:
+                continue
+            island[node_index[node]] = label
+            queue = deque([node])
+            while queue:
+                for neighbor in graph.neighbors(queue.popleft()):
+                    if island[node_index[neighbor]] < 0:
+                        island[node_index[neighbor]] = label
+                        queue.append(neighbor)
+            label += 1
+        return island
+
+    def laplacian_product(self, x: np.ndarray) -> np.ndarray:
+        """Multiplies \a x with the graph Laplacian using scatter adds over the edge list."""
+        count = len(x)
+        adjacent = np.bincount(self.start, x[self.end], count) + np.bincount(self.end, x[self.start], count)
+        return self.degree * x - adjacent
+
+
+class PowerFlowSolver():
+    """
+        Solves the power flow of a layer. Sources and loads inject their power, storage nodes
+        absorb the surplus of their island evenly, and the flows follow from a DC flow model
+        with unit conductance on every connection: L * theta = injection, flow = theta_start - theta_end.
+        When the graph has no cycles the flow of each edge is the net injection of the subtree below it,
+        computed with prefix sums over a DFS preorder. Otherwise the Laplacian products are computed
+        from the edge list with scatter adds, and the system is solved with Jacobi preconditioned
+        conjugate gradients warm started from the previous solution.
+    """
+    def __init__(self, tolerance: float = 1e-6, max_iterations: int = 500):
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self._topology = None
+        self._theta = None
+
+    def solve(self, graph: ComponentGraph, components: dict) -> PowerFlowResult:
+        """
+            Computes the flows of the whole graph.
+
+            Parameters:
+                - graph (ComponentGraph): connections between the components.
+                - components (dict): controllers keyed by their component id.
+        """
+        topology = self._topology
+        if topology is None or topology.version != graph.version:
+            topology = _Topology(graph, components)
+            self._topology = topology
+            self._theta = np.zeros(len(topology.node_ids))
+
+        count = len(topology.node_ids)
+        injection = np.zeros(count)
+        for store, nodes, rows in topology.gathers:
+            component_type = store.component_type
+            sign = 1.0 if component_type.FLOW_ROLE == FLOW_SOURCE else -1.0
+            injection[nodes] = sign * store.columns[component_type.FLOW_FIELD][rows]
+
+        surplus = np.bincount(topology.island, injection, topology.island_count)
+        has_storage = topology.storage_per_island > 0
+        share = np.divide(surplus, topology.storage_per_island, out=np.zeros_like(surplus), where=has_storage)
+        storage = np.where(topology.is_storage, share[topology.island], 0.0)
+        unbalanced = np.where(has_storage, 0.0, surplus / np.maximum(topology.nodes_per_island, 1))
+        mismatch = unbalanced[topology.island]
+
+        balance = injection - storage - mismatch
+        if topology.is_forest:
+            edge_flow = topology.subtree_flows(balance)
+            iterations, residual = 0, 0.0
+        else:
+            theta, iterations, residual = self._conjugate_gradient(topology, balance)
+            self._theta = theta
+            edge_flow = theta[topology.start] - theta[topology.end]
+        return PowerFlowResult(
+            topology.node_ids, topology.edge_ids, topology.edge_index,
+            injection, storage, mismatch, edge_flow, iterations, residual)
+
+    def _conjugate_gradient(self, topology: _Topology, b: np.ndarray) -> tuple:
+        """Solves L * x = b with Jacobi preconditioned conjugate gradients."""
+        x = self._theta.copy()
+        inverse_degree = np.divide(1.0, topology.degree, out=np.zeros(len(b)), where=topology.degree > 0)
+        r = b - topology.laplacian_product(x)
+        z = inverse_degree * r
+        p = z.copy()
+        rz = r @ z
+        limit = self.tolerance * max(np.linalg.norm(b), 1.0)
+        residual = np.linalg.norm(r)
+        iterations = 0
+        while residual > limit and iterations < self.max_iterations:
+            lp = topology.laplacian_product(p)
+            alpha = rz / (p @ lp)
+            x += alpha * p
+            r -= alpha * lp
+            z = inverse_degree * r
+            rz_next = r @ z
+            p = z + (rz_next / rz) * p
+            rz = rz_next
+            residual = np.linalg.norm(r)
+            iterations += 1
+        return x, iterations, residual
@@ -0,0 +1,42 @@
+import time
+
+
+class SimulationClock():
+    """
+        Simulated time decoupled from the wall clock. It runs \a speed times faster than the
+        wall clock and can jump ahead, so the demo generators can produce days of data in seconds.
+        Times are in seconds, matching the demo timestamps of the components which start at 0.
+    """
+    def __init__(self, speed: float = 1000.0, start: float = 0.0, wall_clock=time.monotonic):
+        """
+            Parameters:
+                - speed (float): simulated seconds per wall clock second.
+                - start (float): simulated time at creation.
+                - wall_clock (callable): returns the wall clock time in seconds.
+        """
+        self.wall_clock = wall_clock
+        self._speed = speed
+        self._anchor_time = start
+        self._anchor_wall = wall_clock()
+
+    def __call__(self) -> float:
+        return self.now()
+
+    def now(self) -> float:
+        """Current simulated time."""
+        return self._anchor_time + (self.wall_clock() - self._anchor_wall) * self._speed
+
+    @property
+    def speed(self) -> float:
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed: float):
+        """Changes the speed from now on, the simulated time does not jump."""
+        self._anchor_time = self.now()
+        self._anchor_wall = self.wall_clock()
+        self._speed = speed
+
+    def advance(self, seconds: float):
+        """Jumps the simulated time ahead by \a seconds."""
+        self._anchor_time += seconds
@@ -0,0 +1,162 @@
+import threading
+
+import numpy as np
+
+from change_set import ChangeSet
+from components.rolling_stats import RollingStats
+
+
+class ComponentSnapshot():
+    """
+        Read-only copy of the data a gui needs to draw one component at the end of a tick.
+        The chart arrays are copied out of the history ring buffers and frozen, so the backend
+        can keep appending while the gui plots them.
+    """
+    __slots__ = (
+        "component_id", "component_type", "changed_fields", "fields", "chart_timestamps", "chart_values", "stats")
+
+    def __init__(self, component_id, component_type, changed_fields, fields, chart_timestamps, chart_values, stats=None):
+        self.component_id = component_id
+        # Controller class of the component.
+        self.component_type = component_type
+        # Dirty field bits (see Component.FIELD_BITS) since the previous snapshot taken by the gui.
+        self.changed_fields = changed_fields
+        # Values of the state fields keyed by their name.
+        self.fields = fields
+        # Downsampled recent history of the first history field.
+        self.chart_timestamps = chart_timestamps
+        self.chart_values = chart_values
+        # Rolling window statistics of the charted field keyed by RollingStats.STATS, None when not kept.
+        self.stats = stats
+
+    def with_changed_fields(self, changed_fields: int) -> "ComponentSnapshot":
+        """Returns a copy of the snapshot with \a changed_fields as its dirty field bits."""
+        return ComponentSnapshot(
+            self.component_id, self.component_type, changed_fields, self.fields,
+            self.chart_timestamps, self.chart_values, self.stats)
+
+
+class LayerSnapshot():
+    """
+        Immutable state of the changed items of a layer at the end of a tick.
+        Holds a ComponentSnapshot per changed component, the flow of every changed connection and the
+        alarm transitions, items that did not change since the previous snapshot are not listed.
+    """
+    # Time window of the chart data in seconds.
+    CHART_SPAN = 50
+    # Maximum number of chart points per component, about the width of a thumbnail chart in pixels.
+    CHART_POINTS = 100
+
+    def __init__(
+            self, tick: int, components: dict, channels: dict, totals: dict = None,
+            alarms: dict = None, channel_alarms: dict = None):
+        # Number of the backend tick the snapshot was taken at.
+        self.tick = tick
+        # ComponentSnapshot-s keyed by component id.
+        self.components = components
+        # Power flowing from the start to the end component keyed by connection id.
+        self.channels = channels
+        # Rolling window statistics of the layer totals, see LayerController.total_stats().
+        self.totals = totals if totals is not None else dict()
+        # Names of the active alarms keyed by the id of the components and connections whose alarms changed,
+        # an empty tuple when they cleared.
+        self.alarms = alarms if alarms is not None else dict()
+        self.channel_alarms = channel_alarms if channel_alarms is not None else dict()
+
+    @classmethod
+    def capture(cls, tick: int, components: dict, changes: ChangeSet, totals: dict = None) -> "LayerSnapshot":
+        """
+            Copies the state of the changed components of a layer.
+
+            Parameters:
+                - tick (int): number of the backend tick.
+                - components (dict): controllers of the layer keyed by their component id.
+                - changes (ChangeSet): changes collected from the layer controller.
+                - totals (dict): statistics of the layer totals.
+        """
+        # Changed components grouped by store, so their fields are gathered with one fancy index per column.
+        per_store = dict()
+        for id, mask in changes.components.items():
+            component = components.get(id)
+            if component is not None:
+                per_store.setdefault(component.store, list()).append((component, mask))
+
+        snapshots = dict()
+        for store, changed in per_store.items():
+            rows = np.array([component.row for component, _ in changed], dtype=np.int64)
+            names = list(store.component_type.STATE_FIELDS)
+            values = zip(*(store.columns[name][rows].tolist() for name in names))
+            chart_field = store.component_type.HISTORY_FIELDS[0] if store.component_type.HISTORY_FIELDS else None
+            stats = [None] * len(rows)
+            if chart_field is not None and store.history.stats is not None:
+                # The charted field is the first one of the statistics.
+                window = store.history.stats.window_stats(rows)
+                columns = [window[name] if name == "count" else window[name][:, 0] for name in RollingStats.STATS]
+                stats = [dict(zip(RollingStats.STATS, row_stats)) for row_stats in zip(*(column.tolist() for column in columns))]
+            for (component, mask), row_values, row_stats in zip(changed, values, stats):
+                chart_timestamps = chart_values = None
+                if chart_field is not None:
+                    timestamps, chart = component.history.downsample(chart_field, cls.CHART_SPAN, cls.CHART_POINTS)
+                    chart_timestamps = cls._frozen_copy(timestamps)
+                    chart_values = cls._frozen_copy(chart)
+                snapshots[component.component_id] = ComponentSnapshot(
+                    component.component_id, store.component_type, mask, dict(zip(names, row_values)),
+                    chart_timestamps, chart_values, row_stats)
+        return cls(tick, snapshots, dict(changes.channels), totals, dict(changes.alarms), dict(changes.channel_alarms))
+
+    @staticmethod
+    def _frozen_copy(array: np.ndarray) -> np.ndarray:
+        """Returns a read-only copy of \a array."""
+        copy = np.array(array)
+        copy.flags.writeable = False
+        return copy
+
+    def merged(self, newer: "LayerSnapshot") -> "LayerSnapshot":
+        """
+            Returns a snapshot holding the changes of this and the \a newer snapshot,
+            the state and the alarms are taken from the newer one and the dirty field bits are combined.
+        """
+        components = dict(self.components)
+        for id, snapshot in newer.components.items():
+            older = components.get(id)
+            if older is not None:
+                snapshot = snapshot.with_changed_fields(older.changed_fields | snapshot.changed_fields)
+            components[id] = snapshot
+        channels = dict(self.channels)
+        channels.update(newer.channels)
+        alarms = dict(self.alarms)
+        alarms.update(newer.alarms)
+        channel_alarms = dict(self.channel_alarms)
+        channel_alarms.update(newer.channel_alarms)
+        return LayerSnapshot(newer.tick, components, channels, newer.totals, alarms, channel_alarms)
+
+
+class SnapshotExchange():
+    """
+        Double buffer between the backend thread writing snapshots and the gui thread reading them.
+        The backend fills a new snapshot while the gui reads the one it took before, and a tick
+        swaps them. Snapshots are immutable once published, so the gui reads them without locks
+        or copies. The lock only guards the exchange of the pending reference, and merging a
+        snapshot the gui did not take yet into the next one, so no change is ever dropped.
+    """
+    def __init__(self):
+        self._pending = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        """True while a published snapshot waits to be taken."""
+        return self._pending is not None
+
+    def publish(self, snapshot: LayerSnapshot):
+        """Hands a snapshot over to the reader. Called by the backend thread."""
+        with self._lock:
+            if self._pending is not None:
+                snapshot = self._pending.merged(snapshot)
+            self._pending = snapshot
+
+    def take(self) -> LayerSnapshot:
+        """Returns the snapshot published since the previous call, or None. Called by the gui thread."""
+        with self._lock:
+            snapshot, self._pending = self._pending, None
+        return snapshot
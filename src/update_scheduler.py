@@ -0,0 +1,157 @@
+import heapq
+import threading
+import time
+
+
+class UpdateScheduler():
+    """
+        Heap of update deadlines, one entry per component. Each component runs with its own
+        period and jitter budget, so fast devices are updated often without waking slow ones.
+        A wakeup runs every component whose deadline falls within its jitter budget, which lets
+        components with close deadlines share one vectorized update.
+        Deadlines advance by whole periods, so the update phase does not drift with the lag.
+        Components can be added and removed from any thread.
+    """
+    def __init__(self, clock=time.monotonic):
+        """
+            Parameters:
+                - clock (callable): returns the current time in seconds.
+        """
+        self.clock = clock
+        # Heap of (deadline, sequence, key) entries. Removed and rescheduled keys leave stale
+        # entries behind, they are recognized by their sequence number and dropped when popped.
+        self._heap = list()
+        # (period, jitter, sequence) of each scheduled key.
+        self._entries = dict()
+        self._sequence = 0
+        self._lock = threading.Lock()
+        # Lag statistics keyed by period: [runs, late runs, skipped periods, total lag, max lag].
+        self._stats = dict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def add(self, key, period: float, jitter: float = 0.0, start: float = None):
+        """
+            Schedules \a key, replacing its previous schedule.
+
+            Parameters:
+                - key: identifier returned by pop_due(), e.g. a component id.
+                - period (float): seconds between two updates.
+                - jitter (float): tolerated lateness in seconds, also the time an update may run early
+                  to be batched with others.
+                - start (float): time of the first update, one period from now when not given.
+        """
+        if period <= 0:
+            raise Exception("Update period must be positive")
+        deadline = start if start is not None else self.clock() + period
+        with self._lock:
+            self._sequence += 1
+            self._entries[key] = (period, jitter, self._sequence)
+            heapq.heappush(self._heap, (deadline, self._sequence, key))
+
+    def add_many(self, keys, periods, jitters, start: float = None):
+        """
+            Schedules every key of \a keys with the period and jitter at the same index, see add().
+            The heap is rebuilt once instead of pushing every entry. The arguments are checked before
+            anything is scheduled, so invalid ones leave the scheduler unchanged.
+        """
+        keys, periods, jitters = list(keys), list(periods), list(jitters)
+        if not len(keys) == len(periods) == len(jitters):
+            raise Exception("Every key needs a period and a jitter")
+        if any(period <= 0 for period in periods):
+            raise Exception("Update period must be positive")
+        now = self.clock()
+        with self._lock:
+            heap = self._heap
+            for key, period, jitter in zip(keys, periods, jitters):
+                self._sequence += 1
+                self._entries[key] = (period, jitter, self._sequence)
+                heap.append((start if start is not None else now + period, self._sequence, key))
+            heapq.heapify(heap)
+
+    def remove(self, key):
+        """Unschedules \a key."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def next_deadline(self) -> float:
+        """Time of the earliest update, or None when nothing is scheduled."""
+        with self._lock:
+            heap = self._heap
+            while heap and self._entries.get(heap[0][2], (0, 0, None))[2] != heap[0][1]:
+                heapq.heappop(heap)
+            return heap[0][0] if heap else None
+
+    def pop_due(self, now: float = None) -> list:
+        """
+            Returns the keys due at \a now, including the ones whose deadline is within their jitter
+            budget ahead, and schedules their next update.
+        """
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            return self._pop_due(now)
+
+    def _pop_due(self, now: float) -> list:
+        """Pops the due keys, the lock has to be held."""
+        heap = self._heap
+        due = list()
+        rescheduled = list()
+        while heap:
+            deadline, sequence, key = heap[0]
+            entry = self._entries.get(key)
+            if entry is None or entry[2] != sequence:
+                heapq.heappop(heap)
+                continue
+            period, jitter, _ = entry
+            if deadline - jitter > now:
+                break
+            heapq.heappop(heap)
+            due.append(key)
+            self._record(period, jitter, now - deadline)
+            deadline += period
+            if deadline <= now:
+                # Fell behind by more than a period, the missed updates are dropped.
+                skipped = int((now - deadline) // period) + 1
+                self._stats[period][2] += skipped
+                deadline += skipped * period
+            rescheduled.append((deadline, sequence, key))
+        for entry in rescheduled:
+            heapq.heappush(heap, entry)
+        return due
+
+    def _record(self, period: float, jitter: float, lag: float):
+        """Adds the lag of one run to the statistics of \a period, early runs count as no lag."""
+        stats = self._stats.get(period)
+        if stats is None:
+            stats = self._stats[period] = [0, 0, 0, 0.0, 0.0]
+        lag = max(lag, 0.0)
+        stats[0] += 1
+        if lag > jitter:
+            stats[1] += 1
+        stats[3] += lag
+        stats[4] = max(stats[4], lag)
+
+    def lag_stats(self) -> dict:
+        """
+            Returns the scheduling lag statistics keyed by period. Each entry holds the number of runs,
+            the runs later than their jitter budget, the skipped periods and the mean and max lag in seconds.
+        """
+        return {
+            period: {
+                "runs": runs,
+                "late": late,
+                "skipped": skipped,
+                "mean_lag": total / runs if runs else 0.0,
+                "max_lag": max_lag,
+            }
+            for period, (runs, late, skipped, total, max_lag) in self._stats.items()
+        }
+
+    def reset_stats(self):
+        """Clears the lag statistics."""
+        self._stats = dict()